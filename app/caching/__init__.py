@@ -17,6 +17,12 @@ Contributors:  Pouria Hadjibagheri
 
 # Internal:
 from .redis import *
+from .local import *
+from .shared import *
+from .keys import *
+from .stats import *
+from .negative import *
+from .invalidation import *
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # Header
@@ -0,0 +1,153 @@
+#!/usr/bin python3
+
+"""
+Benchmarks the cache codec against pickle.
+
+Payloads used in rendering the landing page (landing data, banners,
+what's new, and timestamps) are read from the Redis instance defined in
+the settings. Where Redis is not configured, or holds no payloads for a
+prefix, a synthetic payload of the same shape is used instead.
+
+Usage:
+
+    python -m app.caching.benchmark [iterations]
+"""
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from asyncio import run
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pickle import dumps as pickle_dumps, loads as pickle_loads
+from timeit import timeit
+import sys
+
+# 3rd party:
+from aioredis import create_redis
+
+# Internal:
+from app.config import Settings
+from app.common.data.table import Table
+from app.caching.codec import encode, decode
+from app.landing.views import metrics
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+MAX_PAYLOADS = 3
+
+
+def synthetic_landing_payload() -> Table:
+    start = date(2021, 5, 1)
+    values = [
+        ("K02000001", "overview", "United Kingdom", start - timedelta(days=day % 3),
+         metric, Decimal(index * 1000 + day), 1)
+        for day in range(3)
+        for index, metric in enumerate(metrics)
+    ]
+
+    data = Table.from_records(
+        values,
+        columns=["areaCode", "areaType", "areaName", "date", "metric", "value", "rank"]
+    )
+
+    return data.assign(formatted_date=data.map("date", lambda x: f"{x:%-d %B %Y}"))
+
+
+def synthetic_banners_payload() -> list:
+    return [
+        {
+            "timestamp": date(2021, 5, index),
+            "display_timestamp": f"{index} May 2021",
+            "body": "<p>Announcement body with a <a href='/details'>link</a>.</p>" * 3
+        }
+        for index in range(1, 4)
+    ]
+
+
+def synthetic_whats_new_payload() -> list:
+    return [
+        {
+            "id": f"{index:08d}-0000-0000-0000-000000000000",
+            "date": datetime(2021, 5, 1).isoformat(),
+            "formatted_date": "1 May 2021",
+            "high_priority": False,
+            "type": "new metric",
+            "heading": "Heading of the change log entry",
+            "body": "Body of the change log entry. " * 5
+        }
+        for index in range(4)
+    ]
+
+
+PAYLOADS = {
+    "FRONTEND::LP::": synthetic_landing_payload,
+    "FRONTEND::BN::": synthetic_banners_payload,
+    "FRONTEND::CL::": synthetic_whats_new_payload,
+    "FRONTEND::TS::": lambda: "2021-05-01T15:12:47.2931695Z",
+}
+
+
+async def redis_payloads() -> dict:
+    results = {prefix: list() for prefix in PAYLOADS}
+
+    if not all(Settings.redis["address"]):
+        return results
+
+    redis = await create_redis(
+        Settings.redis["address"],
+        password=Settings.redis["password"],
+        db=2
+    )
+
+    try:
+        for prefix in PAYLOADS:
+            keys = list()
+            async for key in redis.iscan(match=f"{prefix}*"):
+                keys.append(key)
+                if len(keys) == MAX_PAYLOADS:
+                    break
+
+            payloads = await redis.mget(*keys) if keys else list()
+            results[prefix] = [decode(payload) for payload in payloads if payload is not None]
+    finally:
+        redis.close()
+        await redis.wait_closed()
+
+    return results
+
+
+def benchmark(name: str, value, iterations: int):
+    pickled = pickle_dumps(value)
+    encoded = encode(value)
+
+    results = {
+        "pickle.dumps": timeit(lambda: pickle_dumps(value), number=iterations),
+        "pickle.loads": timeit(lambda: pickle_loads(pickled), number=iterations),
+        "codec.encode": timeit(lambda: encode(value), number=iterations),
+        "codec.decode": timeit(lambda: decode(encoded), number=iterations),
+    }
+
+    print(f"{name}: pickle {len(pickled):,d} bytes | codec {len(encoded):,d} bytes")
+    for operation, total in results.items():
+        print(f"    {operation:<14} {total / iterations * 1e6:>10.1f} µs")
+
+
+def main(iterations: int = 200):
+    payloads = run(redis_payloads())
+
+    for prefix, synthetic in PAYLOADS.items():
+        source = "redis"
+        values = payloads[prefix]
+
+        if not values:
+            source = "synthetic"
+            values = [synthetic()]
+
+        for index, value in enumerate(values):
+            benchmark(f"[{source}] {prefix} #{index}", value, iterations)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]))
@@ -0,0 +1,239 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Any, Dict, List, NamedTuple, Union
+from struct import Struct
+from time import time
+from pickle import loads as pickle_loads, dumps as pickle_dumps
+import zlib
+
+# 3rd party:
+
+# Internal:
+from app.config import Settings
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'Codec',
+    'DecodeError',
+    'Expiry',
+    'register_codec',
+    'encode',
+    'decode',
+    'is_encoded',
+    'read_expiry'
+]
+
+
+# Header: magic (2 bytes), format version, codec ID, flags.
+#
+# The first byte of the magic never begins a pickle (protocol 2+ starts
+# with 0x80) or a JSON document, so legacy entries are detected reliably.
+HEADER = Struct(">2sBBB")
+MAGIC = b"\xffC"
+FORMAT_VERSION = 1
+
+FLAG_COMPRESSED = 0b0000_0001
+FLAG_EXPIRY = 0b0000_0010
+
+# Soft and hard expiry (seconds since the epoch), following the header
+# where the expiry flag is set.
+EXPIRY = Struct(">dd")
+
+
+class Expiry(NamedTuple):
+    """
+    Soft and hard expiry of a cached value, in seconds since the epoch.
+
+    A value past its soft expiry is stale: it may still be served while
+    it is refreshed. A value past its hard expiry must not be served.
+    """
+    soft: float
+    hard: float
+
+    @classmethod
+    def from_ttl(cls, ttl: float, stale_ttl: float) -> 'Expiry':
+        now = time()
+        return cls(soft=now + ttl, hard=now + ttl + stale_ttl)
+
+    @property
+    def fresh_for(self) -> float:
+        return self.soft - time()
+
+    @property
+    def is_stale(self) -> bool:
+        return time() >= self.soft
+
+    @property
+    def is_expired(self) -> bool:
+        return time() >= self.hard
+
+
+class DecodeError(ValueError):
+    """
+    Raised where a payload cannot be decoded - e.g. one written with
+    another version of the format, or by a codec that is not registered.
+    """
+
+
+class Codec:
+    """
+    Base class for cache codecs.
+
+    Codecs are identified in the payload header by ``id``, which must
+    therefore remain stable once a codec has been deployed.
+    """
+    id: int
+    name: str
+
+    def can_encode(self, value: Any) -> bool:
+        raise NotImplementedError()
+
+    def encode(self, value: Any) -> bytes:
+        raise NotImplementedError()
+
+    def decode(self, payload: bytes) -> Any:
+        raise NotImplementedError()
+
+
+class PickleCodec(Codec):
+    """
+    Default codec. Per-type codecs - JSON records, and columnar frames
+    and tables - were measured against pickle on the cached payloads,
+    and were no faster to decode while being slower to encode.
+    """
+    id = 0
+    name = "pickle"
+
+    def can_encode(self, value: Any) -> bool:
+        return True
+
+    def encode(self, value: Any) -> bytes:
+        return pickle_dumps(value)
+
+    def decode(self, payload: bytes) -> Any:
+        return pickle_loads(payload)
+
+
+_codecs: Dict[int, Codec] = dict()
+_encoders: List[Codec] = list()
+_fallback_encoders: List[Codec] = list()
+
+
+def register_codec(codec: Codec, fallback: bool = False):
+    """
+    Registers a codec for encoding and decoding.
+
+    Codecs are tried in order of registration when encoding, except for
+    fallback codecs, which are only tried once all others have declined.
+    """
+    if codec.id in _codecs:
+        raise ValueError(f"Codec ID {codec.id} is already registered.")
+
+    _codecs[codec.id] = codec
+
+    if fallback:
+        _fallback_encoders.append(codec)
+    else:
+        _encoders.append(codec)
+
+
+register_codec(PickleCodec(), fallback=True)
+
+
+def encode(value: Any, expiry: Union[Expiry, None] = None) -> bytes:
+    """
+    Encodes a value using the first applicable codec, compressing
+    the payload where its size exceeds the configured threshold.
+
+    Where an ``expiry`` is given, it is stored alongside the value and
+    may be read back using ``read_expiry``.
+    """
+    for codec in [*_encoders, *_fallback_encoders]:
+        if not codec.can_encode(value):
+            continue
+
+        try:
+            payload = codec.encode(value)
+            break
+        except TypeError:
+            continue
+    else:
+        raise TypeError(f"No codec could encode '{type(value).__name__}'.")
+
+    flags = 0
+    settings = Settings.cache_codec
+    if len(payload) > settings["compression_threshold"]:
+        payload = zlib.compress(payload, settings["compression_level"])
+        flags |= FLAG_COMPRESSED
+
+    envelope = b""
+    if expiry is not None:
+        envelope = EXPIRY.pack(*expiry)
+        flags |= FLAG_EXPIRY
+
+    return HEADER.pack(MAGIC, FORMAT_VERSION, codec.id, flags) + envelope + payload
+
+
+def is_encoded(payload: Union[bytes, bytearray]) -> bool:
+    """
+    Determines whether the payload was produced by ``encode``.
+    """
+    return payload[:len(MAGIC)] == MAGIC
+
+
+def decode(payload: Union[bytes, bytearray]) -> Any:
+    """
+    Decodes a payload produced by ``encode``. Payloads without a header
+    are legacy pickles and are decoded as such.
+
+    Raises ``DecodeError`` where the payload cannot be decoded.
+    """
+    try:
+        if not is_encoded(payload):
+            return pickle_loads(payload)
+
+        _, version, codec_id, flags = HEADER.unpack_from(payload)
+
+        if version != FORMAT_VERSION:
+            raise DecodeError(f"Unsupported cache format version: {version}")
+
+        if codec_id not in _codecs:
+            raise DecodeError(f"Unknown cache codec ID: {codec_id}")
+
+        start = HEADER.size
+        if flags & FLAG_EXPIRY:
+            start += EXPIRY.size
+
+        data = memoryview(payload)[start:]
+        if flags & FLAG_COMPRESSED:
+            data = zlib.decompress(data)
+        else:
+            data = bytes(data)
+
+        return _codecs[codec_id].decode(data)
+    except DecodeError:
+        raise
+    except Exception as err:
+        # e.g. truncated payloads, or pickles of classes that have since
+        # been moved or removed.
+        raise DecodeError(f"Failed to decode cache payload: {err!r}") from err
+
+
+def read_expiry(payload: Union[bytes, bytearray]) -> Union[Expiry, None]:
+    """
+    Reads the expiry stored with a payload without decoding the value.
+    Returns ``None`` where the payload carries no expiry.
+    """
+    if not is_encoded(payload):
+        return None
+
+    _, _, _, flags = HEADER.unpack_from(payload)
+
+    if not flags & FLAG_EXPIRY:
+        return None
+
+    return Expiry(*EXPIRY.unpack_from(payload, HEADER.size))
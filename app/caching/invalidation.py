@@ -0,0 +1,254 @@
+#!/usr/bin python3
+
+"""
+Cross-worker cache invalidation.
+
+Invalidations are broadcast over Redis pub/sub, and each worker evicts
+the keys - or the keys under the prefixes - from its local tiers as soon
+as it receives them.
+
+Pub/sub delivers messages at most once. Messages carry the ID of their
+publisher and a sequence number, so that gaps - dropped messages - are
+counted. Where a subscription is lost, messages published in the interim
+are lost with it; the local tiers are therefore cleared on resubscribing.
+
+Usage:
+
+    python -m app.caching.invalidation <prefix> [<prefix> ...]
+
+Removes the entries of the current generation under the given prefixes
+from Redis, and evicts them from the local tiers of all workers.
+"""
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Any, Callable, Dict, Iterable, List, Union
+from asyncio import Task, get_running_loop, run, sleep, CancelledError
+from time import time
+from uuid import uuid4
+import logging
+import sys
+
+# 3rd party:
+from orjson import dumps as json_dumps, loads as json_loads
+
+# Internal:
+from app.config import Settings
+from .local import local_cache
+from .shared import shared_cache
+from .keys import GENERATION_KEY, namespace
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'INVALIDATION_CHANNEL',
+    'invalidation_bus'
+]
+
+
+logger = logging.getLogger("app")
+
+
+INVALIDATION_CHANNEL = "FRONTEND::INVALIDATE"
+
+InvalidationHandler = Callable[[List[str], List[str]], Any]
+
+
+def evict_local_cache(keys: List[str], prefixes: List[str]):
+    for key in keys:
+        local_cache.delete(key)
+
+    for prefix in prefixes:
+        local_cache.delete_prefix(prefix)
+
+    shared_cache.invalidate(keys, prefixes)
+
+
+class InvalidationBus:
+    """
+    Publishes and receives invalidations of cache keys and prefixes.
+
+    Local tiers register a handler, which is called with the keys and the
+    prefixes of each invalidation. An empty prefix invalidates everything.
+
+    Parameters
+    ----------
+    reconnect_interval: float
+        Number of seconds to wait before resubscribing once the
+        subscription is lost.
+    """
+
+    def __init__(self, reconnect_interval: float):
+        self.reconnect_interval = reconnect_interval
+        self.source = uuid4().hex
+        self._sequence = 0
+        self._last_seen: Dict[str, int] = dict()
+        self._handlers: List[InvalidationHandler] = [evict_local_cache]
+        self._task: Union[Task, None] = None
+
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+        self.resyncs = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+
+    def add_handler(self, handler: InvalidationHandler):
+        self._handlers.append(handler)
+
+    def start(self, pool):
+        if self._task is None:
+            self._task = get_running_loop().create_task(self.run(pool))
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        self._task.cancel()
+
+        try:
+            await self._task
+        except CancelledError:
+            pass
+
+        self._task = None
+
+    async def publish(self, request, keys: Iterable[str] = tuple(),
+                      prefixes: Iterable[str] = tuple()) -> int:
+        """
+        Invalidates keys and prefixes in all workers, returning the number
+        of workers that received the invalidation.
+        """
+        from .redis import Redis
+
+        keys, prefixes = list(keys), list(prefixes)
+
+        # Applied here first, so that this worker does not depend on
+        # its subscription.
+        self.apply(keys, prefixes)
+
+        self._sequence += 1
+        message = json_dumps({
+            "source": self.source,
+            "sequence": self._sequence,
+            "sent_at": time(),
+            "keys": keys,
+            "prefixes": prefixes
+        })
+
+        async with Redis(request, INVALIDATION_CHANNEL) as redis:
+            receivers = await redis.publish(INVALIDATION_CHANNEL, message)
+
+        self.published += 1
+        return receivers
+
+    def apply(self, keys: List[str], prefixes: List[str]):
+        for handler in self._handlers:
+            try:
+                handler(keys, prefixes)
+            except Exception as err:
+                logger.exception(f"Failed to apply cache invalidation: {err}")
+
+    def receive(self, payload: bytes):
+        message = json_loads(payload)
+        source, sequence = message["source"], message["sequence"]
+
+        lag = max(time() - message["sent_at"], 0.0)
+        self.received += 1
+        self.total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+
+        last_seen = self._last_seen.get(source)
+        if last_seen is not None and sequence > last_seen + 1:
+            self.dropped += sequence - last_seen - 1
+            logger.warning(
+                f"Dropped {sequence - last_seen - 1} cache invalidation(s) from '{source}'."
+            )
+
+        self._last_seen[source] = max(sequence, last_seen or 0)
+
+        if source != self.source:
+            self.apply(message["keys"], message["prefixes"])
+
+    def resync(self):
+        self.resyncs += 1
+        self._last_seen.clear()
+        self.apply(list(), [str()])
+
+    async def run(self, pool):
+        subscribed_before = False
+
+        while True:
+            try:
+                channel, = await pool.subscribe(INVALIDATION_CHANNEL)
+
+                if subscribed_before:
+                    logger.warning("Resubscribed to cache invalidations - clearing local tiers.")
+                    self.resync()
+
+                subscribed_before = True
+
+                while await channel.wait_message():
+                    try:
+                        self.receive(await channel.get())
+                    except (KeyError, TypeError, ValueError) as err:
+                        logger.warning(f"Malformed cache invalidation: {err}")
+            except CancelledError:
+                raise
+            except Exception as err:
+                logger.warning(f"Cache invalidation subscription failed: {err}")
+
+            await sleep(self.reconnect_interval)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        return {
+            "published": self.published,
+            "received": self.received,
+            "dropped": self.dropped,
+            "resyncs": self.resyncs,
+            "subscribed": self._task is not None and not self._task.done(),
+            "mean_lag_ms": self.total_lag / self.received * 1000 if self.received else None,
+            "max_lag_ms": self.max_lag * 1000,
+        }
+
+
+invalidation_bus = InvalidationBus(**Settings.cache_invalidation)
+
+
+async def invalidate(prefixes: List[str]) -> int:
+    from aioredis import create_redis
+
+    redis = await create_redis(
+        Settings.redis["address"],
+        password=Settings.redis["password"],
+        db=2
+    )
+
+    try:
+        generation = int(await redis.get(GENERATION_KEY) or 0)
+        namespaces = [namespace(prefix, generation) for prefix in prefixes]
+
+        for name in namespaces:
+            async for key in redis.iscan(match=f"{name}*"):
+                await redis.unlink(key)
+
+        message = json_dumps({
+            "source": invalidation_bus.source,
+            "sequence": 1,
+            "sent_at": time(),
+            "keys": list(),
+            "prefixes": namespaces
+        })
+
+        return await redis.publish(INVALIDATION_CHANNEL, message)
+    finally:
+        redis.close()
+        await redis.wait_closed()
+
+
+if __name__ == "__main__":
+    if not sys.argv[1:]:
+        sys.exit(__doc__.split("Usage:")[1])
+
+    print(f"Invalidation received by {run(invalidate(sys.argv[1:]))} worker(s).")
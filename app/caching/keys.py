@@ -0,0 +1,164 @@
+#!/usr/bin python3
+
+"""
+Cache key schema.
+
+Keys take the form ``<prefix>::G<generation>::<digest>``, where the digest
+is a 256-bit BLAKE2b hash of a canonical encoding of the arguments.
+
+The generation is a counter held in Redis. Incrementing it retires every
+entry written under the previous generation in one operation; retired
+entries are no longer read and expire with their TTLs.
+
+Usage:
+
+    python -m app.caching.keys retire
+"""
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import AsyncContextManager, Callable, Tuple, Union
+from hashlib import blake2b
+from asyncio import run
+from time import monotonic
+import sys
+
+# 3rd party:
+from orjson import dumps as json_dumps, OPT_SORT_KEYS, OPT_NON_STR_KEYS
+
+# Internal:
+from app.config import Settings
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'GENERATION_KEY',
+    'build_key',
+    'build_sharded_key',
+    'namespace',
+    'split_key',
+    'generations'
+]
+
+
+GENERATION_KEY = "FRONTEND::GENERATION"
+DIGEST_SIZE = 32  # bytes
+SEPARATOR = "::"
+
+
+def digest(*args, **kwargs) -> str:
+    # Arguments are serialised as JSON rather than joined, such that
+    # ("a|b", "c") and ("a", "b|c") - or 1 and "1" - produce distinct keys.
+    payload = json_dumps(
+        [args, kwargs],
+        default=str,
+        option=OPT_SORT_KEYS | OPT_NON_STR_KEYS
+    )
+
+    return blake2b(payload, digest_size=DIGEST_SIZE).hexdigest()
+
+
+def namespace(prefix: str, generation: int) -> str:
+    return f"{prefix.rstrip(':')}{SEPARATOR}G{generation}"
+
+
+def build_key(prefix: str, generation: int, *args, **kwargs) -> str:
+    """
+    Builds the cache key for an entry identified by ``args`` and ``kwargs``.
+    """
+    return f"{namespace(prefix, generation)}{SEPARATOR}{digest(*args, **kwargs)}"
+
+
+def build_sharded_key(prefix: str, generation: int, shard: str, *args, **kwargs) -> str:
+    """
+    Builds the cache key for an entry that belongs to a shard of the
+    namespace - e.g. for entries stored as fields of per-shard hashes.
+    """
+    return f"{namespace(prefix, generation)}{SEPARATOR}{shard}{SEPARATOR}{digest(*args, **kwargs)}"
+
+
+def split_key(key: str) -> Tuple[str, str]:
+    """
+    Splits a key into its namespace and digest - e.g. for entries
+    stored as fields of a hash named after the namespace.
+    """
+    name, _, key_digest = key.rpartition(SEPARATOR)
+    return name, key_digest
+
+
+class Generations:
+    """
+    Tracks the current cache generation.
+
+    The generation is read from Redis at most once per ``refresh_interval``
+    seconds per worker, so other workers observe a retired generation
+    within that interval.
+    """
+
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._value: Union[int, None] = None
+        self._expires_at = 0.0
+
+    def set(self, value: int):
+        self._value = value
+        self._expires_at = monotonic() + self.refresh_interval
+
+    async def get(self, connect: Callable[[], AsyncContextManager]) -> int:
+        if self._value is not None and self._expires_at > monotonic():
+            return self._value
+
+        async with connect() as redis:
+            value = await redis.get(GENERATION_KEY)
+
+        self.set(int(value or 0))
+        return self._value
+
+    async def retire(self, connect: Callable[[], AsyncContextManager]) -> int:
+        """
+        Retires the current generation, returning the new one.
+        """
+        async with connect() as redis:
+            value = await redis.incr(GENERATION_KEY)
+
+        self.set(value)
+        return value
+
+
+generations = Generations(**Settings.cache_keys)
+
+
+async def retire() -> int:
+    from aioredis import create_redis
+
+    redis = await create_redis(
+        Settings.redis["address"],
+        password=Settings.redis["password"],
+        db=2
+    )
+
+    try:
+        generation = await redis.incr(GENERATION_KEY)
+
+        # Hashes are named after their namespace - or after a shard of
+        # it - and do not expire with their fields, so those of the
+        # retired generation are removed here.
+        retired = namespace("*", generation - 1)
+
+        for pattern in [retired, f"{retired}{SEPARATOR}*"]:
+            async for key in redis.iscan(match=pattern):
+                if await redis.type(key) == b"hash":
+                    await redis.unlink(key)
+
+        return generation
+    finally:
+        redis.close()
+        await redis.wait_closed()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["retire"]:
+        sys.exit(__doc__.split("Usage:")[1])
+
+    print(f"Cache generation is now {run(retire())}.")
@@ -0,0 +1,184 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Any, Dict, NamedTuple, Union
+from collections import OrderedDict
+from sys import getsizeof
+from time import monotonic
+
+# 3rd party:
+
+# Internal:
+from app.config import Settings
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'LocalCache',
+    'local_cache'
+]
+
+
+def estimate_size(value: Any, depth: int = 3) -> int:
+    """
+    Estimates the memory held by a decoded value, in bytes.
+
+    The items of lists, tuples, and dicts are assumed to be of the size
+    of their first item, which is estimated in turn up to ``depth``
+    levels deep. Keys of dicts are not counted, as decoded records share
+    them. Other objects are measured by ``sys.getsizeof`` - which for
+    ``Table`` includes the values of its columns.
+
+    Values that are shared between items are counted for each, so the
+    estimate errs on the side of the budget.
+    """
+    size = getsizeof(value)
+
+    if not depth or not value or not isinstance(value, (list, tuple, dict)):
+        return size
+
+    first = next(iter(value.values())) if isinstance(value, dict) else value[0]
+
+    return size + len(value) * estimate_size(first, depth - 1)
+
+
+class LocalCacheItem(NamedTuple):
+    value: Any
+    size: int
+    expires_at: float
+
+
+class LocalCache:
+    """
+    Bounded, per-worker in-memory cache that sits in front of Redis.
+
+    Items hold already-decoded objects, so a hit costs neither a network
+    round trip nor deserialisation. Items expire after their TTL and the
+    least recently used items are evicted once the byte budget is exceeded.
+    Expired items remain available through ``get_stale`` until evicted.
+
+    Parameters
+    ----------
+    max_bytes: int
+        Budget for the memory held by the decoded items of the cache, in
+        bytes. The size of each item is estimated by ``estimate_size``.
+
+    max_ttl: int
+        Upper bound for the TTL of any item in seconds. Items retrieved from
+        Redis carry no remaining TTL, so this also bounds how long a worker
+        may serve a value that has since been replaced in Redis.
+    """
+
+    def __init__(self, max_bytes: int, max_ttl: int):
+        self.max_bytes = max_bytes
+        self.max_ttl = max_ttl
+        self._items: Dict[str, LocalCacheItem] = OrderedDict()
+        self._size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key: str) -> bool:
+        item = self._items.get(key)
+        return item is not None and item.expires_at > monotonic()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        item = self._items.get(key)
+
+        if item is None:
+            self.misses += 1
+            return default
+
+        if item.expires_at <= monotonic():
+            # Expired items are retained until they are evicted or replaced
+            # so that they may still be served as stale values.
+            self.misses += 1
+            return default
+
+        self._items.move_to_end(key)
+        self.hits += 1
+
+        return item.value
+
+    def get_stale(self, key: str, default: Any = None) -> Any:
+        """
+        Returns the item irrespective of its expiry.
+        """
+        item = self._items.get(key)
+
+        if item is None:
+            return default
+
+        return item.value
+
+    def set(self, key: str, value: Any, ttl: Union[int, None] = None) -> bool:
+        if value is None or not self.max_ttl:
+            return False
+
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return False
+
+        ttl = min(ttl or self.max_ttl, self.max_ttl)
+
+        if key in self._items:
+            self._remove(key)
+
+        self._items[key] = LocalCacheItem(value, size, monotonic() + ttl)
+        self._size += size
+
+        while self._size > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self._size -= evicted.size
+            self.evictions += 1
+
+        return True
+
+    def delete(self, key: str) -> bool:
+        if key not in self._items:
+            return False
+
+        self._remove(key)
+        return True
+
+    def delete_prefix(self, prefix: str) -> int:
+        keys = [key for key in self._items if key.startswith(prefix)]
+
+        for key in keys:
+            self._remove(key)
+
+        return len(keys)
+
+    def clear(self):
+        self._items.clear()
+        self._size = 0
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        total = self.hits + self.misses
+
+        return {
+            "items": len(self._items),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / total if total else 0.0
+        }
+
+    def _remove(self, key: str):
+        item = self._items.pop(key)
+        self._size -= item.size
+
+
+local_cache = LocalCache(**Settings.local_cache)
@@ -0,0 +1,193 @@
+#!/usr/bin python3
+
+"""
+Negative caching.
+
+Keys whose lookups produced no results are recorded per release in a Redis
+sorted set, scored by the time at which they expire. Each worker mirrors
+the set of the current release in a Bloom filter, such that lookups of
+keys that have not been recorded - the vast majority - are answered
+without a round trip. Keys that are possibly recorded are confirmed
+against Redis, which also guards against false positives.
+"""
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Union
+from hashlib import blake2b
+from math import ceil, log
+from time import monotonic, time
+import logging
+
+# 3rd party:
+
+# Internal:
+from .redis import Redis, current_generation
+from .keys import build_key
+from .stats import PrefixStats, cache_stats
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'BloomFilter',
+    'NegativeCache'
+]
+
+
+logger = logging.getLogger("app")
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over string keys.
+
+    The filter is sized for ``capacity`` keys at a false positive rate of
+    ``error_rate``; the rate rises as more keys are added.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = ceil(-capacity * log(error_rate) / log(2) ** 2)
+        self.hash_count = max(1, round(self.size / capacity * log(2)))
+        self.count = 0
+        self._bits = bytearray(ceil(self.size / 8))
+
+    def _positions(self, key: str):
+        # Double hashing - two independent 64-bit hashes produce
+        # ``hash_count`` positions.
+        hashed = blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(hashed[:8], "little")
+        second = int.from_bytes(hashed[8:], "little") | 1
+
+        for index in range(self.hash_count):
+            yield (first + index * second) % self.size
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+class NegativeCache:
+    """
+    Records keys whose lookups produced no results for ``ttl`` seconds.
+
+    Keys are recorded per release, so a new release starts with an empty
+    cache. Each worker pulls the keys recorded by other workers at most
+    once every ``sync_interval`` seconds.
+
+    Parameters
+    ----------
+    prefix: str
+        Prefix of the Redis key of the sorted set.
+
+    ttl: int
+        Number of seconds for which a key is recorded.
+
+    capacity: int
+        Expected number of keys recorded per release.
+
+    error_rate: float
+        False positive rate of the Bloom filter at capacity.
+
+    sync_interval: float
+        Number of seconds between updates of the Bloom filter from Redis.
+    """
+
+    def __init__(self, prefix: str, ttl: int, capacity: int, error_rate: float,
+                 sync_interval: float):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+
+        self._key: Union[str, None] = None
+        self._filter = BloomFilter(capacity, error_rate)
+        self._synced_at = 0.0
+        self._sync_due = 0.0
+
+    @property
+    def stats(self) -> PrefixStats:
+        return cache_stats[self.prefix]
+
+    async def _set_key(self, request, release: str) -> str:
+        generation = await current_generation(request)
+        cache_key = build_key(self.prefix, generation, release)
+
+        if cache_key != self._key or self._filter.count > self.capacity:
+            # Rebuilt for each release, and where expired keys have
+            # saturated the filter.
+            self._key = cache_key
+            self._filter = BloomFilter(self.capacity, self.error_rate)
+            self._synced_at = 0.0
+            self._sync_due = 0.0
+
+        return cache_key
+
+    async def _sync(self, request, cache_key: str):
+        now = monotonic()
+        if self._sync_due > now:
+            return
+
+        # Claimed up front, so that concurrent lookups do not sync again.
+        self._sync_due = now + self.sync_interval
+        synced_at = time()
+
+        # Keys are scored by their expiry, so those recorded since the
+        # previous sync score higher than it did plus the TTL - and those
+        # that remain recorded score higher than the current time.
+        min_score = self._synced_at + self.ttl if self._synced_at else synced_at
+
+        try:
+            async with Redis(request, cache_key) as redis:
+                members = await redis.zrangebyscore(cache_key, min_score)
+        except Exception as err:
+            self._sync_due = 0.0
+            logger.warning(f"Failed to sync the negative cache '{cache_key}': {err}")
+            return
+
+        for member in members:
+            self._filter.add(member.decode())
+
+        self._synced_at = synced_at
+
+    async def contains(self, request, release: str, key: str) -> bool:
+        """
+        Determines whether the lookup of ``key`` produced no results
+        within the last ``ttl`` seconds.
+        """
+        cache_key = await self._set_key(request, release)
+        await self._sync(request, cache_key)
+
+        if key not in self._filter:
+            self.stats.misses += 1
+            return False
+
+        async with Redis(request, cache_key) as redis:
+            expires_at = await redis.zscore(cache_key, key)
+
+        if expires_at is None or expires_at <= time():
+            self.stats.misses += 1
+            return False
+
+        self.stats.redis_hits += 1
+        return True
+
+    async def add(self, request, release: str, key: str):
+        """
+        Records that the lookup of ``key`` produced no results.
+        """
+        cache_key = await self._set_key(request, release)
+        self._filter.add(key)
+
+        async with Redis(request, cache_key) as redis:
+            await redis.add_expiring_member(cache_key, key, time() + self.ttl, expire=self.ttl)
@@ -3,36 +3,53 @@
 # Imports
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # Python:
-from typing import NoReturn, Union, List
+from typing import Any, Callable, Dict, NoReturn, Union, List, Tuple
+from asyncio import Semaphore, gather
 from inspect import signature
-from hashlib import blake2b
-from functools import wraps
-from pickle import loads, dumps
 from datetime import datetime
+from functools import partial
+from time import perf_counter, time
 import logging
 
 # 3rd party:
-from pandas import DataFrame, read_json
-from orjson import dumps as json_dumps, loads as json_loads
+from orjson import loads as json_loads, JSONDecodeError
 
 # Internal: 
 from app.middleware.tracers.utils import trace_async_method_operation
 from app.config import Settings
+from app.common.data.table import Table
+from .local import local_cache
+from .shared import shared_cache
+from .singleflight import coalesce, revalidate
+from .codec import DecodeError, Expiry, encode, decode, is_encoded, read_expiry
+from .keys import GENERATION_KEY, build_key, build_sharded_key, split_key, generations
+from .stats import PrefixStats, cache_stats
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 __all__ = [
     'Redis',
+    'current_generation',
+    'retire_generation',
     'from_cache_or_func',
-    'from_cache_or_db',
     'FromCacheOrDBMainData',
     'FromCacheOrDB'
 ]
 
 
+logger = logging.getLogger("app")
+
+
 DEFAULT_CACHE_TTL = 36 * 60 * 60  # 36 hours in seconds
 LONG_TERM_CACHE_TTL = 36 * 60 * 60 * 24 * 180  # 180 days
 
+RELEASE_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
 
 class Redis:
     _name = "Redis"
@@ -110,6 +127,29 @@ class Redis:
     async def set(self, key, value, expire=None):
         return await self._conn.set(key, value, expire=expire, exist='SET_IF_NOT_EXIST')
 
+    @trace_async_method_operation(
+        "url", "_key",
+        name="account_name",
+        dep_type="_name",
+        action="SETEX"
+    )
+    async def replace(self, key, value, expire=None):
+        return await self._conn.set(key, value, expire=expire)
+
+    @trace_async_method_operation(
+        "url", "_key",
+        name="account_name",
+        dep_type="_name",
+        action="PIPELINE SETEX NX"
+    )
+    async def set_many(self, items: Dict[str, bytes], expire=None):
+        pipe = self._conn.pipeline()
+
+        for key, value in items.items():
+            pipe.set(key, value, expire=expire, exist='SET_IF_NOT_EXIST')
+
+        return await pipe.execute()
+
     @trace_async_method_operation(
         "url", "_key",
         name="account_name",
@@ -119,6 +159,107 @@ class Redis:
     async def hset(self, key, field, value):
         return await self._conn.hset(key, field, value)
 
+    @trace_async_method_operation(
+        "url", "_key",
+        name="account_name",
+        dep_type="_name",
+        action="PIPELINE HSET EXPIRE HLEN"
+    )
+    async def hset_with_expiry(self, key, field, value, expire):
+        """
+        Sets a hash field and the expiry of the hash, returning
+        the number of fields in the hash.
+        """
+        pipe = self._conn.pipeline()
+        pipe.hset(key, field, value)
+        pipe.expire(key, expire)
+        pipe.hlen(key)
+
+        _, _, length = await pipe.execute()
+        return length
+
+    @trace_async_method_operation(
+        "url", "_key",
+        name="account_name",
+        dep_type="_name",
+        action="HSCAN HDEL"
+    )
+    async def evict_fields(self, key, count):
+        """
+        Removes up to ``count`` arbitrary fields from a hash.
+        """
+        _, items = await self._conn.hscan(key, count=count)
+        fields = [field for field, _ in items[:count]]
+
+        if not fields:
+            return 0
+
+        return await self._conn.hdel(key, *fields)
+
+    @trace_async_method_operation(
+        "url", "_key",
+        name="account_name",
+        dep_type="_name",
+        action="HDEL"
+    )
+    async def hdel(self, key, *fields):
+        return await self._conn.hdel(key, *fields)
+
+    @trace_async_method_operation(
+        "url", "_key",
+        name="account_name",
+        dep_type="_name",
+        action="TTL"
+    )
+    async def ttl(self, key):
+        return await self._conn.ttl(key)
+
+    @trace_async_method_operation(
+        "url", "_key",
+        name="account_name",
+        dep_type="_name",
+        action="EXPIRE"
+    )
+    async def expire(self, key, timeout):
+        return await self._conn.expire(key, timeout)
+
+    @trace_async_method_operation(
+        "url", "_key",
+        name="account_name",
+        dep_type="_name",
+        action="PIPELINE ZREMRANGEBYSCORE ZADD EXPIRE"
+    )
+    async def add_expiring_member(self, key, member, expires_at, expire):
+        """
+        Adds a member to a sorted set scored by the expiry of its members,
+        and removes those that have expired. The set itself expires
+        ``expire`` seconds after it was last added to.
+        """
+        pipe = self._conn.pipeline()
+        pipe.zremrangebyscore(key, max=time())
+        pipe.zadd(key, expires_at, member)
+        pipe.expire(key, expire)
+
+        await pipe.execute()
+
+    @trace_async_method_operation(
+        "url", "_key",
+        name="account_name",
+        dep_type="_name",
+        action="ZSCORE"
+    )
+    async def zscore(self, key, member):
+        return await self._conn.zscore(key, member)
+
+    @trace_async_method_operation(
+        "url", "_key",
+        name="account_name",
+        dep_type="_name",
+        action="ZRANGEBYSCORE"
+    )
+    async def zrangebyscore(self, key, min_score):
+        return await self._conn.zrangebyscore(key, min=min_score, exclude=self._conn.ZSET_EXCLUDE_MIN)
+
     @trace_async_method_operation(
         "url",
         name="account_name",
@@ -128,6 +269,51 @@ class Redis:
     async def mget(self, *keys):
         return await self._conn.mget(*keys)
 
+    @trace_async_method_operation(
+        "url", "_key",
+        name="account_name",
+        dep_type="_name",
+        action="SET NX PX"
+    )
+    async def acquire_lock(self, key, token, expire_ms):
+        return await self._conn.set(key, token, pexpire=expire_ms, exist='SET_IF_NOT_EXIST')
+
+    @trace_async_method_operation(
+        "url", "_key",
+        name="account_name",
+        dep_type="_name",
+        action="EVAL"
+    )
+    async def release_lock(self, key, token):
+        return await self._conn.eval(RELEASE_LOCK_SCRIPT, keys=[key], args=[token])
+
+    @trace_async_method_operation(
+        "url", "_key",
+        name="account_name",
+        dep_type="_name",
+        action="PUBLISH"
+    )
+    async def publish(self, channel, message):
+        return await self._conn.publish(channel, message)
+
+    @trace_async_method_operation(
+        "url", "_key",
+        name="account_name",
+        dep_type="_name",
+        action="INCR"
+    )
+    async def incr(self, key):
+        return await self._conn.incr(key)
+
+    @trace_async_method_operation(
+        "url", "_key",
+        name="account_name",
+        dep_type="_name",
+        action="DEL"
+    )
+    async def delete(self, *keys):
+        return await self._conn.delete(*keys)
+
     @trace_async_method_operation(
         "url",
         name="account_name",
@@ -138,85 +324,202 @@ class Redis:
         return await self._conn.ping()
 
 
-async def from_cache_or_func(request, func, prefix, expire, with_request=False, *args, **kwargs):
-    key = [*args, *kwargs.values()]
-    raw_key = str.join("|", map(str, key))
-    cache_key = prefix + blake2b(raw_key.encode(), digest_size=6).hexdigest()
+def _retain(key: str, value, payload: bytes, ttl: int, stats: PrefixStats,
+            refresh: Union[Callable[[], Any], None] = None, shared: bool = True):
+    """
+    Retains a value read from Redis in the local tier, and its payload in
+    the tier shared by the workers of the node, for no longer than it
+    remains fresh. Stale values are not retained; a refresh is scheduled
+    instead.
+    """
+    expiry = read_expiry(payload)
+
+    if expiry is None:
+        # Entries written before expiries were stored with payloads.
+        fresh_for = ttl
+    elif expiry.is_stale:
+        stats.stale_hits += 1
+
+        if refresh is not None:
+            refresh()
+
+        return
+    else:
+        fresh_for = expiry.fresh_for
+
+    local_cache.set(key, value, ttl=fresh_for)
+
+    if shared:
+        shared_cache.set(key, payload, ttl=fresh_for)
+
+
+def _decode(key: str, payload: bytes, decode_payload: Callable[[bytes], Any], stats: PrefixStats):
+    """
+    Decodes a cached payload, or returns ``None`` where it cannot be
+    decoded - e.g. where it was written by another version of the codec -
+    such that it is treated as a miss, and replaced once recomputed.
+    """
+    start = perf_counter()
+
+    try:
+        value = decode_payload(payload)
+    except DecodeError as err:
+        stats.undecodable += 1
+        logger.warning(f"Discarding cache entry '{key}': {err}")
+        return None
+
+    stats.record_decode(len(payload), perf_counter() - start)
+    return value
+
+
+def _from_shared(key: str, decode_payload: Callable[[bytes], Any], ttl: int, stats: PrefixStats):
+    """
+    Reads a value from the tier shared by the workers of the node, and
+    retains it in the local tier.
+    """
+    payload = shared_cache.get(key)
+
+    if payload is None:
+        return None
+
+    if (value := _decode(key, payload, decode_payload, stats)) is None:
+        shared_cache.delete(key)
+        return None
+
+    stats.shared_hits += 1
+
+    _retain(key, value, payload, ttl=ttl, stats=stats, shared=False)
+    return value
 
-    async with Redis(request, raw_key) as redis:
-        redis_result = await redis.get(cache_key)
 
-        if redis_result is not None:
-            return loads(redis_result)
+def _is_expired(payload: bytes) -> bool:
+    expiry = read_expiry(payload)
+    return expiry is not None and expiry.is_expired
 
+
+async def current_generation(request) -> int:
+    return await generations.get(partial(Redis, request, GENERATION_KEY))
+
+
+async def retire_generation(request) -> int:
+    """
+    Retires all cache entries in one operation by moving on to a new
+    generation of keys. Other workers follow within the generation
+    refresh interval.
+    """
+    return await generations.retire(partial(Redis, request, GENERATION_KEY))
+
+
+async def from_cache_or_func(request, func, prefix, expire, with_request=False, *args,
+                             stale_ttl=None, **kwargs):
+    """
+    Returns the result of ``func`` from the cache, or computes and caches it.
+
+    Values are fresh for ``expire`` seconds. Thereafter, they remain in the
+    cache for another ``stale_ttl`` seconds, during which the stale value is
+    served while it is refreshed in the background. Values are recomputed
+    on demand once both have elapsed.
+    """
+    raw_key = str.join("|", map(str, [*args, *kwargs.values()]))
+    cache_key = build_key(prefix, await current_generation(request), *args, **kwargs)
+
+    if stale_ttl is None:
+        stale_ttl = Settings.cache_revalidation["stale_ttl"]
+
+    stats = cache_stats[prefix]
+
+    if (local_result := local_cache.get(cache_key)) is not None:
+        stats.local_hits += 1
+        return local_result
+
+    if (shared_result := _from_shared(cache_key, decode, ttl=expire, stats=stats)) is not None:
+        return shared_result
+
+    async def compute(redis, replace=False):
         if with_request:
-            result = await func(request, *args, **kwargs)
+            computed = await func(request, *args, **kwargs)
         else:
-            result = await func(*args, **kwargs)
+            computed = await func(*args, **kwargs)
 
-        await redis.set(cache_key, dumps(result), expire)
+        payload = encode(computed, Expiry.from_ttl(expire, stale_ttl))
 
-    return result
+        if replace:
+            await redis.replace(cache_key, payload, expire + stale_ttl)
+        else:
+            await redis.set(cache_key, payload, expire + stale_ttl)
 
+        local_cache.set(cache_key, computed, ttl=expire)
+        shared_cache.set(cache_key, payload, ttl=expire)
+        return computed
 
-def from_cache_or_db(prefix, ttl=DEFAULT_CACHE_TTL):
-    def outer(func):
-        sig = signature(func)
+    refresh = partial(
+        revalidate,
+        connect=partial(Redis, request, raw_key),
+        key=cache_key,
+        refresh=partial(compute, replace=True)
+    )
 
-        @wraps(func)
-        async def inner(*args, **kwargs):
-            bound_inputs = sig.bind(*args, **kwargs)
-            request = bound_inputs.arguments.pop("request")
-            try:
-                area_id = bound_inputs.arguments["area_id"]
-                if bound_inputs.arguments["area_type"] == "overview":
-                    area_id = "UK"
-                timestamp = datetime.strptime(bound_inputs.arguments["timestamp"], "%Y_%m_%d")
-                raw_key = cache_key = f"area-{timestamp:%Y-%m-%d}-{area_id}"
-            except KeyError:
-                key = [*bound_inputs.args, *bound_inputs.kwargs.values()]
-                raw_key = str.join("|", map(str, key))
-                cache_key = prefix + blake2b(raw_key.encode(), digest_size=6).hexdigest()
-
-            async with Redis(request, raw_key) as redis:
-                redis_result = await redis.get(cache_key)
-
-                if redis_result is not None:
-                    result = (
-                        read_json(redis_result, orient="records")
-                        .rename(columns={
-                            "area_type": "areaType",
-                            "area_name": "areaName",
-                            "area_code": "areaCode"
-                        })
-                    )
-                    return result
-
-                result: DataFrame = await func(request, *bound_inputs.args, **bound_inputs.kwargs)
-                await redis.set(
-                    key=cache_key,
-                    value=(
-                        result
-                        .rename(columns={
-                            "areaType": "area_type",
-                            "areaName": "area_name",
-                            "areaCode": "area_code"
-                        })
-                        .to_json(orient="records")
-                    ),
-                    expire=ttl
-                )
+    async with Redis(request, raw_key) as redis:
+        async def read():
+            redis_result = await redis.get(cache_key)
+
+            if redis_result is None or _is_expired(redis_result):
+                return None
+
+            if (cached := _decode(cache_key, redis_result, decode, stats)) is None:
+                # Writes do not replace existing entries.
+                await redis.delete(cache_key)
+                return None
 
+            _retain(cache_key, cached, redis_result, ttl=expire, stats=stats, refresh=refresh)
+            return cached
+
+        if (result := await read()) is not None:
+            stats.redis_hits += 1
             return result
 
-        return inner
-    return outer
+        stats.misses += 1
+        start = perf_counter()
+
+        result = await coalesce(
+            redis,
+            cache_key,
+            compute=partial(compute, redis),
+            read=read,
+            stale=partial(local_cache.get_stale, cache_key)
+        )
+
+        stats.record_fill(perf_counter() - start)
+
+    return result
 
 
 class FromCacheOrDBBase:
-    def __init__(self, prefix, ttl=DEFAULT_CACHE_TTL):
+    """
+    Caches the results of a database query function.
+
+    Results are fresh for ``ttl`` seconds. Thereafter, they are served for
+    another ``stale_ttl`` seconds while they are refreshed in the background,
+    and are recomputed on demand once both have elapsed.
+
+    Empty results are not cached where ``cache_empty`` is ``False``.
+    """
+    def __init__(self, prefix, ttl=DEFAULT_CACHE_TTL, stale_ttl=None, cache_empty=True):
         self.prefix = prefix
         self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.cache_empty = cache_empty
+
+        if stale_ttl is None:
+            self.stale_ttl = Settings.cache_revalidation["stale_ttl"]
+
+    @property
+    def hard_ttl(self) -> int:
+        return self.ttl + self.stale_ttl
+
+    @property
+    def stats(self) -> PrefixStats:
+        return cache_stats[self.prefix]
 
     def __call__(self, func):
         self.func = func
@@ -224,7 +527,7 @@ class FromCacheOrDBBase:
 
         return self._execute
 
-    def cache_key(self, bound_inputs, area_id, area_type) -> str:
+    def cache_key(self, bound_inputs, generation, area_id, area_type) -> str:
         raise NotImplementedError()
 
     async def _execute(self, *args, **kwargs):
@@ -237,63 +540,236 @@ class FromCacheOrDBBase:
             area_id = None
             area_type = None
 
+        generation = await current_generation(request)
+
         if area_id is None:
-            cache_key = self.cache_key(bound_inputs, area_id=area_id, area_type=area_type)
+            cache_key = self.cache_key(bound_inputs, generation, area_id=area_id, area_type=area_type)
         elif isinstance(area_id, str):
-            cache_key = self.cache_key(bound_inputs, area_id=area_id, area_type=area_type)
+            cache_key = self.cache_key(bound_inputs, generation, area_id=area_id, area_type=area_type)
         else:
             cache_key = [
-                self.cache_key(bound_inputs, area_id=aid, area_type=atype)
+                self.cache_key(bound_inputs, generation, area_id=aid, area_type=atype)
                 for aid, atype in zip(area_id, area_type)
             ]
 
-        async with Redis(request, cache_key) as redis:
-            results: Union[DataFrame, bytes] = await self._from_cache(redis, cache_key)
+        if area_id is None:
+            area_kws = dict()
+        elif isinstance(area_id, str):
+            area_kws = dict(area_id=area_id, area_type=area_type)
 
-            if isinstance(cache_key, (str, bytes)) and results is not None:
-                return self.process_cache_results(results)
-            elif isinstance(cache_key, (str, bytes)):
-                results = await self.func(
-                    request,
-                    *bound_inputs.args,
-                    area_id=area_id,
-                    area_type=area_type,
-                    **bound_inputs.kwargs
-                )
-                db_results = self.process_db_results(results)
-                await self._cache_results(redis, cache_key, db_results)
-            elif hasattr(cache_key, "__iter__"):
-                for index, (key, res) in enumerate(zip(cache_key, results)):
-                    if res is not None:
-                        results[index] = self.process_cache_results(res)
+        if isinstance(cache_key, (str, bytes)):
+            local_result = local_cache.get(cache_key)
+            if local_result is not None:
+                self.stats.local_hits += 1
+                return local_result
+
+            shared_result = _from_shared(cache_key, self.process_cache_results, ttl=self.ttl, stats=self.stats)
+            if shared_result is not None:
+                return shared_result
+
+            async with Redis(request, cache_key) as redis:
+                refresh = partial(self._revalidate, request, bound_inputs, cache_key, **area_kws)
+
+                if (results := await self._read(redis, cache_key, refresh=refresh)) is not None:
+                    self.stats.redis_hits += 1
+                    return results
+
+                self.stats.misses += 1
+                start = perf_counter()
+
+                results = await self._fill(redis, request, bound_inputs, cache_key, **area_kws)
+
+                self.stats.record_fill(perf_counter() - start)
+                return results
+
+        results = [local_cache.get(key) for key in cache_key]
+        self.stats.local_hits += sum(res is not None for res in results)
+
+        for index, key in enumerate(cache_key):
+            if results[index] is None:
+                results[index] = _from_shared(key, self.process_cache_results, ttl=self.ttl, stats=self.stats)
+
+        missing = [index for index, res in enumerate(results) if res is None]
+
+        if not missing:
+            return results
+
+        missing_keys = [cache_key[index] for index in missing]
+
+        async with Redis(request, missing_keys) as redis:
+            cache_results = await self._from_cache(redis, missing_keys)
+
+            fills = list()
+            undecodable = list()
+            for index, key, res in zip(missing, missing_keys, cache_results):
+                area_kws = dict(area_id=area_id[index], area_type=area_type[index])
+
+                if res is not None and not _is_expired(res):
+                    refresh = partial(self._revalidate, request, bound_inputs, key, **area_kws)
+                    results[index] = self._from_cache_result(key, res, refresh=refresh)
+
+                    if results[index] is not None:
                         continue
 
-                    db_res = await self.func(
-                        request,
-                        *bound_inputs.args,
-                        area_id=area_id[index],
-                        area_type=area_type[index],
-                        **bound_inputs.kwargs
-                    )
+                    undecodable.append(key)
+
+                fills.append((index, key, area_kws))
+
+            if undecodable:
+                await self._discard(redis, undecodable)
 
-                    results[index] = self.process_db_results(db_res)
+            self.stats.redis_hits += len(missing) - len(fills)
+            self.stats.misses += len(fills)
 
-                    await self._cache_results(redis, key, results[index])
-            elif area_id is None:
-                results = await self.func(
+            if fills:
+                filled = await self._fill_many(
+                    redis,
                     request,
-                    *bound_inputs.args,
-                    **bound_inputs.kwargs
+                    bound_inputs,
+                    [(key, area_kws) for _, key, area_kws in fills]
                 )
-                db_results = self.process_db_results(results)
-                await self._cache_results(redis, cache_key, db_results)
+
+                for (index, _, _), res in zip(fills, filled):
+                    results[index] = res
 
         return results
 
-    def process_db_results(self, results: DataFrame) -> bytes:
+    async def _read(self, redis, cache_key: str, refresh: Union[Callable[[], Any], None] = None):
+        cache_result = await self._from_cache(redis, cache_key)
+
+        if cache_result is None or _is_expired(cache_result):
+            return None
+
+        if (decoded := self._from_cache_result(cache_key, cache_result, refresh=refresh)) is None:
+            await self._discard(redis, [cache_key])
+
+        return decoded
+
+    def _revalidate(self, request, bound_inputs, cache_key: str, **area_kws) -> bool:
+        async def refresh(redis):
+            return await self._compute(redis, request, bound_inputs, cache_key, replace=True, **area_kws)
+
+        return revalidate(
+            connect=partial(Redis, request, cache_key),
+            key=cache_key,
+            refresh=refresh
+        )
+
+    async def _compute(self, redis, request, bound_inputs, cache_key: str,
+                       pending: Union[Dict[str, bytes], None] = None,
+                       replace: bool = False, **area_kws):
+        results = await self.func(
+            request,
+            *bound_inputs.args,
+            **area_kws,
+            **bound_inputs.kwargs
+        )
+
+        if not self.cache_empty and not len(results):
+            return results
+
+        db_results = self.process_db_results(results, Expiry.from_ttl(self.ttl, self.stale_ttl))
+
+        if pending is None:
+            await self._cache_results(redis, cache_key, db_results, replace=replace)
+        else:
+            pending[cache_key] = db_results
+
+        return self._from_cache_result(cache_key, db_results)
+
+    async def _fill(self, redis, request, bound_inputs, cache_key: str,
+                    pending: Union[Dict[str, bytes], None] = None, **area_kws):
+        compute = partial(
+            self._compute,
+            redis,
+            request,
+            bound_inputs,
+            cache_key,
+            pending=pending,
+            **area_kws
+        )
+
+        return await coalesce(
+            redis,
+            cache_key,
+            compute=compute,
+            read=partial(self._read, redis, cache_key),
+            stale=partial(local_cache.get_stale, cache_key)
+        )
+
+    async def _fill_many(self, redis, request, bound_inputs,
+                         fills: List[Tuple[str, Dict[str, Any]]]) -> List[Any]:
+        """
+        Fills multiple cache misses concurrently, with a bounded number of
+        computations in flight, and writes the computed payloads back to
+        Redis in a single pipeline.
+
+        Failures are isolated per key: the error is logged and ``None`` is
+        returned in place of the value. The first error is only raised if
+        every key fails.
+        """
+        semaphore = Semaphore(Settings.cache_fill["concurrency"])
+        pending: Dict[str, bytes] = dict()
+
+        async def fill(cache_key, area_kws):
+            async with semaphore:
+                start = perf_counter()
+
+                result = await self._fill(
+                    redis,
+                    request,
+                    bound_inputs,
+                    cache_key,
+                    pending=pending,
+                    **area_kws
+                )
+
+                self.stats.record_fill(perf_counter() - start)
+                return result
+
+        results = await gather(
+            *(fill(cache_key, area_kws) for cache_key, area_kws in fills),
+            return_exceptions=True
+        )
+
+        # Locks are released as each computation completes, so workers that
+        # miss in the interval before the write may compute the value again.
+        # The write does not overwrite values that have since been set.
+        if pending:
+            try:
+                await self._cache_many(redis, pending)
+            except Exception as err:
+                logger.exception(f"Failed to write {len(pending)} keys to the cache: {err}")
+
+        errors = [res for res in results if isinstance(res, BaseException)]
+
+        if len(errors) == len(results):
+            raise errors[0]
+
+        for (cache_key, _), res in zip(fills, results):
+            if isinstance(res, BaseException):
+                logger.error(f"Failed to fill '{cache_key}': {res!r}", exc_info=res)
+
+        return [None if isinstance(res, BaseException) else res for res in results]
+
+    def _from_cache_result(self, cache_key: str, results: bytes,
+                           refresh: Union[Callable[[], Any], None] = None):
+        """
+        Decodes a cached payload and retains the decoded object in the
+        local (in-process) tier, so that subsequent lookups skip both
+        Redis and the decoding step. Returns ``None`` where the payload
+        cannot be decoded.
+        """
+        if (decoded := _decode(cache_key, results, self.process_cache_results, self.stats)) is None:
+            return None
+
+        _retain(cache_key, decoded, results, ttl=self.ttl, stats=self.stats, refresh=refresh)
+        return decoded
+
+    def process_db_results(self, results: Any, expiry: Expiry) -> bytes:
         raise NotImplementedError()
 
-    def process_cache_results(self, results: bytes) -> DataFrame:
+    def process_cache_results(self, results: bytes) -> Any:
         raise NotImplementedError()
 
     async def _from_cache(self, redis, cache_key: Union[str, List[str]]) -> Union[bytes, List[bytes]]:
@@ -302,82 +778,162 @@ class FromCacheOrDBBase:
 
         return await redis.get_all(cache_key)
 
-    async def _cache_results(self, redis, cache_key: str, results: bytes) -> NoReturn:
+    async def _cache_results(self, redis, cache_key: str, results: bytes, replace: bool = False) -> NoReturn:
+        if replace:
+            await redis.replace(key=cache_key, value=results, expire=self.hard_ttl)
+            return
+
         await redis.set(
             key=cache_key,
             value=results,
-            expire=self.ttl
+            expire=self.hard_ttl
         )
 
+    async def _cache_many(self, redis, results: Dict[str, bytes]) -> NoReturn:
+        await redis.set_many(results, expire=self.hard_ttl)
+
+    async def _discard(self, redis, cache_keys: List[str]) -> NoReturn:
+        # Writes do not replace existing entries.
+        await redis.delete(*cache_keys)
+
 
 class FromCacheOrDB(FromCacheOrDBBase):
-    def __init__(self, prefix, ttl=None):
-        super().__init__(prefix, ttl=ttl or LONG_TERM_CACHE_TTL)
+    """
+    Caches results as fields of Redis hashes. Hash fields cannot expire,
+    so their hard expiry is enforced using the expiry stored with them.
+
+    Where ``shard`` is given, entries are spread across one hash per shard,
+    as determined by calling ``shard`` with the bound arguments. Each shard
+    expires ``hard_ttl`` seconds after it was last written to, and holds
+    up to ``max_shard_size`` fields; arbitrary fields are evicted beyond
+    that. Otherwise, all entries are stored in one hash per generation.
+
+    Entries of the hash named ``prefix``, in which entries were stored
+    before they were namespaced and sharded, are migrated on demand.
+    """
+    def __init__(self, prefix, ttl=None, stale_ttl=None, shard=None, max_shard_size=None,
+                 cache_empty=True):
+        super().__init__(
+            prefix,
+            ttl=ttl or LONG_TERM_CACHE_TTL,
+            stale_ttl=stale_ttl,
+            cache_empty=cache_empty
+        )
+        self.shard = shard
+        self.max_shard_size = max_shard_size
+
+    def cache_key(self, bound_inputs, generation, area_id=None, area_type=None) -> str:
+        if self.shard is None:
+            return build_key(self.prefix, generation, *bound_inputs.args, **bound_inputs.kwargs)
+
+        return build_sharded_key(
+            self.prefix,
+            generation,
+            self.shard(bound_inputs.arguments),
+            *bound_inputs.args,
+            **bound_inputs.kwargs
+        )
+
+    def process_db_results(self, results, expiry: Expiry) -> bytes:
+        return encode(list(map(dict, results)), expiry)
+
+    def process_cache_results(self, results: bytes) -> List[Dict[str, Any]]:
+        if not is_encoded(results):
+            # Entries written before expiries were stored with payloads.
+            try:
+                return json_loads(results)
+            except JSONDecodeError as err:
+                raise DecodeError(f"Failed to decode legacy cache payload: {err}") from err
+
+        return decode(results)
+
+    async def _compute(self, redis, request, bound_inputs, cache_key: str,
+                       pending: Union[Dict[str, bytes], None] = None,
+                       replace: bool = False, **area_kws):
+        if not replace and (migrated := await self._migrate(redis, bound_inputs, cache_key)) is not None:
+            return migrated
+
+        return await super()._compute(
+            redis,
+            request,
+            bound_inputs,
+            cache_key,
+            pending=pending,
+            replace=replace,
+            **area_kws
+        )
+
+    async def _migrate(self, redis, bound_inputs, cache_key: str):
+        """
+        Moves an entry from the legacy hash to its current location.
+        """
+        legacy_field = str.join("|", map(str, [*bound_inputs.args, *bound_inputs.kwargs.values()]))
+        legacy_result = await redis.hget(key=self.prefix, field=legacy_field)
+
+        if legacy_result is None:
+            return None
+
+        try:
+            results = self.process_cache_results(legacy_result)
+        except DecodeError as err:
+            logger.warning(f"Discarding legacy cache entry '{legacy_field}': {err}")
+            results = None
 
-    def cache_key(self, bound_inputs, area_id=None, area_type=None) -> str:
-        key = [*bound_inputs.args, *bound_inputs.kwargs.values()]
-        raw_key = str.join("|", map(str, key))
-        return raw_key
+        if results is None or not self.cache_empty and not len(results):
+            await redis.hdel(self.prefix, legacy_field)
+            return None
 
-    def process_db_results(self, results) -> bytes:
-        return json_dumps(list(map(dict, results)))
+        payload = encode(results, Expiry.from_ttl(self.ttl, self.stale_ttl))
+        await self._cache_results(redis, cache_key, payload)
 
-    def process_cache_results(self, results: bytes) -> DataFrame:
-        return json_loads(results)
+        await redis.hdel(self.prefix, legacy_field)
+        if await redis.ttl(self.prefix) == -1:
+            # Entries that are not migrated within the window are discarded.
+            await redis.expire(self.prefix, self.hard_ttl)
+
+        return self._from_cache_result(cache_key, payload)
 
     async def _from_cache(self, redis, cache_key: str) -> bytes:
-        return await redis.hget(key=self.prefix, field=cache_key)
+        name, field = split_key(cache_key)
+        return await redis.hget(key=name, field=field)
 
-    async def _cache_results(self, redis, cache_key: str, results: bytes) -> NoReturn:
-        await redis.hset(
-            key=self.prefix,
-            field=cache_key,
-            value=results
-        )
+    async def _discard(self, redis, cache_keys: List[str]) -> NoReturn:
+        for cache_key in cache_keys:
+            name, field = split_key(cache_key)
+            await redis.hdel(name, field)
+
+    async def _cache_results(self, redis, cache_key: str, results: bytes, replace: bool = False) -> NoReturn:
+        name, field = split_key(cache_key)
+
+        if self.shard is None:
+            await redis.hset(
+                key=name,
+                field=field,
+                value=results
+            )
+            return
+
+        size = await redis.hset_with_expiry(name, field, results, expire=self.hard_ttl)
+
+        if self.max_shard_size is not None and size > self.max_shard_size:
+            # Evicts a quarter of the shard in one go, rather than
+            # a field on every write once the shard is full.
+            evicted = await redis.evict_fields(name, size - self.max_shard_size * 3 // 4)
+            logger.info(f"Evicted {evicted} fields from '{name}' ({size} fields).")
 
 
 class FromCacheOrDBMainData(FromCacheOrDBBase):
-    def cache_key(self, bound_inputs, area_id, area_type) -> str:
+    def cache_key(self, bound_inputs, generation, area_id, area_type) -> str:
         if area_type is not None:
             if area_type == "overview":
                 area_id = "UK"
             timestamp = datetime.strptime(bound_inputs.arguments["timestamp"], "%Y_%m_%d")
-            raw_key = f"{self.prefix}-{timestamp:%Y-%m-%d}-{area_id}"
-        else:
-            key = [*bound_inputs.args, *bound_inputs.kwargs.values()]
-            raw_key = f'SUMMARY::{str.join("|", map(str, key))}'
-
-        return raw_key
-
-    def process_db_results(self, results: DataFrame) -> bytes:
-        try:
-            results.date = results.date.map(lambda x: f"{x:%Y-%m-%d}")
-        except ValueError:
-            pass
-
-        res = (
-            results
-            .rename(columns={
-                "areaType": "area_type",
-                "areaName": "area_name",
-                "areaCode": "area_code"
-            })
-            .to_json(orient="records")
-            .encode()
-        )
-
-        return res
-
-    def process_cache_results(self, results: bytes) -> DataFrame:
-        res = (
-            read_json(results, orient="records")
-            .rename(columns={
-                "area_type": "areaType",
-                "area_name": "areaName",
-                "area_code": "areaCode"
-            })
-        )
+            return build_key(self.prefix, generation, f"{timestamp:%Y-%m-%d}", area_id)
 
-        return res
+        return build_key(self.prefix, generation, "SUMMARY", *bound_inputs.args, **bound_inputs.kwargs)
 
+    def process_db_results(self, results: Table, expiry: Expiry) -> bytes:
+        return encode(results, expiry)
 
+    def process_cache_results(self, results: bytes) -> Table:
+        return decode(results)
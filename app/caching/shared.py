@@ -0,0 +1,318 @@
+#!/usr/bin python3
+
+"""
+Node-local cache shared by the workers of a node.
+
+Payloads are held in a memory-mapped file - by default under ``/dev/shm`` -
+which every worker on the node maps. The file consists of a header, a
+direct-mapped table of slots, and a ring buffer for the payloads:
+
+    header:  magic | slot count | data size | cursor | epoch
+    slot:    sequence | key hash | epoch | expires at | position | length
+    data:    payloads, written at ever-increasing positions modulo the size
+
+Reads take no locks. Each slot is guarded by a sequence number that is
+odd while the slot is being written, so a read that overlaps a write is
+discarded. A payload is intact for as long as the ring buffer has not
+wrapped around past its position, which is checked once it is copied.
+
+Writes take an exclusive, non-blocking lock on the slot, so there is one
+writer per key at a time; a worker that finds the slot locked skips the
+write. Positions in the ring buffer are reserved under a brief lock on
+the cursor.
+"""
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Dict, List, Union
+from hashlib import blake2b
+from struct import Struct
+from time import time
+from mmap import mmap
+from os.path import basename, dirname, isdir
+from tempfile import mkstemp
+import fcntl
+import logging
+import os
+
+# 3rd party:
+
+# Internal:
+from app.config import Settings
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'SharedCache',
+    'shared_cache'
+]
+
+
+logger = logging.getLogger("app")
+
+
+MAGIC = b"FESHM\x00\x00\x01"
+
+HEADER = Struct("<8sIQQQ")
+HEADER_SIZE = 64
+CURSOR_OFFSET = 20
+EPOCH_OFFSET = 28
+
+SLOT = Struct("<Q16sQdQI")
+SLOT_SIZE = 64
+SEQUENCE = Struct("<Q")
+POSITION = Struct("<Q")
+
+
+class SharedCache:
+    """
+    Cache of payloads shared by the worker processes of a node.
+
+    Parameters
+    ----------
+    path: str
+        Path of the memory-mapped file. The cache is disabled where the
+        directory does not exist.
+
+    slots: int
+        Number of slots. Keys whose hashes map onto the same slot
+        replace one another.
+
+    size: int
+        Size of the ring buffer that holds the payloads in bytes. Payloads
+        are retained until the buffer has wrapped around past them.
+    """
+
+    def __init__(self, path: str, slots: int, size: int, enabled: bool = True):
+        self.path = path
+        self.slots = slots
+        self.size = size
+        self.enabled = enabled and isdir(dirname(path))
+
+        self._fd: Union[int, None] = None
+        self._map: Union[mmap, None] = None
+        self._pid: Union[int, None] = None
+        self._data_offset = HEADER_SIZE + slots * SLOT_SIZE
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.contentions = 0
+        self.discarded = 0
+
+    def _open(self) -> bool:
+        if not self.enabled:
+            return False
+
+        if self._map is not None and self._pid == os.getpid():
+            return True
+
+        try:
+            fd = self._open_initialised()
+            self._map = mmap(fd, self._data_offset + self.size)
+        except OSError as err:
+            logger.warning(f"Shared cache at '{self.path}' is unavailable: {err}")
+            self.enabled = False
+            return False
+
+        self._fd = fd
+        self._pid = os.getpid()
+
+        return True
+
+    def _open_initialised(self) -> int:
+        """
+        Opens the file, replacing it where it has yet to be initialised or
+        has a different layout - e.g. that of a previous deployment.
+
+        Files are never resized once in place, as workers that have mapped
+        them would fault on reading past the end. A replacement is built in
+        a temporary file, and renamed into place once initialised; workers
+        that have mapped the file it replaces retain their mapping.
+        """
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            initialised = False
+
+            try:
+                fcntl.lockf(fd, fcntl.LOCK_EX, HEADER_SIZE, 0)
+
+                # Unless replaced by another worker while waiting for the lock.
+                if os.fstat(fd).st_ino == os.stat(self.path).st_ino:
+                    header = os.pread(fd, HEADER.size, 0)
+                    initialised = (
+                        len(header) == HEADER.size and
+                        HEADER.unpack(header)[:3] == (MAGIC, self.slots, self.size)
+                    )
+
+                    if not initialised:
+                        self._replace()
+            finally:
+                if not initialised:
+                    # Also releases the lock.
+                    os.close(fd)
+
+            if initialised:
+                fcntl.lockf(fd, fcntl.LOCK_UN, HEADER_SIZE, 0)
+                return fd
+
+    def _replace(self):
+        fd, temp_path = mkstemp(dir=dirname(self.path), prefix=f"{basename(self.path)}.")
+
+        try:
+            os.ftruncate(fd, self._data_offset + self.size)
+            os.pwrite(fd, HEADER.pack(MAGIC, self.slots, self.size, 0, 0), 0)
+            os.rename(temp_path, self.path)
+        except OSError:
+            os.unlink(temp_path)
+            raise
+        finally:
+            os.close(fd)
+
+    def _slot(self, key: str):
+        key_hash = blake2b(key.encode(), digest_size=16).digest()
+        index = int.from_bytes(key_hash[:8], "little") % self.slots
+        return HEADER_SIZE + index * SLOT_SIZE, key_hash
+
+    def _epoch(self) -> int:
+        return POSITION.unpack_from(self._map, EPOCH_OFFSET)[0]
+
+    def get(self, key: str) -> Union[bytes, None]:
+        if not self._open():
+            return None
+
+        offset, key_hash = self._slot(key)
+        sequence, slot_hash, epoch, expires_at, position, length = SLOT.unpack_from(self._map, offset)
+
+        if (sequence & 1 or slot_hash != key_hash or
+                epoch != self._epoch() or expires_at <= time()):
+            self.misses += 1
+            return None
+
+        start = self._data_offset + position % self.size
+        payload = self._map[start:start + length]
+
+        cursor = POSITION.unpack_from(self._map, CURSOR_OFFSET)[0]
+        if cursor - position > self.size or SEQUENCE.unpack_from(self._map, offset)[0] != sequence:
+            # Overwritten while being read.
+            self.discarded += 1
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return payload
+
+    def set(self, key: str, payload: bytes, ttl: float) -> bool:
+        length = len(payload)
+
+        if ttl <= 0 or length > self.size or not self._open():
+            return False
+
+        offset, key_hash = self._slot(key)
+
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB, SLOT_SIZE, offset)
+        except OSError:
+            self.contentions += 1
+            return False
+
+        try:
+            position = self._reserve(length)
+
+            start = self._data_offset + position % self.size
+            self._map[start:start + length] = payload
+
+            sequence = SEQUENCE.unpack_from(self._map, offset)[0] | 1
+            SEQUENCE.pack_into(self._map, offset, sequence)
+            SLOT.pack_into(
+                self._map,
+                offset,
+                sequence,
+                key_hash,
+                self._epoch(),
+                time() + ttl,
+                position,
+                length
+            )
+            SEQUENCE.pack_into(self._map, offset, sequence + 1)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, SLOT_SIZE, offset)
+
+        self.writes += 1
+        return True
+
+    def _reserve(self, length: int) -> int:
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, POSITION.size, CURSOR_OFFSET)
+
+        try:
+            position = POSITION.unpack_from(self._map, CURSOR_OFFSET)[0]
+
+            if position % self.size + length > self.size:
+                # Payloads are contiguous - skip to the start of the buffer.
+                position += self.size - position % self.size
+
+            POSITION.pack_into(self._map, CURSOR_OFFSET, position + length)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, POSITION.size, CURSOR_OFFSET)
+
+        return position
+
+    def delete(self, key: str) -> bool:
+        if not self._open():
+            return False
+
+        offset, key_hash = self._slot(key)
+
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, SLOT_SIZE, offset)
+
+        try:
+            sequence, slot_hash, *_ = SLOT.unpack_from(self._map, offset)
+            if slot_hash != key_hash:
+                return False
+
+            SEQUENCE.pack_into(self._map, offset, sequence | 1)
+            SLOT.pack_into(self._map, offset, sequence | 1, bytes(16), 0, 0.0, 0, 0)
+            SEQUENCE.pack_into(self._map, offset, (sequence | 1) + 1)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, SLOT_SIZE, offset)
+
+        return True
+
+    def clear(self):
+        """
+        Invalidates all entries, for all workers on the node.
+        """
+        if not self._open():
+            return
+
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, POSITION.size, EPOCH_OFFSET)
+
+        try:
+            POSITION.pack_into(self._map, EPOCH_OFFSET, self._epoch() + 1)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, POSITION.size, EPOCH_OFFSET)
+
+    def invalidate(self, keys: List[str], prefixes: List[str]):
+        for key in keys:
+            self.delete(key)
+
+        # Slots hold the hashes of keys, so prefixes cannot be matched.
+        if prefixes:
+            self.clear()
+
+    def stats(self) -> Dict[str, Union[int, float, bool]]:
+        total = self.hits + self.misses
+
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "contentions": self.contentions,
+            "discarded": self.discarded,
+            "hit_ratio": self.hits / total if total else 0.0
+        }
+
+
+shared_cache = SharedCache(**Settings.shared_cache)
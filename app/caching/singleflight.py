@@ -0,0 +1,231 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Any, AsyncContextManager, Awaitable, Callable, Dict, Optional
+from asyncio import Task, get_running_loop, shield, sleep
+from functools import partial
+from time import monotonic
+from uuid import uuid4
+import logging
+
+# 3rd party:
+
+# Internal:
+from app.config import Settings
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'SingleFlight',
+    'coalesce',
+    'revalidate'
+]
+
+
+logger = logging.getLogger("app")
+
+LOCK_PREFIX = "LOCK::"
+
+
+class Call:
+    """
+    Execution shared by concurrent callers, and the number of callers
+    awaiting it.
+    """
+
+    __slots__ = ["task", "waiters"]
+
+    def __init__(self, task: Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key within a worker into
+    one execution, the result of which is shared with all callers.
+
+    The execution runs as a task of its own, such that a caller that is
+    cancelled - e.g. as its client disconnects - does not cancel it for
+    the others. It is only cancelled once all of its callers have been.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, Call] = dict()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._calls
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        if (call := self._calls.get(key)) is None:
+            call = self._calls[key] = Call(get_running_loop().create_task(func()))
+            call.task.add_done_callback(partial(self._done, key, call))
+
+        call.waiters += 1
+
+        try:
+            return await shield(call.task)
+        finally:
+            call.waiters -= 1
+
+            if not call.waiters and not call.task.done():
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key: str, call: Call):
+        # Unless replaced by a later call for the key.
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def _done(self, key: str, call: Call, task: Task):
+        self._forget(key, call)
+
+        if not task.cancelled():
+            # Marks the exception as retrieved in case there are no waiters.
+            task.exception()
+
+
+single_flight = SingleFlight()
+
+
+async def _compute_with_lock(redis, key: str, compute, read, stale) -> Any:
+    settings = Settings.single_flight
+    lock_key = LOCK_PREFIX + key
+    token = uuid4().hex
+
+    interval, max_interval = settings["poll_interval"]
+    deadline = monotonic() + settings["wait_timeout"]
+
+    while True:
+        # Acquired by the first caller, and by those that find the lock
+        # released without a value - e.g. where empty results are not
+        # cached, or where the computation failed.
+        if await redis.acquire_lock(lock_key, token, settings["lock_ttl"]):
+            try:
+                return await compute()
+            finally:
+                await redis.release_lock(lock_key, token)
+
+        if monotonic() >= deadline:
+            break
+
+        # Another worker is computing the value - wait for it to land in Redis.
+        await sleep(interval)
+
+        if (result := await read()) is not None:
+            return result
+
+        interval = min(interval * 2, max_interval)
+
+    if stale is not None and (result := stale()) is not None:
+        logger.warning(f"Timed out waiting for '{key}' - serving stale value.")
+        return result
+
+    logger.warning(f"Timed out waiting for '{key}' - computing the value.")
+    return await compute()
+
+
+async def coalesce(redis, key: str, compute: Callable[[], Awaitable[Any]],
+                   read: Callable[[], Awaitable[Any]],
+                   stale: Optional[Callable[[], Any]] = None) -> Any:
+    """
+    Fills a cache miss for ``key`` such that concurrent misses are
+    computed once per cluster rather than once per request.
+
+    Misses within a worker are collapsed into a single call. Across workers
+    and nodes, the computation is guarded by a short-lived Redis lock; callers
+    that fail to acquire the lock poll ``read`` until the value is available,
+    or until the lock is released without one - whereupon the first of them
+    to acquire it computes the value.
+    If the value does not become available in time, a ``stale`` value is
+    served where one exists, otherwise the value is computed regardless.
+
+    Parameters
+    ----------
+    redis: Redis
+        Open Redis client.
+
+    key: str
+        Unique key for the value.
+
+    compute: Callable[[], Awaitable[Any]]
+        Computes the value and stores it in the cache.
+
+    read: Callable[[], Awaitable[Any]]
+        Reads the value from the cache, returning ``None`` on a miss.
+
+    stale: Optional[Callable[[], Any]]
+        Returns a stale copy of the value, or ``None`` if there is none.
+
+    Returns
+    -------
+    Any
+        The value as returned by ``compute``, ``read``, or ``stale``.
+    """
+    func = partial(_compute_with_lock, redis, key, compute, read, stale)
+    return await single_flight.do(key, func)
+
+
+# Background refreshes in progress in this worker. References to the
+# tasks are retained here until they complete.
+_revalidations: Dict[str, Task] = dict()
+
+
+async def _refresh_with_lock(connect, key: str, refresh) -> None:
+    settings = Settings.single_flight
+    lock_key = LOCK_PREFIX + key
+    token = uuid4().hex
+
+    try:
+        async with connect() as redis:
+            if not await redis.acquire_lock(lock_key, token, settings["lock_ttl"]):
+                # Another worker is computing the value.
+                return
+
+            try:
+                await refresh(redis)
+            finally:
+                await redis.release_lock(lock_key, token)
+    except Exception as err:
+        logger.exception(f"Failed to refresh '{key}': {err}")
+    finally:
+        _revalidations.pop(key, None)
+
+
+def revalidate(connect: Callable[[], AsyncContextManager],
+               key: str, refresh: Callable[[Any], Awaitable[Any]]) -> bool:
+    """
+    Schedules a background refresh of a stale value for ``key``, such that
+    the stale value may be served in the meantime.
+
+    At most one refresh is scheduled per key within a worker. Across workers
+    and nodes, the refresh is guarded by the same lock as ``coalesce``, and
+    is skipped where the lock is held elsewhere.
+
+    Parameters
+    ----------
+    connect: Callable[[], AsyncContextManager]
+        Opens a new Redis client. The client of the original request
+        may be closed before the refresh is executed.
+
+    key: str
+        Unique key for the value.
+
+    refresh: Callable[[Redis], Awaitable[Any]]
+        Computes the value and stores it in the cache, replacing the
+        stale value.
+
+    Returns
+    -------
+    bool
+        Whether a refresh was scheduled.
+    """
+    if key in _revalidations or key in single_flight:
+        return False
+
+    task = get_running_loop().create_task(_refresh_with_lock(connect, key, refresh))
+    _revalidations[key] = task
+
+    return True
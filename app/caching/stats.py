@@ -0,0 +1,200 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Dict, Union
+from asyncio import Task, get_running_loop, sleep, CancelledError
+from collections import defaultdict
+from time import monotonic
+import logging
+
+# 3rd party:
+
+# Internal:
+from .local import local_cache
+from .shared import shared_cache
+from .invalidation import invalidation_bus
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'PrefixStats',
+    'cache_stats',
+    'CacheStatsEmitter'
+]
+
+
+logger = logging.getLogger("app")
+
+
+class PrefixStats:
+    """
+    Counters for the cache entries under one key prefix.
+
+    Hits are counted by the tier that served them - local, shared, or
+    Redis. Stale hits are also counted as Redis hits. Entries that cannot
+    be decoded are counted as undecodable, and as misses where they were
+    read from Redis. Durations are in seconds.
+    """
+    __slots__ = [
+        "local_hits",
+        "shared_hits",
+        "redis_hits",
+        "stale_hits",
+        "misses",
+        "fills",
+        "fill_time",
+        "decodes",
+        "decode_time",
+        "payload_bytes",
+        "undecodable",
+    ]
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def record_fill(self, duration: float):
+        self.fills += 1
+        self.fill_time += duration
+
+    def record_decode(self, size: int, duration: float):
+        self.decodes += 1
+        self.decode_time += duration
+        self.payload_bytes += size
+
+    def copy(self) -> 'PrefixStats':
+        result = PrefixStats()
+        for name in self.__slots__:
+            setattr(result, name, getattr(self, name))
+
+        return result
+
+    def __sub__(self, other: 'PrefixStats') -> 'PrefixStats':
+        result = PrefixStats()
+        for name in self.__slots__:
+            setattr(result, name, getattr(self, name) - getattr(other, name))
+
+        return result
+
+    def as_dict(self) -> Dict[str, Union[int, float]]:
+        hits = self.local_hits + self.shared_hits + self.redis_hits
+        lookups = hits + self.misses
+
+        return {
+            **{name: getattr(self, name) for name in self.__slots__},
+            "hit_ratio": hits / lookups if lookups else None,
+            "local_hit_ratio": self.local_hits / lookups if lookups else None,
+            "mean_fill_ms": self.fill_time / self.fills * 1000 if self.fills else None,
+            "mean_decode_ms": self.decode_time / self.decodes * 1000 if self.decodes else None,
+            "mean_payload_bytes": self.payload_bytes / self.decodes if self.decodes else None,
+        }
+
+
+class CacheStats:
+    """
+    Per-prefix cache statistics for this worker.
+    """
+
+    def __init__(self):
+        self._prefixes: Dict[str, PrefixStats] = defaultdict(PrefixStats)
+        self.started_at = monotonic()
+
+    def __getitem__(self, prefix: str) -> PrefixStats:
+        return self._prefixes[prefix]
+
+    def snapshot(self) -> Dict[str, PrefixStats]:
+        return {prefix: stats.copy() for prefix, stats in self._prefixes.items()}
+
+    def report(self) -> Dict[str, Dict[str, Union[int, float]]]:
+        return {prefix: stats.as_dict() for prefix, stats in self._prefixes.items()}
+
+
+cache_stats = CacheStats()
+
+
+class CacheStatsEmitter:
+    """
+    Periodically logs the cache statistics accumulated since the previous
+    emission, one record per prefix. The statistics are attached as custom
+    dimensions, so that they may be aggregated across workers.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._previous: Dict[str, PrefixStats] = dict()
+        self._task: Union[Task, None] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        self._task.cancel()
+
+        try:
+            await self._task
+        except CancelledError:
+            pass
+
+        self._task = None
+
+        # Workers are recycled regularly - flush what has accumulated.
+        self.emit()
+
+    async def run(self):
+        while True:
+            await sleep(self.interval)
+            self.emit()
+
+    def emit(self):
+        current = cache_stats.snapshot()
+
+        for prefix, stats in current.items():
+            delta = stats - self._previous.get(prefix, PrefixStats())
+
+            if not (delta.local_hits + delta.shared_hits + delta.redis_hits + delta.misses):
+                continue
+
+            logger.info(
+                f"Cache statistics for '{prefix}'",
+                extra={
+                    "custom_dimensions": {
+                        "cache_prefix": prefix,
+                        **{f"cache_{key}": value for key, value in delta.as_dict().items()}
+                    }
+                }
+            )
+
+        logger.info(
+            "Local cache statistics",
+            extra={
+                "custom_dimensions": {
+                    f"local_cache_{key}": value for key, value in local_cache.stats().items()
+                }
+            }
+        )
+
+        logger.info(
+            "Shared cache statistics",
+            extra={
+                "custom_dimensions": {
+                    f"shared_cache_{key}": value for key, value in shared_cache.stats().items()
+                }
+            }
+        )
+
+        logger.info(
+            "Cache invalidation statistics",
+            extra={
+                "custom_dimensions": {
+                    f"cache_invalidation_{key}": value for key, value in invalidation_bus.stats().items()
+                }
+            }
+        )
+
+        self._previous = current
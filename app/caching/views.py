@@ -0,0 +1,47 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from http import HTTPStatus
+from os import getpid
+from time import monotonic
+
+# 3rd party:
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+# Internal:
+from .local import local_cache
+from .shared import shared_cache
+from .stats import cache_stats
+from .invalidation import invalidation_bus
+from app.common.release import release_watcher
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'cache_stats_page'
+]
+
+
+async def cache_stats_page(request: Request) -> JSONResponse:
+    """
+    Cache statistics of the worker that serves the request, accumulated
+    since the worker was started.
+    """
+    response = {
+        "pid": getpid(),
+        "uptime": monotonic() - cache_stats.started_at,
+        "local": local_cache.stats(),
+        "shared": shared_cache.stats(),
+        "invalidation": invalidation_bus.stats(),
+        "release": release_watcher.stats(),
+        "prefixes": cache_stats.report()
+    }
+
+    return JSONResponse(
+        response,
+        status_code=HTTPStatus.OK.real,
+        headers={"cache-control": "no-store"}
+    )
@@ -0,0 +1,219 @@
+#!/usr/bin python3
+
+"""
+Column-oriented container for the rows that back the pages.
+
+Pages are rendered from a few hundred rows, which are filtered, ranked
+and formatted once per render. ``Table`` provides these operations over
+plain lists, such that the request path does not depend on pandas.
+"""
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, Tuple, Union
+from collections import defaultdict, namedtuple
+from datetime import date, datetime
+from functools import lru_cache
+from itertools import compress
+from sys import getsizeof
+
+# 3rd party:
+
+# Internal:
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'Table',
+    'DTYPE_CONVERTERS'
+]
+
+
+@lru_cache(maxsize=32)
+def row_type(columns: Tuple[str, ...]):
+    return namedtuple("Row", columns)
+
+
+def is_missing(value: Any) -> bool:
+    return value is None or value != value  # NaN
+
+
+def to_float(value: Any) -> float:
+    return float("nan") if value is None else float(value)
+
+
+def to_datetime(value: Union[date, datetime]) -> datetime:
+    if isinstance(value, datetime):
+        return value
+
+    return datetime(value.year, value.month, value.day)
+
+
+# Converters for the dtypes of column definitions, as named by pandas.
+DTYPE_CONVERTERS: Dict[str, Callable[[Any], Any]] = {
+    "str": str,
+    "int": int,
+    "float64": to_float,
+    "datetime64[ns]": to_datetime,
+}
+
+
+class Table:
+    """
+    Rows held as one list per column.
+
+    Tables are not modified once created: ``filter`` and ``assign``
+    return new tables, which share the lists of the unchanged columns.
+
+    Parameters
+    ----------
+    data: Dict[str, List[Any]]
+        Values of each column, in order. All columns have the same length.
+    """
+
+    __slots__ = ["_data", "_length"]
+
+    def __init__(self, data: Dict[str, List[Any]]):
+        self._data = data
+        self._length = len(next(iter(data.values()))) if data else 0
+
+    @classmethod
+    def from_records(cls, records: Iterable[Sequence[Any]], columns: List[str],
+                     converters: Union[Dict[str, Callable[[Any], Any]], None] = None) -> 'Table':
+        """
+        Creates a table from rows - e.g. ``asyncpg`` records - with values
+        in the order of ``columns``. Where given, ``converters`` are applied
+        to the values of the columns they are keyed by.
+        """
+        values = list(zip(*records)) or [tuple()] * len(columns)
+        converters = converters or dict()
+
+        return cls({
+            name: list(map(converters[name], column) if name in converters else column)
+            for name, column in zip(columns, values)
+        })
+
+    @classmethod
+    def concat(cls, tables: Iterable[Union['Table', None]]) -> 'Table':
+        tables = [table for table in tables if table is not None and table.columns]
+        if not tables:
+            return cls(dict())
+
+        return cls({
+            name: [value for table in tables for value in table[name]]
+            for name in tables[0].columns
+        })
+
+    @classmethod
+    def from_frame(cls, frame) -> 'Table':
+        """
+        Creates a table from a ``DataFrame`` - e.g. for cache entries
+        written before tables were introduced.
+        """
+        return cls({
+            name: [
+                value.to_pydatetime() if hasattr(value, "to_pydatetime") else value
+                for value in column.tolist()
+            ]
+            for name, column in frame.items()
+        })
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._data)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __sizeof__(self) -> int:
+        # Deep, as with pandas: the lists of the columns and, estimated
+        # from their first values, the values that they hold.
+        return object.__sizeof__(self) + getsizeof(self._data) + sum(
+            getsizeof(column) + len(column) * getsizeof(column[0])
+            for column in self._data.values()
+            if column
+        )
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._data
+
+    def __getitem__(self, name: str) -> List[Any]:
+        return self._data[name]
+
+    def rows(self) -> Iterator[tuple]:
+        Row = row_type(tuple(self._data))
+        return map(Row._make, zip(*self._data.values()))
+
+    def row(self, index: int) -> tuple:
+        Row = row_type(tuple(self._data))
+        return Row._make(column[index] for column in self._data.values())
+
+    def filter(self, mask: Iterable[bool]) -> 'Table':
+        mask = list(mask)
+
+        return Table({
+            name: list(compress(column, mask))
+            for name, column in self._data.items()
+        })
+
+    def assign(self, **columns: Union[List[Any], Callable[['Table'], List[Any]]]) -> 'Table':
+        """
+        Adds or replaces columns. Values are either lists, or functions
+        that are called with the table to produce them.
+        """
+        data = dict(self._data)
+
+        for name, values in columns.items():
+            data[name] = values(self) if callable(values) else list(values)
+
+        return Table(data)
+
+    def map(self, name: str, func: Callable[[Any], Any]) -> List[Any]:
+        return list(map(func, self._data[name]))
+
+    def argmin(self, name: str) -> Union[int, None]:
+        """
+        Position of the first row with the smallest value in the column,
+        ignoring missing values.
+        """
+        positions = (
+            position
+            for position, value in enumerate(self._data[name])
+            if not is_missing(value)
+        )
+
+        return min(positions, key=self._data[name].__getitem__, default=None)
+
+    def rank(self, name: str, by: str) -> List[float]:
+        """
+        Ranks the values of a column in ascending order within each group
+        of rows that share the value of ``by``. Tied values are assigned
+        the mean of their ranks, and missing values are not ranked.
+        """
+        values = self._data[name]
+        groups = defaultdict(list)
+
+        for position, key in enumerate(self._data[by]):
+            if not is_missing(values[position]):
+                groups[key].append(position)
+
+        ranks = [float("nan")] * self._length
+
+        for positions in groups.values():
+            positions.sort(key=values.__getitem__)
+            start = 0
+
+            while start < len(positions):
+                end = start
+                while end + 1 < len(positions) and values[positions[end + 1]] == values[positions[start]]:
+                    end += 1
+
+                # Ranks are 1-based: the tied positions share the mean
+                # of ``start + 1`` through ``end + 1``.
+                for position in positions[start:end + 1]:
+                    ranks[position] = (start + end) / 2 + 1
+
+                start = end + 1
+
+        return ranks
@@ -0,0 +1,243 @@
+#!/usr/bin python3
+
+"""
+Watching of the latest published release.
+
+Every worker polls the blob that holds the timestamp of the latest
+release, using conditional requests, such that unchanged polls transfer
+no data. The timestamp is held in memory, and lookups of the blob are
+answered from memory rather than the cache.
+
+Handlers are called once a new release is published. Pages are switched
+over to the new release once the handlers are done - unless a handler
+holds the switch, e.g. to warm the cache first. Held switches take place
+once the cached release timestamp is invalidated - as is done by the
+cache warmer - or once ``switch_timeout`` has elapsed.
+"""
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Any, Awaitable, Callable, Dict, List, Tuple, Union
+from asyncio import Task, TimerHandle, get_running_loop, sleep, CancelledError
+from inspect import isawaitable
+from time import monotonic
+import logging
+
+# 3rd party:
+
+# Internal:
+from app.config import Settings
+from app.storage import AsyncStorageClient
+from app.caching.invalidation import invalidation_bus
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'ReleaseWatcher',
+    'release_watcher'
+]
+
+
+logger = logging.getLogger("app")
+
+
+TIMESTAMP_PREFIX = "FRONTEND::TS::"
+
+ReleaseHandler = Callable[[str], Union[Any, Awaitable[Any]]]
+
+
+class ReleaseWatcher:
+    """
+    Polls the latest published release timestamp.
+
+    Parameters
+    ----------
+    enabled: bool
+        Whether to watch the release. Where disabled, lookups of the
+        timestamp are made through the cache, and handlers are not called.
+
+    poll_interval: float
+        Number of seconds between polls.
+
+    switch_timeout: float
+        Maximum number of seconds for which a switch to a new release
+        may be held by handlers.
+    """
+
+    def __init__(self, enabled: bool, poll_interval: float, switch_timeout: float):
+        self.enabled = enabled
+        self.poll_interval = poll_interval
+        self.switch_timeout = switch_timeout
+        self.container = Settings.latest_published_timestamp["container"]
+        self.path = Settings.latest_published_timestamp["path"]
+
+        # Timestamps of the release served, and of the latest release published.
+        self.current: Union[str, None] = None
+        self.published: Union[str, None] = None
+
+        self._etag: Union[str, None] = None
+        self._failing = False
+        self._handlers: List[Tuple[ReleaseHandler, bool]] = list()
+        self._task: Union[Task, None] = None
+        self._held_switch: Union[TimerHandle, None] = None
+
+        self.polls = 0
+        self.not_modified = 0
+        self.failures = 0
+        self.releases = 0
+        self.held_switches = 0
+        self.timed_out_switches = 0
+        self.last_poll_at: Union[float, None] = None
+
+    def add_handler(self, handler: ReleaseHandler, holds_switch: bool = False):
+        """
+        Calls ``handler`` with the timestamp of each new release, including
+        the one found as the worker starts. Handlers that hold the switch
+        are expected to invalidate the cached release timestamp once done.
+        """
+        self._handlers.append((handler, holds_switch))
+
+    def get(self, container: str, path: str) -> Union[str, None]:
+        """
+        Returns the timestamp held in memory for a blob, or ``None`` where
+        the blob is not watched or its timestamp is not yet known.
+        """
+        if self._failing or (container, path) != (self.container, self.path):
+            return None
+
+        return self.current
+
+    def start(self):
+        if not self.enabled or self._task is not None:
+            return
+
+        invalidation_bus.add_handler(self.on_invalidation)
+        self._task = get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._held_switch is not None:
+            self._held_switch.cancel()
+            self._held_switch = None
+
+        if self._task is None:
+            return
+
+        self._task.cancel()
+
+        try:
+            await self._task
+        except CancelledError:
+            pass
+
+        self._task = None
+
+    async def run(self):
+        while True:
+            try:
+                async with AsyncStorageClient(container=self.container, path=self.path) as client:
+                    while True:
+                        await self.poll(client)
+                        await sleep(self.poll_interval)
+            except CancelledError:
+                raise
+            except Exception as err:
+                # Lookups fall back to the cache while polls are failing.
+                self.failures += 1
+                self._failing = True
+                logger.warning(f"Failed to poll the latest release: {err}")
+
+            await sleep(self.poll_interval)
+
+    async def poll(self, client: AsyncStorageClient):
+        self.polls += 1
+        downloader = await client.download_if_modified(self._etag)
+        self.last_poll_at = monotonic()
+        self._failing = False
+
+        if downloader is None:
+            self.not_modified += 1
+            return
+
+        timestamp = (await downloader.readall()).decode()
+        self._etag = downloader.properties.etag
+
+        if timestamp != self.published:
+            await self.release(timestamp)
+
+    async def release(self, timestamp: str):
+        first = self.published is None
+        self.published = timestamp
+        self.releases += not first
+
+        if first:
+            # Served straight away, as it was before the worker started.
+            self.switch()
+        else:
+            logger.info(f"Release '{timestamp}' has been published.")
+
+        holds_switch = False
+
+        for handler, holds in self._handlers:
+            try:
+                result = handler(timestamp)
+                if isawaitable(result):
+                    await result
+
+                holds_switch |= holds
+            except Exception as err:
+                logger.exception(f"Release handler failed for '{timestamp}': {err}")
+
+        if not holds_switch:
+            self.switch()
+        elif self.current != timestamp:
+            self.held_switches += 1
+
+            if self._held_switch is not None:
+                self._held_switch.cancel()
+
+            self._held_switch = get_running_loop().call_later(self.switch_timeout, self.switch, True)
+
+    def switch(self, timed_out: bool = False):
+        """
+        Serves the latest published release.
+        """
+        if self._held_switch is not None:
+            self._held_switch.cancel()
+            self._held_switch = None
+
+        if self.published is None or self.current == self.published:
+            return
+
+        if timed_out:
+            self.timed_out_switches += 1
+            logger.warning(f"Switched to release '{self.published}' before it was warmed.")
+        elif self.current is not None:
+            logger.info(f"Switched to release '{self.published}'.")
+
+        self.current = self.published
+
+    def on_invalidation(self, keys: List[str], prefixes: List[str]):
+        names = [*keys, *prefixes]
+
+        # An empty prefix invalidates everything.
+        if any(name.startswith(TIMESTAMP_PREFIX.rstrip(":")) or not name for name in names):
+            self.switch()
+
+    def stats(self) -> Dict[str, Union[int, float, str, bool, None]]:
+        return {
+            "enabled": self.enabled,
+            "running": self._task is not None and not self._task.done(),
+            "current": self.current,
+            "published": self.published,
+            "polls": self.polls,
+            "not_modified": self.not_modified,
+            "failures": self.failures,
+            "releases": self.releases,
+            "held_switches": self.held_switches,
+            "timed_out_switches": self.timed_out_switches,
+            "seconds_since_poll": monotonic() - self.last_poll_at if self.last_poll_at else None,
+        }
+
+
+release_watcher = ReleaseWatcher(**Settings.release_watcher)
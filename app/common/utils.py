@@ -12,14 +12,21 @@ Contributors:  Pouria Hadjibagheri
 # Imports
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # Python:
+from typing import Any, Callable, Dict, Hashable, Union
 from datetime import datetime
 from operator import itemgetter
-from asyncio import get_running_loop, Lock
+from asyncio import Future, get_running_loop, shield, Lock
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
 
 # 3rd party:
+from opencensus.trace.execution_context import get_opencensus_tracer
 
 # Internal:
 from .data.variables import DestinationMetrics
+from .release import release_watcher
 from app.storage import AsyncStorageClient
 from app.config import Settings
 from app.caching import from_cache_or_func
@@ -30,6 +37,81 @@ get_value = itemgetter("value")
 get_area_type = itemgetter("areaType")
 
 
+class RequestMemo:
+    """
+    Results of the memoised lookups of one request, and the number of
+    times each lookup was made.
+    """
+
+    __slots__ = ["results", "calls", "hits"]
+
+    def __init__(self):
+        self.results: Dict[Hashable, Future] = dict()
+        self.calls = Counter()
+        self.hits = Counter()
+
+
+_request_memo: ContextVar[Union[RequestMemo, None]] = ContextVar("request_memo", default=None)
+
+
+@contextmanager
+def request_memo_scope():
+    """
+    Memoises the lookups made within the context - i.e. by a request.
+    """
+    token = _request_memo.set(RequestMemo())
+
+    try:
+        yield
+    finally:
+        _request_memo.reset(token)
+
+
+def memoise_per_request(func: Callable):
+    """
+    Memoises an idempotent lookup - a coroutine function that takes the
+    request as its first argument - for the duration of a request.
+
+    Concurrent calls with the same arguments share one lookup. Failed
+    lookups are not memoised. Calls made outside of a request - e.g. by
+    background tasks - are not memoised.
+    """
+    name = func.__name__
+
+    @wraps(func)
+    async def memoised(request, *args, **kwargs) -> Any:
+        memo = _request_memo.get()
+
+        if memo is None:
+            return await func(request, *args, **kwargs)
+
+        key = name, args, tuple(sorted(kwargs.items()))
+        memo.calls[name] += 1
+
+        if (result := memo.results.get(key)) is not None:
+            memo.hits[name] += 1
+        else:
+            result = memo.results[key] = get_running_loop().create_task(func(request, *args, **kwargs))
+
+            def forget_failure(task: Future):
+                if task.cancelled() or task.exception() is not None:
+                    memo.results.pop(key, None)
+
+            result.add_done_callback(forget_failure)
+
+        tracer = get_opencensus_tracer()
+        if tracer is not None:
+            tracer.add_attribute_to_current_span(
+                f"memo.{name}",
+                f"{memo.calls[name]} calls, {memo.hits[name]} memoised"
+            )
+
+        # Shielded, so that a cancelled caller does not cancel the others.
+        return await shield(result)
+
+    return memoised
+
+
 def get_og_image_names(latest_timestamp: str) -> list:
     ts_python_iso = latest_timestamp[:-2]
     ts = datetime.fromisoformat(ts_python_iso)
@@ -89,25 +171,26 @@ async def get_from_storage(*args, **kwargs):
     return data_bytes.decode()
 
 
-async def get_release_timestamp(request):
+@memoise_per_request
+async def get_timestamp(request, container: str, path: str) -> str:
+    if (timestamp := release_watcher.get(container, path)) is not None:
+        return timestamp
+
     response = from_cache_or_func(
         request=request,
         func=get_from_storage,
         prefix="FRONTEND::TS::",
         expire=60 * 60,
-        **Settings.latest_published_timestamp
+        container=container,
+        path=path
     )
 
     return await response
 
 
-async def get_website_timestamp(request):
-    response = from_cache_or_func(
-        request=request,
-        func=get_from_storage,
-        prefix="FRONTEND::TS::",
-        expire=60 * 60,
-        **Settings.latest_published_timestamp
-    )
+async def get_release_timestamp(request):
+    return await get_timestamp(request, **Settings.latest_published_timestamp)
 
-    return await response
+
+async def get_website_timestamp(request):
+    return await get_timestamp(request, **Settings.website_timestamp)
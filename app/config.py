@@ -23,6 +23,9 @@ class Settings:
     log_level = getenv("LOG_LEVEL", "INFO")
     ENVIRONMENT = getenv("API_ENV")
     healthcheck_path = "healthcheck"
+    cache_stats_path = getenv("CACHE_STATS_PATH", "internal/cache-stats")
+    template_profile_path = getenv("TEMPLATE_PROFILE_PATH", "internal/template-profile")
+    internal_token = getenv("INTERNAL_ROUTES_TOKEN")  # internal routes are not served where unset
     cloud_role_name = getenv("WEBSITE_SITE_NAME", "landing-page")
     cloud_instance_id = getenv("WEBSITE_INSTANCE_ID", "local")
     website_timestamp = {
@@ -38,6 +41,90 @@ class Settings:
         password=getenv("AZURE_REDIS_PASSWORD"),
         maxsize=30
     )
+    local_cache = dict(
+        max_bytes=int(getenv("LOCAL_CACHE_MAX_BYTES", 64 * 1024 * 1024)),  # 64 MB
+        max_ttl=int(getenv("LOCAL_CACHE_MAX_TTL", 5 * 60))  # 5 minutes
+    )
+    single_flight = dict(
+        lock_ttl=int(getenv("CACHE_LOCK_TTL", 15 * 1000)),  # milliseconds
+        wait_timeout=float(getenv("CACHE_LOCK_WAIT_TIMEOUT", 5)),  # seconds
+        poll_interval=(0.05, 0.5)  # seconds - min, max
+    )
+    cache_keys = dict(
+        refresh_interval=float(getenv("CACHE_GENERATION_REFRESH_INTERVAL", 5))  # seconds
+    )
+    cache_revalidation = dict(
+        stale_ttl=int(getenv("CACHE_STALE_TTL", 60 * 60))  # seconds - served while refreshing
+    )
+    cache_fill = dict(
+        concurrency=int(getenv("CACHE_FILL_CONCURRENCY", 4))  # per multi-key lookup
+    )
+    cache_warming = dict(
+        enabled=getenv("CACHE_WARMING", "1") == "1",
+        poll_interval=int(getenv("CACHE_WARMING_POLL_INTERVAL", 60)),  # seconds
+        concurrency=int(getenv("CACHE_WARMING_CONCURRENCY", 2)),  # chunks in flight
+        chunk_size=25,  # areas per chunk, filled with `cache_fill` concurrency
+        claim_ttl=36 * 60 * 60,  # seconds
+        area_types=["nation", "region", "utla", "ltla", "nhsTrust"],
+        include_msoa=getenv("CACHE_WARMING_MSOA", "0") == "1"
+    )
+    release_watcher = dict(
+        enabled=getenv("RELEASE_WATCHER", "1") == "1",
+        poll_interval=float(getenv("RELEASE_WATCHER_POLL_INTERVAL", 5)),  # seconds
+        switch_timeout=float(getenv("RELEASE_WATCHER_SWITCH_TIMEOUT", 30 * 60))  # seconds - held for warming
+    )
+    cache_invalidation = dict(
+        reconnect_interval=float(getenv("CACHE_INVALIDATION_RECONNECT_INTERVAL", 5))  # seconds
+    )
+    cache_stats = dict(
+        emit_interval=int(getenv("CACHE_STATS_INTERVAL", 5 * 60))  # seconds
+    )
+    postcode_cache = dict(
+        ttl=int(getenv("POSTCODE_CACHE_TTL", 30 * 24 * 60 * 60)),  # seconds
+        max_shard_size=int(getenv("POSTCODE_CACHE_MAX_SHARD_SIZE", 10_000))  # fields per outward code
+    )
+    shared_cache = dict(
+        enabled=getenv("SHARED_CACHE", "1") == "1",
+        path=getenv("SHARED_CACHE_PATH", "/dev/shm/frontend-cache"),  # `worker_tmp_dir` in gunicorn
+        slots=int(getenv("SHARED_CACHE_SLOTS", 8192)),
+        size=int(getenv("SHARED_CACHE_SIZE", 32 * 1024 ** 2))  # bytes - within Docker's default shm size
+    )
+    template_streaming = dict(
+        enabled=getenv("TEMPLATE_STREAMING", "1") == "1",
+        chunk_size=int(getenv("TEMPLATE_STREAMING_CHUNK_SIZE", 8 * 1024))  # characters
+    )
+    template_bytecode_cache = dict(
+        enabled=getenv("TEMPLATE_BYTECODE_CACHE", "1") == "1",
+        path=getenv("TEMPLATE_BYTECODE_CACHE_PATH", "/dev/shm/frontend-templates")  # shared by workers
+    )
+    template_profiling = dict(
+        enabled=getenv("TEMPLATE_PROFILING", "0") == "1",
+        span_attributes=int(getenv("TEMPLATE_PROFILING_SPAN_ATTRIBUTES", 10))  # entries per render
+    )
+    fragment_cache = dict(
+        enabled=getenv("FRAGMENT_CACHE", "1") == "1",
+        ttl=int(getenv("FRAGMENT_CACHE_TTL", 60 * 60)),  # seconds - keyed by release and inputs
+        manifest_size=int(getenv("FRAGMENT_CACHE_MANIFEST_SIZE", 64))  # keys per template
+    )
+    page_cache = dict(
+        enabled=getenv("PAGE_CACHE", "1") == "1",
+        ttl=int(getenv("PAGE_CACHE_TTL", 10 * 60)),  # seconds - announcements are cached for 15 minutes
+        stale_ttl=int(getenv("PAGE_CACHE_STALE_TTL", 5 * 60)),  # seconds
+        announcements_ttl=int(getenv("PAGE_CACHE_ANNOUNCEMENTS_TTL", 60)),  # seconds - of their digest in ETags
+        # Pages are compressed on every miss - i.e. for each new postcode.
+        gzip_level=int(getenv("PAGE_CACHE_GZIP_LEVEL", 6)),
+        brotli_quality=int(getenv("PAGE_CACHE_BROTLI_QUALITY", 5))
+    )
+    negative_cache = dict(
+        ttl=int(getenv("NEGATIVE_CACHE_TTL", 15 * 60)),  # seconds
+        capacity=int(getenv("NEGATIVE_CACHE_CAPACITY", 100_000)),  # keys per release
+        error_rate=float(getenv("NEGATIVE_CACHE_ERROR_RATE", 0.01)),  # Bloom filter false positives
+        sync_interval=float(getenv("NEGATIVE_CACHE_SYNC_INTERVAL", 30))  # seconds
+    )
+    cache_codec = dict(
+        compression_threshold=int(getenv("CACHE_COMPRESSION_THRESHOLD", 16 * 1024)),  # bytes
+        compression_level=1
+    )
 
 
 class Config(object):
@@ -16,22 +16,23 @@ from datetime import datetime
 from os.path import abspath, split as split_path, join as join_path
 from random import randint
 from asyncio import get_running_loop, Lock
+from functools import partial
 
 # 3rd party:
-from pandas import DataFrame
 
 # Internal:
 from app.common.data.variables import DestinationMetrics, IsImproving
-from app.common.utils import get_release_timestamp
+from app.common.data.table import Table
 from app.database.postgres import Connection
-from app.template_processor import render_template
+from app.template_processor import render_template, render_cached_template, MetricIndex, page_context
 from app.caching import from_cache_or_func
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 __all__ = [
     'home_page',
-    'get_home_page'
+    'get_home_page',
+    'get_landing_page_data'
 ]
 
 
@@ -87,14 +88,12 @@ async def get_landing_data(timestamp):
     async with Connection() as conn, Lock(loop=loop):
         values = await conn.fetch(query, ts, metrics)
 
-    df = DataFrame(
+    data = Table.from_records(
         values,
         columns=["areaCode", "areaType", "areaName", "date", "metric", "value", "rank"]
     )
 
-    df = df.assign(formatted_date=df.date.map(lambda x: f"{x:%-d %B %Y}"))
-
-    return df
+    return data.assign(formatted_date=data.map("date", lambda x: f"{x:%-d %B %Y}"))
 
 
 def is_improving(metric, value):
@@ -108,8 +107,8 @@ def is_improving(metric, value):
     return None
 
 
-async def get_home_page(request, timestamp: str, invalid_postcode=None) -> render_template:
-    response = await from_cache_or_func(
+async def get_landing_page_data(request, timestamp: str) -> Table:
+    response = from_cache_or_func(
         request=request,
         func=get_landing_data,
         prefix="FRONTEND::LP::",
@@ -117,18 +116,33 @@ async def get_home_page(request, timestamp: str, invalid_postcode=None) -> rende
         timestamp=timestamp
     )
 
-    context = {
+    return await response
+
+
+async def get_home_page_context(request, timestamp: str, invalid_postcode=None) -> dict:
+    response = await get_landing_page_data(request, timestamp)
+
+    return {
         "timestamp": timestamp,
-        "data": response,
+        "data": MetricIndex(response),
         "cards": DestinationMetrics,
         "is_improving": is_improving,
         "invalid_postcode": invalid_postcode
     }
 
-    return await render_template(request, "main.html", context=context)
 
+async def get_home_page(request, timestamp: str, invalid_postcode=None) -> render_template:
+    context = await get_home_page_context(request, timestamp, invalid_postcode)
+
+    # Not cached - e.g. for invalid postcodes - so sent as it is rendered.
+    return await render_template(request, "main.html", context=context, stream=True)
 
-async def home_page(request) -> render_template:
-    timestamp = await get_release_timestamp(request)
 
-    return await get_home_page(request, timestamp=timestamp)
+async def home_page(request) -> render_cached_template:
+    timestamp = await page_context.get(request, "timestamp")
+
+    return await render_cached_template(
+        request,
+        "main.html",
+        get_context=partial(get_home_page_context, request, timestamp)
+    )
@@ -23,14 +23,22 @@ from opencensus.ext.azure.log_exporter import AzureLogHandler
 from app.postcode.views import postcode_page
 from app.landing.views import home_page
 from app.healthcheck.views import run_healthcheck
+from app.caching.views import cache_stats_page
+from app.template_processor.views import template_profile_page
+from app.template_processor import template, precompile_templates
 from app.config import Settings
 from app.common.utils import add_cloud_role_name, add_instance_role_id
+from app.common.release import release_watcher
 from app.middleware.tracers.starlette import TraceRequestMiddleware
 from app.middleware.headers import ProxyHeadersHostMiddleware
+from app.middleware.memo import RequestMemoMiddleware
+from app.middleware.internal import InternalRoutesMiddleware
 from app.middleware.tracers.azure.exporter import Exporter
 from app.exceptions import exception_handlers
 from app import generic
 from app.context import redis
+from app.warming import CacheWarmer
+from app.caching import CacheStatsEmitter, invalidation_bus
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
@@ -53,6 +61,13 @@ routes = [
 ]
 
 
+# Expose cache keys and timings - only served where the internal token is set.
+internal_routes = [
+    Route(f'/{Settings.cache_stats_path}', endpoint=cache_stats_page, methods=["GET"]),
+    Route(f'/{Settings.template_profile_path}', endpoint=template_profile_page, methods=["GET"]),
+]
+
+
 logging_instances = [
     [logging.getLogger("app"), logging.INFO],
     [logging.getLogger('uvicorn'), logging.INFO],
@@ -63,6 +78,8 @@ logging_instances = [
 
 
 middleware = [
+    # Scopes memoised lookups - e.g. of the release timestamp - to each request.
+    Middleware(RequestMemoMiddleware),
     Middleware(ProxyHeadersHostMiddleware),
     Middleware(ProxyHeadersMiddleware, trusted_hosts=Settings.service_domain),
     Middleware(
@@ -76,6 +93,18 @@ middleware = [
 ]
 
 
+if Settings.internal_token:
+    routes.extend(internal_routes)
+    middleware.insert(
+        0,
+        Middleware(
+            InternalRoutesMiddleware,
+            paths=[route.path for route in internal_routes],
+            token=Settings.internal_token
+        )
+    )
+
+
 async def lifespan(application: Starlette):
     exporter = Exporter(connection_string=Settings.instrumentation_key)
     exporter.add_telemetry_processor(add_cloud_role_name)
@@ -91,11 +120,32 @@ async def lifespan(application: Starlette):
         log.addHandler(handler)
         log.setLevel(level)
 
+    # Compiled before the first request - workers are recycled regularly.
+    precompile_templates(template.env)
+
     pool = await redis.instantiate_redis_pool()
     application.state.redis = pool
 
+    invalidation_bus.start(pool)
+
+    warmer = CacheWarmer(application)
+    if Settings.cache_warming["enabled"]:
+        warmer.start()
+
+    # Started once the warmer has subscribed, so that it is
+    # notified of the release found on the first poll.
+    release_watcher.start()
+
+    stats_emitter = CacheStatsEmitter(Settings.cache_stats["emit_interval"])
+    stats_emitter.start()
+
     yield
 
+    await release_watcher.stop()
+    await warmer.stop()
+    await stats_emitter.stop()
+    await invalidation_bus.stop()
+
     pool.close()
     await pool.wait_closed()
     handler.flush()
@@ -114,10 +164,13 @@ app = Starlette(
 async def add_process_time_header(request: Request, call_next):
     response: Response = await call_next(request)
 
-    last_modified = datetime.now()
-    expires = last_modified + timedelta(minutes=1, seconds=30)
+    now = datetime.now()
+    expires = now + timedelta(minutes=1, seconds=30)
+
+    # Pages tied to a release set their own, so that they may be revalidated.
+    if "last-modified" not in response.headers:
+        response.headers['last-modified'] = now.strftime(HTTP_DATE_FORMAT)
 
-    response.headers['last-modified'] = last_modified.strftime(HTTP_DATE_FORMAT)
     response.headers['expires'] = expires.strftime(HTTP_DATE_FORMAT)
 
     if response.status_code == 503:
@@ -0,0 +1,53 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from hmac import compare_digest
+from http import HTTPStatus
+from typing import Iterable
+
+# 3rd party:
+from starlette.datastructures import Headers
+from starlette.responses import PlainTextResponse
+
+# Internal:
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'InternalRoutesMiddleware'
+]
+
+
+INTERNAL_TOKEN_HEADER = "x-internal-token"
+
+
+class InternalRoutesMiddleware:
+    """
+    Restricts routes that expose the internals of the worker - e.g. cache
+    keys and timings - to requests that carry the internal token in the
+    ``X-Internal-Token`` header. Other requests are answered with a 404,
+    as though the routes did not exist.
+    """
+
+    def __init__(self, app, paths: Iterable[str], token: str):
+        self.app = app
+        self.paths = set(paths)
+        self.token = token.encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+
+        token = Headers(scope=scope).get(INTERNAL_TOKEN_HEADER, str())
+
+        if not compare_digest(token.encode(), self.token):
+            response = PlainTextResponse(
+                HTTPStatus.NOT_FOUND.phrase,
+                status_code=HTTPStatus.NOT_FOUND.real,
+                headers={"cache-control": "no-store"}
+            )
+            return await response(scope, receive, send)
+
+        return await self.app(scope, receive, send)
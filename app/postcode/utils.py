@@ -27,3 +27,14 @@ def get_validated_postcode(postcode: str) -> Union[str, None]:
         return extract
 
     return None
+
+
+def get_outward_code(postcode: Union[str, None]) -> str:
+    """
+    Outward code of a validated postcode - i.e. all but the last three
+    characters, which make up the inward code.
+    """
+    if not postcode:
+        return str()
+
+    return postcode[:-3]
@@ -10,25 +10,28 @@ from json import load
 from typing import Union
 from collections import defaultdict
 from asyncio import gather, get_running_loop, Lock
+from functools import partial
 import ssl
 
 # 3rd party:
 import certifi
-from pandas import DataFrame, concat
 
 # Internal:
 from .types import QueryDataType
-from .utils import get_validated_postcode
-from app.common.utils import get_release_timestamp
+from .utils import get_validated_postcode, get_outward_code
+from app.config import Settings
 from app.common.data.variables import DestinationMetrics, IsImproving
+from app.common.data.table import Table, DTYPE_CONVERTERS
 from app.database.postgres import Connection
-from app.template_processor import render_template
-from app.caching import FromCacheOrDB, FromCacheOrDBMainData
+from app.template_processor import render_cached_template, MetricIndex, page_context
+from app.caching import FromCacheOrDB, FromCacheOrDBMainData, NegativeCache
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 __all__ = [
-    'postcode_page'
+    'postcode_page',
+    'get_data',
+    'get_partition_timestamp'
 ]
 
 
@@ -50,6 +53,12 @@ with open(join_path(assets_dir, "query_params.json")) as fp:
     query_data: QueryDataType = load(fp)
 
 
+column_converters = {
+    name: DTYPE_CONVERTERS[dtype]
+    for name, dtype in query_data["local_data"]["column_types"].items()
+}
+
+
 with open(join_path(queries_dir, "single_query.sql")) as fp:
     single_query = fp.read()
 
@@ -62,6 +71,17 @@ with open(join_path(queries_dir, "locations.sql")) as fp:
     locations_query = fp.read()
 
 
+class UnknownPostcode(LookupError):
+    pass
+
+
+class IncompleteAreaData(RuntimeError):
+    pass
+
+
+unknown_postcodes = NegativeCache("FRONTEND::PC-UNKNOWN::", **Settings.negative_cache)
+
+
 @FromCacheOrDBMainData("area")
 async def get_data(request, area_type, area_id, timestamp, loop=None):
     partition_names = {
@@ -99,15 +119,23 @@ async def get_data(request, area_type, area_id, timestamp, loop=None):
     async with Connection(loop=loop) as conn:
         result = await conn.fetch(query, *args)
 
-    df = DataFrame(
+    return Table.from_records(
         result,
         columns=query_data["local_data"]["column_names"],
-    ).astype(query_data["local_data"]["column_types"])
+        converters=column_converters
+    )
 
-    return df
 
+def get_postcode_shard(arguments) -> str:
+    return get_outward_code(arguments["postcode"])
 
-@FromCacheOrDB("area-postcode")
+
+@FromCacheOrDB(
+    "area-postcode",
+    shard=get_postcode_shard,
+    cache_empty=False,  # Unknown postcodes are held in `unknown_postcodes`.
+    **Settings.postcode_cache
+)
 async def get_postcode_areas(request, postcode: str, **kwargs):
     loop = get_running_loop()
 
@@ -117,17 +145,19 @@ async def get_postcode_areas(request, postcode: str, **kwargs):
     return area_codes
 
 
-async def get_postcode_data(timestamp: str, postcode: str, request) -> DataFrame:
-    msoa_metric = query_data["local_data"]["msoa_metric"]
+def get_partition_timestamp(timestamp: str) -> str:
     ts = datetime.fromisoformat(timestamp.replace("5Z", ""))
-    partition_ts = f"{ts:%Y_%-m_%-d}"
+    return f"{ts:%Y_%-m_%-d}"
 
-    loop = get_running_loop()
+
+async def get_postcode_data(timestamp: str, postcode: str, request) -> Table:
+    msoa_metric = query_data["local_data"]["msoa_metric"]
+    partition_ts = get_partition_timestamp(timestamp)
 
     area_codes = await get_postcode_areas(request, postcode)
 
     if not len(area_codes):
-        return DataFrame()
+        return Table(dict())
 
     kws = defaultdict(list)
     for area_data in area_codes:
@@ -140,25 +170,29 @@ async def get_postcode_data(timestamp: str, postcode: str, request) -> DataFrame
         timestamp=partition_ts
     )
 
-    result = concat(data).reset_index(drop=True)
-    result["rank"] = (
-         result
-         .groupby("metric")[["priority", "date"]]
-         .rank(ascending=True)
-         .mean(axis=1)
-    )
-    filters = (
-        (result["rank"] < 2) |
-        (result["metric"].str.startswith(msoa_metric))
-    )
-    result = result.loc[filters, :]
+    # Areas whose data could not be retrieved are returned as `None`. Pages
+    # are not rendered without them, as they would be cached as such.
+    failed = [area_id for area_id, area_data in zip(kws["area_id"], data) if area_data is None]
+    if failed:
+        raise IncompleteAreaData(f"Failed to retrieve the data of areas {failed} for '{postcode}'.")
+
+    result = Table.concat(data)
+
+    # Mean of the ranks by priority and by date within each metric.
+    result = result.assign(rank=[
+        (priority + date) / 2
+        for priority, date in zip(result.rank("priority", by="metric"), result.rank("date", by="metric"))
+    ])
 
-    result = result.assign(
-        formatted_date=result.date.map(lambda x: f"{x:%-d %B %Y}"),
-        postcode=area_codes[0]['postcode']
+    result = result.filter(
+        rank < 2 or metric.startswith(msoa_metric)
+        for rank, metric in zip(result["rank"], result["metric"])
     )
 
-    return result
+    return result.assign(
+        formatted_date=result.map("date", lambda x: f"{x:%-d %B %Y}"),
+        postcode=[area_codes[0]['postcode']] * len(result)
+    )
 
 
 def is_improving(metric: str, value: Union[float, int]) -> Union[bool, None]:
@@ -172,9 +206,21 @@ def is_improving(metric: str, value: Union[float, int]) -> Union[bool, None]:
     return None
 
 
-def get_area_data(df: DataFrame) -> DataFrame:
-    small_areas = df.sort_values("priority").iloc[0]
-    return small_areas
+def get_area_data(data: Table) -> tuple:
+    return data.row(data.argmin("priority"))
+
+
+def get_parent_area_name(data: Table) -> Union[str, None]:
+    """
+    Name of the local authority of lowest rank - i.e. that which an MSOA
+    is displayed alongside.
+    """
+    local_data = data.filter(area_type in ("utla", "ltla") for area_type in data["areaType"])
+
+    if not len(local_data) or (position := local_data.argmin("rank")) is None:
+        return None
+
+    return local_data["areaName"][position]
 
 
 async def invalid_postcode_response(request, timestamp, raw_postcode):
@@ -187,30 +233,48 @@ async def invalid_postcode_response(request, timestamp, raw_postcode):
     )
 
 
-async def postcode_page(request) -> render_template:
-    timestamp = await get_release_timestamp(request)
+async def get_postcode_page_context(request, timestamp: str, postcode: str) -> dict:
+    data = await get_postcode_data(timestamp, postcode, request)
+
+    if not len(data):
+        raise UnknownPostcode(postcode)
+
+    return {
+        "timestamp": timestamp,
+        "cards": DestinationMetrics,
+        "data": MetricIndex(data),
+        "area_data": get_area_data(data),
+        "parent_area_name": get_parent_area_name(data),
+        "is_improving": is_improving
+    }
+
+
+async def postcode_page(request) -> render_cached_template:
+    timestamp = await page_context.get(request, "timestamp")
 
     postcode_raw = request.query_params["postcode"]
     postcode = get_validated_postcode(postcode_raw)
 
-    data = await get_postcode_data(timestamp, postcode, request)
-
-    if not data.size:
+    if postcode is None or await unknown_postcodes.contains(request, timestamp, postcode):
         return await invalid_postcode_response(
             request,
             timestamp,
             postcode_raw
         )
 
-    return await render_template(
+    try:
+        return await render_cached_template(
+            request,
+            "postcode_results.html",
+            get_context=partial(get_postcode_page_context, request, timestamp, postcode),
+            postcode=postcode
+        )
+    except UnknownPostcode:
+        await unknown_postcodes.add(request, timestamp, postcode)
+
+    return await invalid_postcode_response(
         request,
-        "postcode_results.html",
-        context={
-            "timestamp": timestamp,
-            "cards": DestinationMetrics,
-            "data": data,
-            "area_data": get_area_data(data),
-            "is_improving": is_improving
-        }
+        timestamp,
+        postcode_raw
     )
 
@@ -11,6 +11,8 @@ from uuid import uuid4
 from urllib.parse import quote
 
 # 3rd party:
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceNotModifiedError
 from azure.storage.blob import (
     BlobClient, BlobType, ContentSettings,
     StorageStreamDownloader, StandardBlobTier,
@@ -511,6 +513,26 @@ class AsyncStorageClient:
         logging.info(f"Downloaded blob '{self.container}/{self.path}'")
         return data
 
+    @trace_async_method_operation(
+        "container", "path", "target", "url",
+        name="account_name",
+        dep_type="_name",
+        action="download if modified",
+        operation="GET"
+    )
+    async def download_if_modified(self, etag: Union[str, None]) -> Union[AsyncStorageStreamDownloader, None]:
+        """
+        Downloads the blob unless its ETag matches ``etag``, in which
+        case ``None`` is returned.
+        """
+        if etag is None:
+            return await self.client.download_blob()
+
+        try:
+            return await self.client.download_blob(etag=etag, match_condition=MatchConditions.IfModified)
+        except ResourceNotModifiedError:
+            return None
+
     @trace_async_method_operation(
         "container", "path", "target", "url",
         name="account_name",
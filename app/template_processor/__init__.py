@@ -17,6 +17,8 @@ Contributors:  Pouria Hadjibagheri
 
 # Internal: 
 from .template import *
+from .metrics import *
+from .context import *
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # Header
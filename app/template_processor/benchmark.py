@@ -0,0 +1,141 @@
+#!/usr/bin python3
+
+"""
+Benchmarks the lookups made by the ``get_data`` filter in rendering a
+page, with and without a metric index.
+
+Lookups by scanning a ``DataFrame`` of the data - as the filter did
+before the index - are timed against lookups through an index built once
+per render, for synthetic payloads of the landing and postcode pages.
+The outputs of the two are compared before timing.
+
+Usage:
+
+    python -m app.template_processor.benchmark [iterations]
+"""
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from timeit import timeit
+import sys
+
+# 3rd party:
+from pandas import DataFrame
+
+# Internal:
+from app.caching.benchmark import synthetic_landing_payload
+from app.common.data.table import Table
+from app.common.data.variables import DestinationMetrics
+from app.template_processor.metrics import MetricIndex, MetricRow, getter_metrics
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+AREA_TYPES = ["msoa", "ltla", "utla", "region", "nation"]
+
+
+def synthetic_postcode_payload() -> Table:
+    landing = synthetic_landing_payload()
+
+    return Table.concat(
+        landing.assign(
+            areaType=[area_type] * len(landing),
+            rank=[rank + priority for rank in landing["rank"]]
+        )
+        for priority, area_type in enumerate(AREA_TYPES)
+    )
+
+
+def page_lookups() -> list:
+    """
+    Lookups made by the ``get_data`` filter in rendering a page.
+    """
+    suffixes = ["", "Change", "RollingSum", "ChangePercentage", "Direction"]
+    lookups = [
+        (card["metric"] + suffix, False)
+        for card in DestinationMetrics.values()
+        for suffix in suffixes
+    ]
+    lookups.extend((card["rate"], False) for card in DestinationMetrics.values())
+
+    return [
+        *lookups,
+        ("transmissionRateMin", False),
+        ("transmissionRateMax", False),
+        ("cumPeopleVaccinatedFirstDoseByPublishDate", False),
+        ("cumPeopleVaccinatedSecondDoseByPublishDate", False),
+        ("newPeopleVaccinatedFirstDoseByPublishDate", False),
+        ("newPeopleVaccinatedSecondDoseByPublishDate", False),
+        ("cumVaccinationFirstDoseUptakeByPublishDatePercentage", False),
+        ("cumVaccinationSecondDoseUptakeByPublishDatePercentage", False),
+        ("alertLevel", False),
+        ("newCasesBySpecimenDateRollingSum", True),
+    ]
+
+
+def scan(metric: str, data: DataFrame, msoa: bool = False):
+    try:
+        if msoa is not True:
+            dt = data.loc[
+                ((data.metric == metric) & (data.areaType != "msoa")),
+                getter_metrics
+            ]
+        else:
+            dt = data.loc[data.metric == metric, getter_metrics]
+
+        dt = dt.loc[dt["rank"] == dt["rank"].min(), :]
+        return MetricRow._make(dt.iloc[0])
+    except IndexError:
+        if metric != "alertLevel":
+            return None
+
+        df = data.loc[data['rank'] == data['rank'].max(), getter_metrics]
+        return MetricRow._make(df.iloc[0])._replace(value=None)
+
+
+def lookup(metric: str, index: MetricIndex, msoa: bool = False):
+    value = index.get(metric, msoa)
+
+    if value is None and metric == "alertLevel":
+        return index.fallback
+
+    return value
+
+
+def benchmark(name: str, table: Table, iterations: int):
+    lookups = page_lookups()
+    index = MetricIndex(table)
+    data = DataFrame({column: table[column] for column in table.columns})
+
+    for metric, msoa in lookups:
+        if scan(metric, data, msoa) != lookup(metric, index, msoa):
+            raise AssertionError(f"Lookups of '{metric}' differ.")
+
+    def render_scan():
+        for metric, msoa in lookups:
+            scan(metric, data, msoa)
+
+    def render_index():
+        render_index = MetricIndex(table)
+        for metric, msoa in lookups:
+            lookup(metric, render_index, msoa)
+
+    results = {
+        "scan": timeit(render_scan, number=iterations),
+        "index": timeit(render_index, number=iterations),
+        "index.build": timeit(lambda: MetricIndex(table), number=iterations),
+    }
+
+    print(f"{name}: {len(data):,d} rows | {len(lookups)} lookups per render")
+    for operation, total in results.items():
+        print(f"    {operation:<12} {total / iterations * 1e3:>8.3f} ms per render")
+
+
+def main(iterations: int = 100):
+    benchmark("landing", synthetic_landing_payload(), iterations)
+    benchmark("postcode", synthetic_postcode_payload(), iterations)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]))
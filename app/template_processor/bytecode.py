@@ -0,0 +1,97 @@
+#!/usr/bin python3
+
+"""
+Compilation of templates ahead of requests.
+
+Compiled templates are persisted in a bytecode cache on the filesystem,
+which is shared by the workers of a node, and all templates are compiled
+- or loaded from the cache - as each worker starts.
+
+Entries are keyed by the name and path of each template, and hold the
+SHA-1 hash of the source that they were compiled from. An entry whose
+hash does not match the current source, or that was written by another
+version of Python or Jinja, is recompiled and replaced.
+"""
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from os import makedirs, replace, getpid
+from time import perf_counter
+import logging
+
+# 3rd party:
+from jinja2 import Environment, FileSystemBytecodeCache
+from jinja2.bccache import Bucket
+
+# Internal:
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'SharedBytecodeCache',
+    'install_bytecode_cache',
+    'precompile_templates'
+]
+
+
+logger = logging.getLogger("app")
+
+
+class SharedBytecodeCache(FileSystemBytecodeCache):
+    """
+    Filesystem bytecode cache that may be written to by several workers
+    at once. Entries are written to a temporary file that then replaces
+    the entry, so that other workers never read a partial entry.
+    """
+
+    def dump_bytecode(self, bucket: Bucket):
+        filename = self._get_cache_filename(bucket)
+        temp_filename = f"{filename}.{getpid()}.tmp"
+
+        try:
+            with open(temp_filename, "wb") as fp:
+                bucket.write_bytecode(fp)
+
+            replace(temp_filename, filename)
+        except OSError as err:
+            # Compiled in memory regardless - the next worker retries.
+            logger.warning(f"Failed to cache the bytecode of '{bucket.key}': {err}")
+
+
+def install_bytecode_cache(environment: Environment, enabled: bool, path: str):
+    if not enabled:
+        return
+
+    try:
+        makedirs(path, mode=0o700, exist_ok=True)
+    except OSError as err:
+        logger.warning(f"Template bytecode cache at '{path}' is unavailable: {err}")
+        return
+
+    environment.bytecode_cache = SharedBytecodeCache(path)
+
+
+def precompile_templates(environment: Environment) -> int:
+    """
+    Loads every template of the environment, so that none is compiled
+    while a request is served. Returns the number of templates loaded.
+    """
+    start = perf_counter()
+    loaded = 0
+
+    for name in environment.list_templates(extensions=["html"]):
+        try:
+            environment.get_template(name)
+            loaded += 1
+        except Exception as err:
+            # Raised again - and handled - where the template is rendered.
+            logger.warning(f"Failed to compile template '{name}': {err}")
+
+    cache = environment.bytecode_cache
+    logger.info(
+        f"Loaded {loaded} templates in {(perf_counter() - start) * 1000:.1f} ms "
+        f"({'bytecode cache at ' + cache.directory if cache else 'no bytecode cache'})."
+    )
+
+    return loaded
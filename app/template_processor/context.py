@@ -0,0 +1,149 @@
+#!/usr/bin python3
+
+"""
+Loading of the values shared by the contexts of pages.
+
+Each value is declared along with the values that it depends on, and is
+loaded at most once per request: values are memoised in the state of the
+request, such that a view and ``render_template`` share them. Values
+whose dependencies have been loaded are loaded concurrently.
+
+The time taken to load each value - excluding that of its dependencies -
+is recorded, and added to the span of the request as an attribute.
+"""
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Any, Awaitable, Callable, Dict, Tuple, Union
+from asyncio import Future, gather, get_running_loop
+from inspect import isawaitable
+from time import perf_counter
+
+# 3rd party:
+from opencensus.trace.execution_context import get_opencensus_tracer
+
+# Internal:
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'ContextLoader',
+    'page_context'
+]
+
+
+Loader = Callable[..., Union[Any, Awaitable[Any]]]
+
+
+class RequestContext:
+    """
+    Values loaded for one request, and the time taken to load each.
+    """
+
+    __slots__ = ["tasks", "timings"]
+
+    def __init__(self):
+        self.tasks: Dict[str, Future] = dict()
+        self.timings: Dict[str, float] = dict()
+
+
+class ContextLoader:
+    """
+    Loads context values by name, along with their dependencies.
+
+    Loaders are called with the request, followed by the values of their
+    dependencies as keyword arguments. They may be coroutine functions.
+    Dependencies must be declared before the values that depend on them,
+    such that there can be no cycles.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._loaders: Dict[str, Tuple[Loader, Tuple[str, ...]]] = dict()
+
+    def loader(self, name: str, *dependencies: str):
+        """
+        Declares the loader of a value - e.g.:
+
+            @page_context.loader("banners", "timestamp")
+            async def load_banners(request, timestamp): ...
+        """
+        for dependency in dependencies:
+            if dependency not in self._loaders:
+                raise KeyError(f"Dependency '{dependency}' of '{name}' has not been declared.")
+
+        def register(func: Loader) -> Loader:
+            self._loaders[name] = func, dependencies
+            return func
+
+        return register
+
+    def _context(self, request) -> RequestContext:
+        context = getattr(request.state, self.name, None)
+
+        if context is None:
+            context = RequestContext()
+            setattr(request.state, self.name, context)
+
+        return context
+
+    def provide(self, request, **values):
+        """
+        Sets values that have been loaded otherwise - e.g. passed to
+        ``render_template`` by a view.
+        """
+        context = self._context(request)
+        loop = get_running_loop()
+
+        for name, value in values.items():
+            future = loop.create_future()
+            future.set_result(value)
+            context.tasks[name] = future
+
+    async def get(self, request, name: str) -> Any:
+        return (await self.load(request, name))[name]
+
+    async def load(self, request, *names: str) -> Dict[str, Any]:
+        context = self._context(request)
+        loop = get_running_loop()
+
+        for name in names:
+            if name not in context.tasks:
+                context.tasks[name] = loop.create_task(self._load(request, context, name))
+
+        values = await gather(*(context.tasks[name] for name in names))
+
+        return dict(zip(names, values))
+
+    async def _load(self, request, context: RequestContext, name: str) -> Any:
+        func, dependencies = self._loaders[name]
+
+        try:
+            kwargs = await self.load(request, *dependencies) if dependencies else dict()
+
+            start = perf_counter()
+            value = func(request, **kwargs)
+            if isawaitable(value):
+                value = await value
+        except Exception:
+            # Loaded again where requested again - e.g. by an error page.
+            context.tasks.pop(name, None)
+            raise
+
+        duration = context.timings[name] = perf_counter() - start
+
+        tracer = get_opencensus_tracer()
+        if tracer is not None:
+            tracer.add_attribute_to_current_span(f"context.{name}_ms", round(duration * 1000, 3))
+
+        return value
+
+    def timings(self, request) -> Dict[str, float]:
+        """
+        Time taken to load each value for the request, in seconds.
+        """
+        return dict(self._context(request).timings)
+
+
+page_context = ContextLoader("page_context")
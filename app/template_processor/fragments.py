@@ -0,0 +1,305 @@
+#!/usr/bin python3
+
+"""
+Caching of template fragments.
+
+Components that render identically for every request of a release - e.g.
+the banners, the navigation, or the footer - are wrapped in a fragment
+tag, and the HTML that they render is cached:
+
+    {% fragment "nav", base %}{% include "components/nav.html" %}{% endfragment %}
+
+Fragments are keyed by their name, the release timestamp, the cache
+generation, and the inputs listed in the tag - i.e. everything that
+the component depends on other than the release.
+
+Templates are rendered synchronously, whereas Redis is not. Fragments are
+therefore looked up as a render starts: the keys used by earlier renders
+of the template are read from the in-process, shared, and Redis tiers in
+one go. Fragments that are then rendered are written to the in-process
+and Redis tiers once the render is finished.
+"""
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Callable, Dict, List, NamedTuple, OrderedDict as OrderedDictType, Tuple, Union
+from collections import OrderedDict
+from time import perf_counter
+import logging
+
+# 3rd party:
+from jinja2 import Environment, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+# Internal:
+from ..config import Settings
+from ..caching import Redis, local_cache, shared_cache, cache_stats, current_generation, build_key
+from ..caching.codec import DecodeError, Expiry, encode, decode, read_expiry
+from ..caching.stats import PrefixStats
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'FRAGMENT_PREFIX',
+    'FragmentCache',
+    'fragment_cache'
+]
+
+
+logger = logging.getLogger("app")
+
+
+FRAGMENT_PREFIX = "FRONTEND::FRAGMENT::"
+
+
+def _is_expired(payload: bytes) -> bool:
+    # Fragments are always stored with their expiry.
+    return (expiry := read_expiry(payload)) is None or expiry.is_expired
+
+
+class FragmentRender:
+    """
+    Fragments of a single render.
+
+    Renders may take place in a thread - e.g. where they are streamed - so
+    they only read the fragments retrieved as they started, and hold those
+    that they render until they are finished.
+    """
+
+    __slots__ = ["template_name", "generation", "timestamp", "fragments", "keys", "pending"]
+
+    def __init__(self, template_name: str, generation: int, timestamp: str):
+        self.template_name = template_name
+        self.generation = generation
+        self.timestamp = timestamp
+        # Key: (HTML, stats counter of the tier it was retrieved from).
+        self.fragments: Dict[str, Tuple[str, str]] = dict()
+        self.keys: List[str] = list()
+        self.pending: Dict[str, Tuple[str, bytes]] = dict()
+
+
+class Manifest(NamedTuple):
+    release: Tuple[int, str]  # generation, timestamp
+    keys: OrderedDictType[str, None]
+
+
+class FragmentCache:
+    """
+    Caches the fragments of the templates of a Jinja environment.
+
+    Parameters
+    ----------
+    enabled: bool
+        Whether to cache fragments. Where disabled, fragments are rendered
+        as though they were not wrapped in a fragment tag.
+
+    ttl: int
+        Duration for which fragments are cached, in seconds.
+
+    manifest_size: int
+        Maximum number of fragment keys retrieved as each render of a
+        template starts - e.g. for fragments keyed by area.
+    """
+
+    def __init__(self, enabled: bool, ttl: int, manifest_size: int):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.manifest_size = manifest_size
+        self._manifests: Dict[str, Manifest] = dict()
+
+    @property
+    def stats(self) -> PrefixStats:
+        return cache_stats[FRAGMENT_PREFIX]
+
+    def install(self, environment: Environment):
+        # Installed regardless, so that templates compile where disabled.
+        environment.add_extension(FragmentCacheExtension)
+        environment.extend(fragment_cache=self)
+
+    async def start(self, request, template_name: str, timestamp: str) -> Union[FragmentRender, None]:
+        """
+        Retrieves the fragments used by earlier renders of a template, or
+        returns ``None`` where caching is disabled.
+        """
+        if not self.enabled:
+            return None
+
+        generation = await current_generation(request)
+        render = FragmentRender(template_name, generation, timestamp)
+
+        manifest = self._manifests.get(template_name)
+        if manifest is None or manifest.release != (generation, timestamp):
+            self._manifests[template_name] = Manifest((generation, timestamp), OrderedDict())
+            return render
+
+        missing = list()
+
+        for key in manifest.keys:
+            if (html := local_cache.get(key)) is not None:
+                render.fragments[key] = html, "local_hits"
+            elif (html := self._retain(key, shared_cache.get(key))) is not None:
+                render.fragments[key] = html, "shared_hits"
+            else:
+                missing.append(key)
+
+        if not missing:
+            return render
+
+        async with Redis(request, FRAGMENT_PREFIX) as redis:
+            payloads = await redis.mget(*missing)
+
+        undecodable = list()
+
+        for key, payload in zip(missing, payloads):
+            if (html := self._retain(key, payload, shared=True)) is not None:
+                render.fragments[key] = html, "redis_hits"
+                continue
+
+            # e.g. evicted from Redis - rendered again.
+            manifest.keys.pop(key, None)
+
+            if payload is not None and not _is_expired(payload):
+                undecodable.append(key)
+
+        if undecodable:
+            # Writes do not replace existing fragments.
+            async with Redis(request, FRAGMENT_PREFIX) as redis:
+                await redis.delete(*undecodable)
+
+        return render
+
+    def render(self, render: Union[FragmentRender, None], name: str, inputs: list,
+               caller: Callable[[], str]) -> str:
+        if render is None:
+            return caller()
+
+        key = build_key(FRAGMENT_PREFIX, render.generation, name, render.timestamp, *inputs)
+        render.keys.append(key)
+
+        if key in render.pending:
+            self.stats.local_hits += 1
+            return render.pending[key][0]
+
+        if key not in render.fragments and (html := self._read(key, shared_cache.get(key))) is not None:
+            # Rendered by another worker since the render started.
+            render.fragments[key] = html, "shared_hits"
+
+        if key in render.fragments:
+            html, counter = render.fragments[key]
+            setattr(self.stats, counter, getattr(self.stats, counter) + 1)
+            return html
+
+        self.stats.misses += 1
+        start = perf_counter()
+
+        html = str(caller())
+        render.pending[key] = html, encode(html, Expiry.from_ttl(self.ttl, 0))
+
+        self.stats.record_fill(perf_counter() - start)
+        return html
+
+    async def finish(self, request, render: Union[FragmentRender, None]):
+        """
+        Stores the fragments rendered by a render, and records the keys
+        that it used for the next render of the template.
+        """
+        if render is None:
+            return
+
+        manifest = self._manifests.get(render.template_name)
+        if manifest is not None and manifest.release == (render.generation, render.timestamp):
+            for key in render.keys:
+                manifest.keys[key] = None
+                manifest.keys.move_to_end(key)
+
+            while len(manifest.keys) > self.manifest_size:
+                manifest.keys.popitem(last=False)
+
+        if not render.pending:
+            return
+
+        for key, (html, payload) in render.pending.items():
+            local_cache.set(key, html, ttl=self.ttl)
+            shared_cache.set(key, payload, ttl=self.ttl)
+
+        async with Redis(request, FRAGMENT_PREFIX) as redis:
+            await redis.set_many(
+                {key: payload for key, (_, payload) in render.pending.items()},
+                expire=self.ttl
+            )
+
+    def _read(self, key: str, payload: Union[bytes, None]) -> Union[str, None]:
+        if payload is None or _is_expired(payload):
+            return None
+
+        start = perf_counter()
+
+        try:
+            html = decode(payload)
+        except DecodeError as err:
+            # e.g. written by another version of the codec - rendered again.
+            self.stats.undecodable += 1
+            logger.warning(f"Discarding fragment '{key}': {err}")
+            shared_cache.delete(key)
+            return None
+
+        self.stats.record_decode(len(payload), perf_counter() - start)
+
+        return html
+
+    def _retain(self, key: str, payload: Union[bytes, None], shared: bool = False) -> Union[str, None]:
+        """
+        Reads a fragment, and retains it in the in-process tier - and
+        where ``shared`` is set, in the shared tier.
+        """
+        if (html := self._read(key, payload)) is None:
+            return None
+
+        fresh_for = read_expiry(payload).fresh_for
+        local_cache.set(key, html, ttl=fresh_for)
+
+        if shared:
+            shared_cache.set(key, payload, ttl=fresh_for)
+
+        return html
+
+
+class FragmentCacheExtension(Extension):
+    """
+    Adds the ``fragment`` tag, which takes the name of the fragment
+    followed by its inputs:
+
+        {% fragment "banners", banners %}...{% endfragment %}
+    """
+    tags = {"fragment"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+
+        name = parser.parse_expression()
+        inputs = list()
+
+        while parser.stream.skip_if("comma"):
+            inputs.append(parser.parse_expression())
+
+        body = parser.parse_statements(("name:endfragment",), drop_needle=True)
+
+        return nodes.CallBlock(
+            self.call_method(
+                "_render_fragment",
+                [nodes.Name("fragments", "load"), name, nodes.List(inputs)]
+            ),
+            [], [], body
+        ).set_lineno(lineno)
+
+    def _render_fragment(self, render, name: str, inputs: list, caller) -> Markup:
+        if not isinstance(render, FragmentRender):
+            # e.g. templates rendered outside ``render_template``.
+            render = None
+
+        return Markup(self.environment.fragment_cache.render(render, name, inputs, caller))
+
+
+fragment_cache = FragmentCache(**Settings.fragment_cache)
@@ -0,0 +1,117 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Dict, NamedTuple, Union
+from datetime import date
+
+# 3rd party:
+
+# Internal:
+from app.common.data.table import Table
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'getter_metrics',
+    'MetricRow',
+    'MetricIndex'
+]
+
+
+getter_metrics = [
+    "value",
+    "date",
+    "formatted_date",
+    "areaName",
+    "areaType",
+    "areaCode",
+    "rank"
+]
+
+
+class MetricRow(NamedTuple):
+    value: Union[str, float, None]
+    date: date
+    formatted_date: str
+    areaName: str
+    areaType: str
+    areaCode: str
+    rank: float
+
+
+class MetricIndex:
+    """
+    Index of the page data by metric, built once per render so that the
+    ``get_data`` filter - called dozens of times per page - is a lookup
+    rather than a scan of the data.
+
+    Each metric maps onto its row of minimum rank, the first such row where
+    there is more than one. Rows are indexed both with and without those
+    of MSOAs.
+    """
+
+    __slots__ = ["data", "_rows", "_msoa_rows", "_fallback"]
+
+    def __init__(self, data: Table):
+        if not isinstance(data, Table):
+            # e.g. a ``DataFrame`` cached before tables were introduced.
+            data = Table.from_frame(data)
+
+        self.data = data
+        self._rows: Dict[str, MetricRow] = dict()
+        self._msoa_rows: Dict[str, MetricRow] = dict()
+        self._fallback: Union[MetricRow, None] = None
+
+        if not len(data):
+            return
+
+        columns = [data[name] for name in getter_metrics]
+        ranks, area_types = columns[-1], columns[4]
+
+        # Positions of the rows of minimum rank, with and without MSOAs.
+        best, best_msoa = dict(), dict()
+        max_rank = None
+
+        for position, (metric, rank) in enumerate(zip(data["metric"], ranks)):
+            if rank is None or rank != rank:  # None or NaN
+                continue
+
+            if metric not in best_msoa or rank < ranks[best_msoa[metric]]:
+                best_msoa[metric] = position
+
+            if area_types[position] != "msoa" and (metric not in best or rank < ranks[best[metric]]):
+                best[metric] = position
+
+            if max_rank is None or rank > ranks[max_rank]:
+                max_rank = position
+
+        def get_row(position: int) -> MetricRow:
+            return MetricRow._make(column[position] for column in columns)
+
+        self._rows = {metric: get_row(position) for metric, position in best.items()}
+        self._msoa_rows = {metric: get_row(position) for metric, position in best_msoa.items()}
+
+        if max_rank is not None:
+            self._fallback = get_row(max_rank)._replace(value=None)
+
+    def get(self, metric: str, msoa: bool = False) -> Union[MetricRow, None]:
+        if msoa:
+            return self._msoa_rows.get(metric)
+
+        return self._rows.get(metric)
+
+    @property
+    def fallback(self) -> MetricRow:
+        """
+        Row of maximum rank, without a value - for metrics that are
+        missing from the data but must be displayed.
+        """
+        if self._fallback is None:
+            raise IndexError("No ranked rows in the data.")
+
+        return self._fallback
+
+    def __len__(self) -> int:
+        return len(self.data)
@@ -0,0 +1,344 @@
+#!/usr/bin python3
+
+"""
+Opt-in profiling of template rendering.
+
+Where enabled, the time spent in each template - including those that are
+included or extended - and in each block, macro, and registered filter is
+measured for every render. Measurements are aggregated per route, added
+to the span of the request as attributes, and reported by the internal
+template profile page.
+
+Both total and self time are measured: the self time of an entry excludes
+the time spent in the entries that it calls - e.g. the filters called by a
+template, or the templates that it includes.
+
+Profiling is installed once, as templates are loaded and filters are
+registered, so that renders are not affected where it is disabled.
+"""
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Union
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import defaultdict
+from functools import wraps
+from os.path import relpath
+from time import perf_counter
+
+# 3rd party:
+from jinja2 import Environment, Template
+from jinja2.runtime import Macro
+from opencensus.trace.execution_context import get_opencensus_tracer
+from starlette.routing import Match
+
+# Internal:
+from ..config import Settings
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'TemplateProfiler',
+    'template_profiler'
+]
+
+
+EntryKey = Tuple[str, str]  # kind, name
+
+
+class Timing:
+    __slots__ = ["calls", "total_time", "self_time"]
+
+    def __init__(self):
+        self.calls = 0
+        self.total_time = 0.0
+        self.self_time = 0.0
+
+    def add(self, other: 'Timing'):
+        self.calls += other.calls
+        self.total_time += other.total_time
+        self.self_time += other.self_time
+
+
+class RenderProfile:
+    """
+    Measurements of a single render.
+    """
+
+    __slots__ = ["route", "template_name", "entries", "_stack"]
+
+    def __init__(self, route: str, template_name: str):
+        self.route = route
+        self.template_name = template_name
+        self.entries: Dict[EntryKey, Timing] = defaultdict(Timing)
+        # Time spent in the entries called by each entry in progress.
+        self._stack: List[float] = list()
+
+    @contextmanager
+    def measure(self, key: EntryKey, call: bool = True):
+        """
+        Measures the time spent in an entry. Generators - e.g. templates -
+        are measured each time they are resumed, and count as one call.
+        """
+        self._stack.append(0.0)
+        start = perf_counter()
+
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - start
+            child_time = self._stack.pop()
+
+            timing = self.entries[key]
+            timing.calls += call
+            timing.total_time += elapsed
+            timing.self_time += elapsed - child_time
+
+            if self._stack:
+                self._stack[-1] += elapsed
+
+    @property
+    def duration(self) -> float:
+        return self.entries[("template", self.template_name)].total_time
+
+
+class RouteProfile:
+    """
+    Measurements aggregated across the renders of a route.
+    """
+
+    __slots__ = ["renders", "render_time", "entries"]
+
+    def __init__(self):
+        self.renders = 0
+        self.render_time = 0.0
+        self.entries: Dict[EntryKey, Timing] = defaultdict(Timing)
+
+    def add(self, profile: RenderProfile):
+        self.renders += 1
+        self.render_time += profile.duration
+
+        for key, timing in profile.entries.items():
+            self.entries[key].add(timing)
+
+    def report(self) -> Dict[str, Any]:
+        entries = sorted(self.entries.items(), key=lambda item: item[1].self_time, reverse=True)
+
+        return {
+            "renders": self.renders,
+            "mean_render_ms": self.render_time / self.renders * 1000 if self.renders else None,
+            "entries": [
+                {
+                    "kind": kind,
+                    "name": name,
+                    "calls_per_render": timing.calls / self.renders,
+                    "mean_total_ms": timing.total_time / self.renders * 1000,
+                    "mean_self_ms": timing.self_time / self.renders * 1000,
+                    "self_share": timing.self_time / self.render_time if self.render_time else None
+                }
+                for (kind, name), timing in entries
+            ]
+        }
+
+
+_exhausted = object()
+
+_current_profile: ContextVar[Union[RenderProfile, None]] = ContextVar("template_profile", default=None)
+
+
+class TemplateProfiler:
+    """
+    Profiles the templates of a Jinja environment.
+
+    Parameters
+    ----------
+    enabled: bool
+        Whether to profile renders. Where disabled, nothing is installed.
+
+    span_attributes: int
+        Maximum number of entries - those with the most self time - that
+        are added to the span of the request for each render.
+    """
+
+    def __init__(self, enabled: bool, span_attributes: int):
+        self.enabled = enabled
+        self.span_attributes = span_attributes
+        self.routes: Dict[str, RouteProfile] = defaultdict(RouteProfile)
+
+    def install(self, environment: Environment):
+        """
+        Profiles the templates that the environment loads from here on,
+        and the macros that they define.
+        """
+        if not self.enabled:
+            return
+
+        environment.template_class = profiled_template_class(self, environment.template_class)
+
+        invoke = Macro._invoke
+        template_path = environment.loader.searchpath[0]
+
+        @wraps(invoke)
+        def profiled_invoke(macro: Macro, arguments, autoescape):
+            profile = _current_profile.get()
+            if profile is None:
+                return invoke(macro, arguments, autoescape)
+
+            filename = relpath(macro._func.__code__.co_filename, template_path)
+            with profile.measure(("macro", f"{filename}:{macro.name}")):
+                return invoke(macro, arguments, autoescape)
+
+        # Macros are instantiated by the compiled templates themselves.
+        Macro._invoke = profiled_invoke
+
+    def wrap_filter(self, func: Callable) -> Callable:
+        if not self.enabled:
+            return func
+
+        key = ("filter", func.__name__)
+
+        @wraps(func)
+        def profiled_filter(*args, **kwargs):
+            profile = _current_profile.get()
+            if profile is None:
+                return func(*args, **kwargs)
+
+            with profile.measure(key):
+                return func(*args, **kwargs)
+
+        return profiled_filter
+
+    def wrap_render_func(self, kind: str, name: str, render_func: Callable) -> Callable:
+        key = (kind, name)
+
+        @wraps(render_func)
+        def profiled_render(context) -> Iterator[str]:
+            events = render_func(context)
+            profile = _current_profile.get()
+
+            if profile is None:
+                yield from events
+                return
+
+            call = True
+            while True:
+                with profile.measure(key, call=call):
+                    event = next(events, _exhausted)
+
+                if event is _exhausted:
+                    return
+
+                call = False
+                yield event
+
+        return profiled_render
+
+    def start(self, request, template_name: str) -> Union[RenderProfile, None]:
+        """
+        Starts the profile of a render, or returns ``None`` where
+        profiling is disabled.
+        """
+        if not self.enabled:
+            return None
+
+        return RenderProfile(get_route(request), template_name)
+
+    def iterate(self, profile: Union[RenderProfile, None], iterator: Iterator) -> Iterator:
+        """
+        Measures each step of ``iterator`` - e.g. of a streamed render - as
+        part of ``profile``, which is finished once the iterator is exhausted.
+        """
+        if profile is None:
+            return iterator
+
+        return self._iterate(profile, iterator)
+
+    def _iterate(self, profile: RenderProfile, iterator: Iterator) -> Iterator:
+        while True:
+            with self.activate(profile):
+                item = next(iterator, _exhausted)
+
+            if item is _exhausted:
+                break
+
+            yield item
+
+        self.finish(profile)
+
+    @contextmanager
+    def activate(self, profile: Union[RenderProfile, None]):
+        """
+        Measures the rendering that takes place within the context as
+        part of ``profile``.
+        """
+        if profile is None:
+            yield
+            return
+
+        token = _current_profile.set(profile)
+
+        try:
+            yield
+        finally:
+            _current_profile.reset(token)
+
+    def finish(self, profile: Union[RenderProfile, None]):
+        if profile is None:
+            return
+
+        self.routes[profile.route].add(profile)
+
+        tracer = get_opencensus_tracer()
+        if tracer is None:
+            return
+
+        tracer.add_attribute_to_current_span("template.name", profile.template_name)
+        tracer.add_attribute_to_current_span("template.render_ms", round(profile.duration * 1000, 3))
+
+        entries = sorted(profile.entries.items(), key=lambda item: item[1].self_time, reverse=True)
+        for (kind, name), timing in entries[:self.span_attributes]:
+            tracer.add_attribute_to_current_span(
+                f"template.{kind}.{name}",
+                f"{timing.calls} calls, {timing.self_time * 1000:.3f} ms self, "
+                f"{timing.total_time * 1000:.3f} ms total"
+            )
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "routes": {route: profile.report() for route, profile in self.routes.items()}
+        }
+
+
+def profiled_template_class(profiler: TemplateProfiler, base: type):
+    class ProfiledTemplate(base):
+        @classmethod
+        def _from_namespace(cls, environment, namespace, globals):
+            result: Template = super()._from_namespace(environment, namespace, globals)
+
+            result.root_render_func = profiler.wrap_render_func(
+                "template", result.name, result.root_render_func
+            )
+            result.blocks = {
+                name: profiler.wrap_render_func("block", f"{result.name}#{name}", render_func)
+                for name, render_func in result.blocks.items()
+            }
+
+            return result
+
+    return ProfiledTemplate
+
+
+def get_route(request) -> str:
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return f"{request.method} {getattr(route, 'path', request.url.path)}"
+
+    # e.g. error pages for unknown paths.
+    return f"{request.method} <unmatched>"
+
+
+template_profiler = TemplateProfiler(**Settings.template_profiling)
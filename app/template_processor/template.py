@@ -4,55 +4,73 @@
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # Python:
 from functools import wraps
-from datetime import datetime, timedelta
-from asyncio import gather
-from typing import Union, Dict, Any, Optional
+from datetime import datetime, timedelta, timezone as dt_timezone
+from email.utils import format_datetime
+from http import HTTPStatus
+from typing import Union, Dict, Any, Optional, Callable, Awaitable, Iterator
+import gzip
+import logging
 import re
 
 # 3rd party:
 from starlette.templating import Jinja2Templates
+from starlette.responses import HTMLResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from jinja2.filters import do_mark_safe
 
-from pandas import DataFrame
-
 from pytz import timezone
 
+import brotli
+
 # Internal: 
 from ..config import Settings
 from .types import DataItem
+from .metrics import MetricIndex
+from .profiler import template_profiler
+from .fragments import fragment_cache
+from .context import page_context
+from .bytecode import install_bytecode_cache, precompile_templates
+from ..common.data.table import Table
 from ..common.data.variables import NationalAdjectives
 from ..common.utils import get_website_timestamp, get_release_timestamp
 from ..common.banner import get_banners
 from ..common.whats_new import get_whats_new_banners
 from app.common.utils import get_og_image_names
+from app.caching import from_cache_or_func, current_generation, local_cache
+from app.caching.keys import build_key, digest
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 __all__ = [
     'template',
     'as_template_filter',
-    'render_template'
+    'render_template',
+    'render_cached_template',
+    'precompile_templates'
 ]
 
 
-NOT_AVAILABLE = "N/A"
+logger = logging.getLogger("app")
 
-getter_metrics = [
-    "value",
-    "date",
-    "formatted_date",
-    "areaName",
-    "areaType",
-    "areaCode",
-    "rank"
-]
+
+NOT_AVAILABLE = "N/A"
 
 SUPPRESSED_MSOA = -999999.0
 timestamp_pattern = "%A %-d %B %Y at %-I:%M %p"
 timezone_LN = timezone("Europe/London")
 
+PAGE_PREFIX = "FRONTEND::PAGE::"
+ANNOUNCEMENTS_PREFIX = "FRONTEND::ANNOUNCEMENTS::"
+
+# In order of preference.
+CONTENT_ENCODINGS = ["br", "gzip", "identity"]
+
 
 template = Jinja2Templates(directory=Settings.template_path)
+install_bytecode_cache(template.env, **Settings.template_bytecode_cache)
+template_profiler.install(template.env)
+fragment_cache.install(template.env)
 
 
 AreaTypeNames = {
@@ -65,8 +83,72 @@ AreaTypeNames = {
 }
 
 
+@page_context.loader("timestamp")
+async def load_timestamp(request) -> str:
+    return await get_release_timestamp(request)
+
+
+@page_context.loader("despatch")
+async def load_despatch(request) -> str:
+    return await get_website_timestamp(request)
+
+
+@page_context.loader("date", "despatch")
+def load_date(request, despatch: str) -> str:
+    return despatch.split("T")[0]
+
+
+@page_context.loader("base")
+def load_base(request) -> str:
+    base = f"{request.url.scheme}://{request.url.hostname}"
+
+    if request.url.port and request.url.port not in [80, 443]:
+        base += f":{request.url.port}"
+
+    return base
+
+
+@page_context.loader("banners", "timestamp")
+async def load_banners(request, timestamp: str) -> list:
+    return await get_banners(request, timestamp)
+
+
+@page_context.loader("whatsnew_banners", "timestamp")
+async def load_whats_new_banners(request, timestamp: str) -> list:
+    return await get_whats_new_banners(request, timestamp)
+
+
+@page_context.loader("announcements", "timestamp")
+async def load_announcements(request, timestamp: str) -> str:
+    """
+    Digest of the banners and announcements, which change within a
+    release. The digest is held in-process for ``announcements_ttl``
+    seconds, so that conditional requests are answered without loading
+    the banners.
+    """
+    key = build_key(ANNOUNCEMENTS_PREFIX, await current_generation(request), timestamp)
+
+    if (announcements := local_cache.get(key)) is not None:
+        return announcements
+
+    loaded = await page_context.load(request, "banners", "whatsnew_banners")
+    announcements = digest(loaded["banners"], loaded["whatsnew_banners"])
+    local_cache.set(key, announcements, ttl=Settings.page_cache["announcements_ttl"])
+
+    return announcements
+
+
+@page_context.loader("og_images", "timestamp")
+def load_og_images(request, timestamp: str) -> list:
+    return get_og_image_names(timestamp)
+
+
+# Context shared by all pages.
+SHARED_CONTEXT = ["timestamp", "despatch", "date", "base", "banners", "whatsnew_banners", "og_images"]
+
+
 def as_template_filter(func):
-    template.env.filters[func.__name__] = func
+    template.env.filters[func.__name__] = template_profiler.wrap_filter(func)
 
     @wraps(func)
     def add_filter(*args, **kwargs):
@@ -76,43 +158,272 @@ def as_template_filter(func):
 
 
 async def render_template(request, template_name: str, context: Optional[Dict[str, Any]],
-                          status_code: int = 200) -> template.TemplateResponse:
+                          status_code: int = 200,
+                          stream: bool = False) -> Union[template.TemplateResponse, StreamingResponse]:
+    """
+    Renders a template with the context shared by all pages.
+
+    Where ``stream`` is set, the page is sent as it is rendered. All data
+    is retrieved beforehand, and the first chunk - the head of the page -
+    is rendered before the response starts, so that errors raised up to
+    that point are handled by the exception handlers as usual.
+    """
     context = {
         "DEBUG": Settings.DEBUG,
         **context
     }
 
-    if "timestamp" not in context:
-        context["timestamp"] = await get_release_timestamp(request)
+    # Values that the view has loaded are not loaded again.
+    page_context.provide(request, **{
+        name: context[name]
+        for name in ["timestamp", "despatch"]
+        if name in context
+    })
 
-    if "despatch" not in context:
-        context["despatch"] = await get_website_timestamp(request)
+    context = {
+        "request": request,
+        "environment": Settings.ENVIRONMENT,
+        "app_insight_token": Settings.instrumentation_key,
+        **await page_context.load(request, *SHARED_CONTEXT),
+        **context
+    }
 
-    context["date"] = context["despatch"].split("T")[0]
+    context["fragments"] = fragments = await fragment_cache.start(
+        request, template_name, context["timestamp"]
+    )
 
-    context["base"] = f"{request.url.scheme}://{request.url.hostname}"
+    profile = template_profiler.start(request, template_name)
 
-    if request.url.port and request.url.port not in [80, 443]:
-        context["base"] += f":{request.url.port}"
+    if stream and Settings.template_streaming["enabled"]:
+        return stream_template(
+            request, template_name, context, status_code, profile,
+            # Fragments are stored once the page is sent.
+            background=BackgroundTask(fragment_cache.finish, request, fragments)
+        )
 
-    kw_jobs = {
-        "banners": get_banners(request, context["timestamp"]),
-        "whatsnew_banners": get_whats_new_banners(request, context["timestamp"])
-    }
+    with template_profiler.activate(profile):
+        response = template.TemplateResponse(
+            template_name,
+            status_code=status_code,
+            context=context
+        )
+
+    template_profiler.finish(profile)
+    await fragment_cache.finish(request, fragments)
+
+    return response
 
-    return template.TemplateResponse(
-        template_name,
+
+def generate_chunks(template_name: str, context: Dict[str, Any], chunk_size: int) -> Iterator[bytes]:
+    """
+    Renders a template in chunks of at least ``chunk_size`` characters,
+    rather than in the fragments that Jinja produces.
+    """
+    buffer, length = list(), 0
+
+    for fragment in template.get_template(template_name).generate(context):
+        buffer.append(fragment)
+        length += len(fragment)
+
+        if length >= chunk_size:
+            yield str.join("", buffer).encode()
+            buffer, length = list(), 0
+
+    if buffer:
+        yield str.join("", buffer).encode()
+
+
+def stream_template(request, template_name: str, context: Dict[str, Any],
+                    status_code: int = 200, profile=None,
+                    background: Optional[BackgroundTask] = None) -> StreamingResponse:
+    chunks = template_profiler.iterate(
+        profile,
+        generate_chunks(
+            template_name,
+            context,
+            chunk_size=Settings.template_streaming["chunk_size"]
+        )
+    )
+
+    head = next(chunks, bytes())
+
+    def body() -> Iterator[bytes]:
+        yield head
+
+        try:
+            yield from chunks
+        except Exception as err:
+            # The status has been sent - the response can only be aborted.
+            logger.exception(
+                f"Failed to render '{template_name}' mid-stream: {err}",
+                extra=dict(
+                    custom_dimensions=dict(
+                        url=str(request.url),
+                        path=str(request.url.path),
+                        template=template_name,
+                        api_environment=Settings.ENVIRONMENT,
+                        server_location=Settings.server_location
+                    )
+                )
+            )
+            raise
+
+    return StreamingResponse(
+        body(),
         status_code=status_code,
-        context=dict(
-            request=request,
-            environment=Settings.ENVIRONMENT,
-            app_insight_token=Settings.instrumentation_key,
-            og_images=get_og_image_names(context["timestamp"]),
-            **dict(zip(kw_jobs, await gather(*kw_jobs.values()))),
-            **context
+        media_type="text/html",
+        background=background
+    )
+
+
+async def render_cached_template(request, template_name: str,
+                                 get_context: Callable[[], Awaitable[Dict[str, Any]]],
+                                 **inputs) -> HTMLResponse:
+    """
+    Renders a page that is identical for all requests to the same route
+    with the same inputs, for as long as the release and despatch
+    timestamps remain the same. The rendered HTML is cached, and
+    ``get_context`` is only awaited where the page is not.
+
+    Exceptions raised by ``get_context`` are propagated and nothing is
+    cached, so that error variants of a page bypass the cache.
+
+    Pages are cached along with their gzip and brotli encodings, and the
+    encoding is chosen by ``Accept-Encoding``.
+
+    Pages carry a strong ETag derived from the cache key and the encoding,
+    and the release time as their Last-Modified date. Requests with a
+    matching ETag are answered with a 304 before the page - or any of its
+    data - is loaded.
+
+    Banners and announcements change within a release, so their digest is
+    part of the cache key - and therefore of the ETag. Last-Modified does
+    not reflect them, so ``If-Modified-Since`` is not honoured.
+    """
+    loaded = await page_context.load(request, "timestamp", "despatch", "announcements")
+    timestamp, despatch = loaded["timestamp"], loaded["despatch"]
+    settings = Settings.page_cache
+
+    page_inputs = dict(
+        route=request.url.path,
+        template_name=template_name,
+        timestamp=timestamp,
+        despatch=despatch,
+        announcements=loaded["announcements"],
+        # Links in pages are absolute.
+        base=f"{request.url.scheme}://{request.url.netloc}",
+        encodings=CONTENT_ENCODINGS,
+        **inputs
+    )
+
+    encoding = get_content_encoding(request) if settings["enabled"] else "identity"
+
+    # Pages change with the cache generation - e.g. on deployment.
+    etag = digest(await current_generation(request), **page_inputs)[:32]
+    headers = {
+        "etag": f'"{etag}"' if encoding == "identity" else f'"{etag}-{encoding}"',
+        "last-modified": format_datetime(parse_timestamp(timestamp), usegmt=True),
+        "vary": "accept-encoding"
+    }
+
+    if is_not_modified(request, headers["etag"]):
+        return Response(status_code=HTTPStatus.NOT_MODIFIED.real, headers=headers)
+
+    async def render(request, **_) -> Dict[str, bytes]:
+        context = await get_context()
+        response = await render_template(
+            request,
+            template_name,
+            context={"timestamp": timestamp, "despatch": despatch, **context}
         )
+
+        # Compressed once per render rather than once per response, and
+        # in a thread so that other requests are not held up meanwhile.
+        return await run_in_threadpool(
+            compress_page,
+            response.body,
+            gzip_level=settings["gzip_level"],
+            brotli_quality=settings["brotli_quality"]
+        )
+
+    if not settings["enabled"]:
+        encodings = await render(request)
+        return HTMLResponse(encodings["identity"], headers=headers)
+
+    encodings = await from_cache_or_func(
+        request=request,
+        func=render,
+        prefix=PAGE_PREFIX,
+        expire=settings["ttl"],
+        with_request=True,
+        stale_ttl=settings["stale_ttl"],
+        **page_inputs
     )
 
+    if encoding != "identity":
+        headers["content-encoding"] = encoding
+
+    return HTMLResponse(encodings[encoding], headers=headers)
+
+
+def compress_page(body: bytes, gzip_level: int, brotli_quality: int) -> Dict[str, bytes]:
+    return {
+        "identity": body,
+        "gzip": gzip.compress(body, compresslevel=gzip_level, mtime=0),
+        "br": brotli.compress(body, quality=brotli_quality)
+    }
+
+
+def get_content_encoding(request) -> str:
+    """
+    Chooses the preferred content encoding that is acceptable as per
+    the ``Accept-Encoding`` header of a request.
+    """
+    accepted = dict()
+
+    for item in request.headers.get("accept-encoding", str()).split(","):
+        coding, _, params = item.partition(";")
+        quality = 1.0
+
+        if (param := params.strip()).startswith("q="):
+            try:
+                quality = float(param[2:])
+            except ValueError:
+                quality = 0.0
+
+        accepted[coding.strip().lower()] = quality
+
+    default = accepted.get("*", 0.0)
+    candidates = [
+        (accepted.get(encoding, default), -index, encoding)
+        for index, encoding in enumerate(CONTENT_ENCODINGS[:-1])
+    ]
+
+    quality, _, encoding = max(candidates)
+    if quality > 0:
+        return encoding
+
+    return "identity"
+
+
+def parse_timestamp(timestamp: str) -> datetime:
+    """
+    Parses a release timestamp - e.g. ``2021-05-01T15:25:12.1234565Z`` -
+    to the second.
+    """
+    return datetime.fromisoformat(timestamp[:19]).replace(tzinfo=dt_timezone.utc)
+
+
+def is_not_modified(request, etag: str) -> bool:
+    """
+    Evaluates ``If-None-Match`` as per RFC 7232.
+    """
+    if (if_none_match := request.headers.get("if-none-match")) is None:
+        return False
+
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
 
 def process_msoa(value: float, metric: str) -> str:
     if value == SUPPRESSED_MSOA:
@@ -142,28 +453,19 @@ def format_number(value: Union[int, float, str]) -> str:
 
 
 @as_template_filter
-def get_data(metric: str, data: DataFrame, msoa=False) -> DataItem:
+def get_data(metric: str, data: Union[MetricIndex, Table], msoa=False) -> DataItem:
     float_metrics = ["Rate", "Percent"]
 
-    try:
-        if msoa is not True:
-            dt = data.loc[
-                ((data.metric == metric) & (data.areaType != "msoa")),
-                getter_metrics
-            ]
-        else:
-            dt = data.loc[data.metric == metric, getter_metrics]
-
-        dt = dt.loc[dt["rank"] == dt["rank"].min(), :]
-        value = dt.iloc[0]
-    except IndexError:
+    if not isinstance(data, MetricIndex):
+        data = MetricIndex(data)
+
+    value = data.get(metric, msoa=msoa is True)
+
+    if value is None:
         if metric != "alertLevel":
             return dict()
 
-        df = data.loc[data['rank'] == data['rank'].max(), :]
-        df.metric = metric
-        df.value = None
-        value = df.loc[:, getter_metrics].iloc[0]
+        value = data.fallback
 
     result = {
         "rawDate": value.date,
@@ -0,0 +1,38 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from http import HTTPStatus
+from os import getpid
+
+# 3rd party:
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+# Internal:
+from .profiler import template_profiler
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'template_profile_page'
+]
+
+
+async def template_profile_page(request: Request) -> JSONResponse:
+    """
+    Template profile of the worker that serves the request, aggregated
+    per route since the worker was started. Entries are in descending
+    order of self time.
+    """
+    response = {
+        "pid": getpid(),
+        **template_profiler.report()
+    }
+
+    return JSONResponse(
+        response,
+        status_code=HTTPStatus.OK.real,
+        headers={"cache-control": "no-store"}
+    )
@@ -0,0 +1,4 @@
+SELECT id::INT AS id, area_type
+FROM covid19.area_reference
+WHERE area_type = ANY($1::VARCHAR[])
+ORDER BY area_type, id;
@@ -0,0 +1,274 @@
+#!/usr/bin python3
+
+"""
+Release-triggered cache warming.
+
+Every release changes the keys of the partition-based cache entries.
+The warmer is notified of each new release by the release watcher - or
+where it is disabled, polls the latest published timestamp itself - and
+populates the cache for the new release before the timestamp used to
+serve pages is switched over to it.
+"""
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Any, Dict, List, NamedTuple, Union
+from asyncio import Semaphore, Task, gather, get_running_loop, sleep, CancelledError
+from os.path import abspath, split as split_path, join as join_path
+from time import monotonic
+from uuid import uuid4
+import logging
+
+# 3rd party:
+
+# Internal:
+from app.config import Settings
+from app.caching import Redis, build_key, current_generation, invalidation_bus
+from app.common.utils import get_from_storage
+from app.common.release import release_watcher
+from app.common.banner import get_banners
+from app.common.whats_new import get_whats_new_banners
+from app.database.postgres import Connection
+from app.landing.views import get_landing_page_data
+from app.postcode.views import get_data, get_partition_timestamp
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'CacheWarmer'
+]
+
+
+logger = logging.getLogger("app")
+
+curr_dir, _ = split_path(abspath(__file__))
+queries_dir = join_path(curr_dir, "queries")
+
+with open(join_path(queries_dir, "areas.sql")) as fp:
+    areas_query = fp.read()
+
+
+CLAIM_PREFIX = "FRONTEND::WARMED::"
+WARMED = b"warmed"  # Value of the claims of releases that have been warmed.
+TIMESTAMP_PREFIX = "FRONTEND::TS::"
+
+
+class WarmingRequest:
+    """
+    Stands in for a request where cached functions are called outside of
+    one. The cache layer only requires the application, which holds the
+    Redis pool.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+
+class WarmingReport(NamedTuple):
+    timestamp: str
+    total: int
+    failed: int
+    duration: float
+
+
+class CacheWarmer:
+    """
+    Warms the cache for each new release.
+
+    Every worker runs a warmer, but each release is only warmed once
+    across the cluster: the worker that claims the release in Redis
+    warms it, and the others skip it.
+
+    Parameters
+    ----------
+    app: Starlette
+        Application whose Redis pool is used for caching.
+    """
+
+    def __init__(self, app):
+        self.request = WarmingRequest(app)
+        self.release: Union[str, None] = None
+        self._task: Union[Task, None] = None
+
+    def start(self):
+        if release_watcher.enabled:
+            release_watcher.add_handler(self.on_release, holds_switch=True)
+        elif self._task is None:
+            self._task = get_running_loop().create_task(self.run())
+
+    def on_release(self, timestamp: str):
+        if self._task is not None:
+            # Superseded by the new release.
+            self._task.cancel()
+
+        self._task = get_running_loop().create_task(self.warm_new_release(timestamp))
+
+    async def warm_new_release(self, timestamp: str):
+        try:
+            await self.warm_release(timestamp)
+            self.release = timestamp
+        except CancelledError:
+            raise
+        except Exception as err:
+            logger.exception(f"Cache warming failed: {err}")
+            # Served cold, rather than held until the switch times out.
+            release_watcher.switch()
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        self._task.cancel()
+
+        try:
+            await self._task
+        except CancelledError:
+            pass
+
+        self._task = None
+
+    async def run(self):
+        settings = Settings.cache_warming
+
+        while True:
+            try:
+                timestamp = await get_from_storage(**Settings.latest_published_timestamp)
+
+                if timestamp != self.release:
+                    await self.warm_release(timestamp)
+                    self.release = timestamp
+            except CancelledError:
+                raise
+            except Exception as err:
+                logger.exception(f"Cache warming failed: {err}")
+
+            await sleep(settings["poll_interval"])
+
+    async def warm_release(self, timestamp: str):
+        """
+        Warms the cache for a release, unless it has been claimed by another
+        worker. The claim is withdrawn if warming fails, so that the release
+        may be warmed again.
+        """
+        settings = Settings.cache_warming
+        claim_key = CLAIM_PREFIX + timestamp
+        token = uuid4().hex
+
+        async with Redis(self.request, claim_key) as redis:
+            if not await redis.acquire_lock(claim_key, token, settings["claim_ttl"] * 1000):
+                # e.g. where the release was found late, once it had been warmed.
+                if await redis.get(claim_key) == WARMED:
+                    release_watcher.switch()
+
+                return
+
+        try:
+            await self.warm(timestamp)
+            await self.switch_release()
+
+            async with Redis(self.request, claim_key) as redis:
+                await redis.replace(claim_key, WARMED, settings["claim_ttl"])
+        except BaseException:
+            async with Redis(self.request, claim_key) as redis:
+                await redis.release_lock(claim_key, token)
+            raise
+
+    async def switch_release(self):
+        """
+        Removes the cached release timestamp, and evicts it from the local
+        tiers of all workers, such that pages are served for the new release.
+        Release watchers switch over as they receive the eviction.
+        """
+        generation = await current_generation(self.request)
+        cache_key = build_key(TIMESTAMP_PREFIX, generation, **Settings.latest_published_timestamp)
+
+        async with Redis(self.request, cache_key) as redis:
+            await redis.delete(cache_key)
+
+        await invalidation_bus.publish(self.request, keys=[cache_key])
+
+    async def get_areas(self) -> Dict[str, List[int]]:
+        settings = Settings.cache_warming
+        area_types = list(settings["area_types"])
+
+        if settings["include_msoa"]:
+            area_types.append("msoa")
+
+        async with Connection() as conn:
+            response = await conn.fetch(areas_query, area_types)
+
+        areas = {area_type: list() for area_type in area_types}
+        for area in response:
+            areas[area["area_type"]].append(area["id"])
+
+        return areas
+
+    async def warm(self, timestamp: str) -> WarmingReport:
+        """
+        Populates the cache with the landing page data, banners, what's new
+        entries, and the area data for the given release.
+        """
+        settings = Settings.cache_warming
+        start = monotonic()
+        partition_ts = get_partition_timestamp(timestamp)
+
+        logger.info(f"Warming the cache for release '{timestamp}'.")
+
+        pages = await gather(
+            get_landing_page_data(self.request, timestamp),
+            get_banners(self.request, timestamp),
+            get_whats_new_banners(self.request, timestamp),
+            return_exceptions=True
+        )
+
+        for name, result in zip(["landing page data", "banners", "what's new"], pages):
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to warm the {name} for release '{timestamp}': {result}")
+
+        chunks = list()
+        for area_type, area_ids in (await self.get_areas()).items():
+            for index in range(0, len(area_ids), settings["chunk_size"]):
+                chunks.append((area_type, area_ids[index:index + settings["chunk_size"]]))
+
+        total = sum(len(area_ids) for _, area_ids in chunks)
+        done = failed = 0
+        semaphore = Semaphore(settings["concurrency"])
+
+        async def warm_chunk(area_type: str, area_ids: List[int]):
+            nonlocal done, failed
+
+            async with semaphore:
+                try:
+                    results: List[Any] = await get_data(
+                        self.request,
+                        area_type=[area_type] * len(area_ids),
+                        area_id=area_ids,
+                        timestamp=partition_ts
+                    )
+                    failed += sum(result is None for result in results)
+                except Exception as err:
+                    logger.warning(f"Failed to warm {len(area_ids)} '{area_type}' areas: {err}")
+                    failed += len(area_ids)
+
+            done += len(area_ids)
+            logger.info(
+                f"Cache warming for release '{timestamp}': {done:,d}/{total:,d} areas "
+                f"({failed:,d} failed) in {monotonic() - start:.1f}s"
+            )
+
+        await gather(*(warm_chunk(area_type, area_ids) for area_type, area_ids in chunks))
+
+        report = WarmingReport(
+            timestamp=timestamp,
+            total=total,
+            failed=failed,
+            duration=monotonic() - start
+        )
+
+        logger.info(
+            f"Warmed the cache for release '{timestamp}': {report.total - report.failed:,d}"
+            f"/{report.total:,d} areas in {report.duration:.1f}s"
+        )
+
+        return report
@@ -0,0 +1,238 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from os import environ, chdir
+from os.path import abspath, dirname, join as join_path
+from fnmatch import fnmatchcase
+from time import time
+import sys
+
+# 3rd party:
+import pytest
+
+# Internal:
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+root_dir = dirname(dirname(abspath(__file__)))
+
+# Tiers and caches that are shared between processes are not used in tests.
+environ.setdefault("SHARED_CACHE", "0")
+environ.setdefault("TEMPLATE_BYTECODE_CACHE", "0")
+environ.setdefault("FRAGMENT_CACHE", "0")
+environ.setdefault("RELEASE_WATCHER", "0")
+environ.setdefault("CACHE_WARMING", "0")
+environ.pop("INTERNAL_ROUTES_TOKEN", None)
+
+# Static files are mounted relative to the working directory - as in the image.
+sys.path.insert(0, root_dir)
+chdir(join_path(root_dir, "app"))
+
+
+@pytest.fixture
+def make_request():
+    from starlette.requests import Request
+    from app.main import app
+
+    def make(path: str = "/", query_string: bytes = b"", headers=()) -> Request:
+        return Request({
+            "type": "http",
+            "app": app,
+            "router": app.router,
+            "method": "GET",
+            "scheme": "http",
+            "server": ("localhost", 80),
+            "path": path,
+            "query_string": query_string,
+            "headers": [(name.encode(), value.encode()) for name, value in headers],
+        })
+
+    return make
+
+
+class FakeRedis:
+    """
+    In-memory stand-in for the connections of the aioredis pool, with
+    the commands used by the cache. Keys expire as they are read.
+    """
+
+    def __init__(self):
+        self.data = dict()
+        self.expires_at = dict()
+        self.commands = list()
+        self.published = list()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def _get(self, key, default=None):
+        if key in self.expires_at and self.expires_at[key] <= time():
+            self.data.pop(key, None)
+            self.expires_at.pop(key, None)
+
+        return self.data.get(key, default)
+
+    def _expire(self, key, expire):
+        if expire:
+            self.expires_at[key] = time() + expire
+        else:
+            self.expires_at.pop(key, None)
+
+    async def get(self, key):
+        self.commands.append(("GET", key))
+        return self._get(key)
+
+    async def mget(self, *keys):
+        self.commands.append(("MGET", *keys))
+        return [self._get(key) for key in keys]
+
+    async def set(self, key, value, expire=0, pexpire=0, exist=None):
+        self.commands.append(("SET", key))
+
+        if exist == "SET_IF_NOT_EXIST" and self._get(key) is not None:
+            return False
+
+        self.data[key] = value if isinstance(value, bytes) else str(value).encode()
+        self._expire(key, expire or pexpire / 1000)
+        return True
+
+    async def delete(self, *keys):
+        self.commands.append(("DEL", *keys))
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    async def incr(self, key):
+        self.data[key] = str(int(self._get(key, 0)) + 1).encode()
+        return int(self.data[key])
+
+    async def eval(self, script, keys=(), args=()):
+        # Only the release of locks is scripted.
+        if self._get(keys[0]) == str(args[0]).encode():
+            return await self.delete(keys[0])
+
+        return 0
+
+    async def publish(self, channel, message):
+        self.published.append((channel, message))
+        return 1
+
+    async def hget(self, key, field):
+        self.commands.append(("HGET", key, field))
+        return self._get(key, dict()).get(field)
+
+    async def hset(self, key, field, value):
+        self.commands.append(("HSET", key, field))
+        fields = self.data.setdefault(key, dict())
+        created = field not in fields
+        fields[field] = value
+        return int(created)
+
+    async def hdel(self, key, *fields):
+        self.commands.append(("HDEL", key, *fields))
+        hash_fields = self._get(key, dict())
+        deleted = sum(hash_fields.pop(field, None) is not None for field in fields)
+
+        if key in self.data and not hash_fields:
+            del self.data[key]
+
+        return deleted
+
+    async def hlen(self, key):
+        return len(self._get(key, dict()))
+
+    async def hscan(self, key, cursor=0, match=None, count=None):
+        return 0, list(self._get(key, dict()).items())
+
+    async def expire(self, key, timeout):
+        if self._get(key) is None:
+            return False
+
+        self._expire(key, timeout)
+        return True
+
+    async def ttl(self, key):
+        if self._get(key) is None:
+            return -2
+
+        if key not in self.expires_at:
+            return -1
+
+        return int(self.expires_at[key] - time())
+
+    async def zadd(self, key, score, member):
+        self.data.setdefault(key, dict())[member] = score
+        return 1
+
+    async def zscore(self, key, member):
+        return self._get(key, dict()).get(member)
+
+    async def zrangebyscore(self, key, min=float("-inf"), exclude=None):
+        return [member for member, score in self._get(key, dict()).items() if score > min]
+
+    async def zremrangebyscore(self, key, max=float("inf")):
+        members = self._get(key, dict())
+
+        for member in [member for member, score in members.items() if score <= max]:
+            del members[member]
+
+    async def iscan(self, match):
+        for key in list(self.data):
+            if self._get(key) is not None and fnmatchcase(key, match):
+                yield key.encode()
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    ZSET_EXCLUDE_MIN = "ZSET_EXCLUDE_MIN"
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.calls = list()
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append(getattr(self.redis, name)(*args, **kwargs))
+
+        return call
+
+    async def execute(self):
+        return [await call for call in self.calls]
+
+
+class FakeRedisPool:
+    """
+    Stands in for the aioredis pool: awaiting it provides a connection.
+    """
+
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+
+    def __await__(self):
+        yield from []
+        return self.redis
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    """
+    Replaces the Redis pool of the app with an in-memory one, and starts
+    from empty local tiers in generation 1 of the keys.
+    """
+    from app.main import app
+    from app.caching import local_cache, generations
+
+    fake = FakeRedis()
+    monkeypatch.setattr(app.state, "redis", FakeRedisPool(fake), raising=False)
+
+    local_cache.clear()
+    generations.set(1)
+
+    yield fake
+
+    local_cache.clear()
@@ -0,0 +1,76 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from asyncio import run
+from fnmatch import fnmatchcase
+
+# 3rd party:
+import aioredis
+
+# Internal:
+from app.caching import keys
+from app.caching.keys import GENERATION_KEY, build_key, build_sharded_key, split_key
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+class FakeRedis:
+    def __init__(self, generation, types):
+        self.generation = generation
+        self.types = dict(types)
+
+    async def incr(self, key):
+        assert key == GENERATION_KEY
+        self.generation += 1
+        return self.generation
+
+    async def iscan(self, match):
+        for key in list(self.types):
+            if fnmatchcase(key, match):
+                yield key.encode()
+
+    async def type(self, key):
+        return self.types[key.decode()].encode()
+
+    async def unlink(self, key):
+        self.types.pop(key.decode())
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+def test_keys_are_distinct_for_distinct_arguments():
+    assert build_key("FRONTEND::LP::", 1, "a|b", "c") != build_key("FRONTEND::LP::", 1, "a", "b|c")
+    assert build_key("FRONTEND::LP::", 1, 1) != build_key("FRONTEND::LP::", 1, "1")
+    assert build_key("FRONTEND::LP::", 1, "a") != build_key("FRONTEND::LP::", 2, "a")
+
+
+def test_retire_removes_hashes_of_retired_generation(monkeypatch):
+    prefix = "FRONTEND::area-postcode::"
+    hash_name, _ = split_key(build_key(prefix, 1, "NW11AA"))
+    shard_name, _ = split_key(build_sharded_key(prefix, 1, "NW1", "NW11AA"))
+    current_shard_name, _ = split_key(build_sharded_key(prefix, 2, "NW1", "NW11AA"))
+    other_shard_name, _ = split_key(build_sharded_key(prefix, 11, "NW1", "NW11AA"))
+    value_key = build_key("FRONTEND::LP::", 1, "landing")
+
+    redis = FakeRedis(1, {
+        hash_name: "hash",
+        shard_name: "hash",
+        current_shard_name: "hash",
+        other_shard_name: "hash",
+        # Expire with their TTLs.
+        value_key: "string",
+    })
+
+    async def create_redis(*args, **kwargs):
+        return redis
+
+    monkeypatch.setattr(aioredis, "create_redis", create_redis)
+
+    assert run(keys.retire()) == 2
+    assert set(redis.types) == {current_shard_name, other_shard_name, value_key}
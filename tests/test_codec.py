@@ -0,0 +1,111 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from datetime import date, datetime
+from decimal import Decimal
+from pickle import dumps as pickle_dumps
+from time import time
+
+# 3rd party:
+import pytest
+
+# Internal:
+from app.config import Settings
+from app.common.data.table import Table
+from app.caching.codec import (
+    HEADER, MAGIC, FORMAT_VERSION, FLAG_COMPRESSED, DecodeError, Expiry,
+    encode, decode, is_encoded, read_expiry
+)
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+def get_table(length: int = 3) -> Table:
+    return Table({
+        "areaName": ["England"] * length,
+        "date": [datetime(2021, 5, 1)] * length,
+        "value": [float(index) for index in range(length)],
+        "priority": list(range(length)),
+    })
+
+
+@pytest.mark.parametrize("value", [
+    "2021-05-01T15:25:12.1234565Z",
+    [{"timestamp": date(2021, 5, 1), "display_timestamp": "1 May 2021", "body": "<p>Body</p>"}],
+    {"value": Decimal("1.5"), "missing": None},
+    list(),
+])
+def test_round_trip(value):
+    assert decode(encode(value)) == value
+
+
+def test_table_round_trip():
+    table = get_table()
+    decoded = decode(encode(table))
+
+    assert isinstance(decoded, Table)
+    assert decoded.columns == table.columns
+    assert list(decoded.rows()) == list(table.rows())
+
+
+def test_large_payloads_are_compressed(monkeypatch):
+    monkeypatch.setitem(Settings.cache_codec, "compression_threshold", 128)
+    table = get_table(100)
+
+    payload = encode(table)
+    _, _, _, flags = HEADER.unpack_from(payload)
+
+    assert flags & FLAG_COMPRESSED
+    assert list(decode(payload).rows()) == list(table.rows())
+
+
+def test_header():
+    payload = encode("value")
+    magic, version, _, _ = HEADER.unpack_from(payload)
+
+    assert is_encoded(payload)
+    assert (magic, version) == (MAGIC, FORMAT_VERSION)
+
+
+def test_unsupported_version_is_rejected():
+    payload = bytearray(encode("value"))
+    payload[len(MAGIC)] = FORMAT_VERSION + 1
+
+    with pytest.raises(DecodeError):
+        decode(bytes(payload))
+
+
+def test_unknown_codec_is_rejected():
+    payload = bytearray(encode("value"))
+    payload[len(MAGIC) + 1] = 255
+
+    with pytest.raises(DecodeError):
+        decode(bytes(payload))
+
+
+def test_corrupt_payload_is_rejected():
+    with pytest.raises(DecodeError):
+        decode(encode("value")[:-2])
+
+
+def test_legacy_pickles_are_decoded():
+    payload = pickle_dumps({"value": 1})
+
+    assert not is_encoded(payload)
+    assert decode(payload) == {"value": 1}
+    assert read_expiry(payload) is None
+
+
+def test_expiry():
+    expiry = Expiry.from_ttl(60, 30)
+    payload = encode("value", expiry)
+
+    assert read_expiry(payload) == expiry
+    assert read_expiry(encode("value")) is None
+    assert decode(payload) == "value"
+
+    assert not expiry.is_stale and not expiry.is_expired
+    assert Expiry(soft=time() - 1, hard=time() + 1).is_stale
+    assert Expiry(soft=time() - 2, hard=time() - 1).is_expired
@@ -0,0 +1,90 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Union
+from asyncio import run
+from http import HTTPStatus
+
+# 3rd party:
+import pytest
+
+# Internal:
+from app.config import Settings
+from app.caching import local_cache
+from app.caching.keys import generations
+from app.template_processor import render_cached_template, page_context
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+TIMESTAMP = "2021-05-01T15:25:12.1234565Z"
+
+
+@pytest.fixture(autouse=True)
+def uncached_pages(monkeypatch):
+    monkeypatch.setitem(Settings.page_cache, "enabled", False)
+    generations.set(1)
+    local_cache.clear()
+
+    yield
+
+    local_cache.clear()
+
+
+def get_page(make_request, banners: Union[list, None], headers=()):
+    """
+    Requests a page. Where ``banners`` is ``None``, the banners are not
+    provided - and fail to load, as there is no Redis.
+    """
+    async def get_context():
+        return dict()
+
+    async def render():
+        request = make_request("/", headers=headers)
+        page_context.provide(request, timestamp=TIMESTAMP, despatch=TIMESTAMP, og_images=list())
+
+        if banners is not None:
+            page_context.provide(request, banners=banners, whatsnew_banners=list())
+
+        return await render_cached_template(request, "errors/404.html", get_context=get_context)
+
+    return run(render())
+
+
+def test_matching_etag_is_not_modified(make_request):
+    etag = get_page(make_request, banners=list()).headers["etag"]
+
+    response = get_page(make_request, banners=list(), headers=[("if-none-match", etag)])
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert response.headers["etag"] == etag
+
+
+def test_etag_changes_with_banners(make_request):
+    etag = get_page(make_request, banners=list()).headers["etag"]
+    banners = [{"timestamp": "2021-05-01", "display_timestamp": "1 May 2021", "body": "<p>Update</p>"}]
+
+    # Once the digest of the announcements held in-process has expired.
+    local_cache.clear()
+    response = get_page(make_request, banners=banners, headers=[("if-none-match", etag)])
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers["etag"] != etag
+
+
+def test_not_modified_without_loading_banners(make_request):
+    etag = get_page(make_request, banners=list()).headers["etag"]
+
+    response = get_page(make_request, banners=None, headers=[("if-none-match", etag)])
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+
+def test_if_modified_since_is_not_honoured(make_request):
+    last_modified = get_page(make_request, banners=list()).headers["last-modified"]
+
+    response = get_page(make_request, banners=list(), headers=[("if-modified-since", last_modified)])
+
+    assert response.status_code == HTTPStatus.OK
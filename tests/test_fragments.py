@@ -0,0 +1,154 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from asyncio import run
+
+# 3rd party:
+from jinja2 import DictLoader, Environment
+import pytest
+
+# Internal:
+from app.caching import local_cache, generations, build_key
+from app.template_processor.fragments import FRAGMENT_PREFIX, FragmentCache
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+TEMPLATE = (
+    '{% fragment "nav", area %}'
+    '{{ rendered.append(area) or "" }}nav: {{ area }}'
+    '{% endfragment %}'
+)
+
+RELEASE = "2021-01-01T16:00:00.0000000Z"
+
+NEXT_RELEASE = "2021-01-02T16:00:00.0000000Z"
+
+
+def make_cache(enabled: bool = True):
+    cache = FragmentCache(enabled=enabled, ttl=60, manifest_size=8)
+    environment = Environment(loader=DictLoader({"page.html": TEMPLATE}), autoescape=True)
+    cache.install(environment)
+
+    return cache, environment
+
+
+def render(request, cache, environment, timestamp: str = RELEASE, area: str = "a"):
+    """
+    Renders the page as ``render_template`` does, and returns the HTML
+    and the areas whose fragment was rendered rather than retrieved.
+    """
+    rendered = list()
+
+    async def run_render():
+        fragments = await cache.start(request, "page.html", timestamp)
+        html = environment.get_template("page.html").render(
+            fragments=fragments,
+            rendered=rendered,
+            area=area
+        )
+        await cache.finish(request, fragments)
+        return html
+
+    return run(run_render()), rendered
+
+
+def fragment_key(timestamp: str = RELEASE, area: str = "a", generation: int = 1) -> str:
+    return build_key(FRAGMENT_PREFIX, generation, "nav", timestamp, area)
+
+
+@pytest.fixture
+def request_(make_request):
+    return make_request("/")
+
+
+def test_fragments_are_rendered_once_per_release(redis, request_):
+    cache, environment = make_cache()
+    key = fragment_key()
+
+    html, rendered = render(request_, cache, environment)
+    assert html == "nav: a"
+    assert rendered == ["a"]
+
+    assert local_cache.get(key) == "nav: a"
+    assert key in redis.data
+
+    html, rendered = render(request_, cache, environment)
+    assert html == "nav: a"
+    assert rendered == []
+
+
+def test_fragments_are_read_from_redis(redis, request_):
+    cache, environment = make_cache()
+    render(request_, cache, environment)
+
+    # e.g. another worker, or the in-process tier has expired.
+    local_cache.clear()
+    redis_hits = cache.stats.redis_hits
+
+    html, rendered = render(request_, cache, environment)
+    assert html == "nav: a"
+    assert rendered == []
+    assert cache.stats.redis_hits == redis_hits + 1
+
+    assert local_cache.get(fragment_key()) == "nav: a"
+
+
+def test_fragments_are_keyed_by_inputs(redis, request_):
+    cache, environment = make_cache()
+
+    assert render(request_, cache, environment, area="a")[1] == ["a"]
+    assert render(request_, cache, environment, area="b")[1] == ["b"]
+    assert render(request_, cache, environment, area="a")[1] == []
+
+    assert fragment_key(area="a") != fragment_key(area="b")
+
+
+def test_fragments_are_keyed_by_release(redis, request_):
+    cache, environment = make_cache()
+    render(request_, cache, environment)
+
+    html, rendered = render(request_, cache, environment, timestamp=NEXT_RELEASE)
+    assert html == "nav: a"
+    assert rendered == ["a"]
+
+    assert fragment_key() in redis.data
+    assert fragment_key(NEXT_RELEASE) in redis.data
+    assert fragment_key() != fragment_key(NEXT_RELEASE)
+
+
+def test_fragments_are_keyed_by_generation(redis, request_):
+    cache, environment = make_cache()
+    render(request_, cache, environment)
+
+    generations.set(2)
+
+    html, rendered = render(request_, cache, environment)
+    assert html == "nav: a"
+    assert rendered == ["a"]
+
+    assert fragment_key(generation=2) in redis.data
+
+
+def test_manifest_is_reset_per_release(redis, request_):
+    cache, environment = make_cache()
+    render(request_, cache, environment)
+    assert list(cache._manifests["page.html"].keys) == [fragment_key()]
+
+    render(request_, cache, environment, timestamp=NEXT_RELEASE)
+    render(request_, cache, environment, timestamp=NEXT_RELEASE)
+
+    manifest = cache._manifests["page.html"]
+    assert manifest.release == (1, NEXT_RELEASE)
+    assert list(manifest.keys) == [fragment_key(NEXT_RELEASE)]
+
+
+def test_disabled_fragments_are_rendered(redis, request_):
+    cache, environment = make_cache(enabled=False)
+
+    assert render(request_, cache, environment) == ("nav: a", ["a"])
+    assert render(request_, cache, environment) == ("nav: a", ["a"])
+
+    assert not redis.data
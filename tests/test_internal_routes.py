@@ -0,0 +1,58 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from http import HTTPStatus
+
+# 3rd party:
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+# Internal:
+from app.config import Settings
+from app.middleware.internal import InternalRoutesMiddleware
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+async def endpoint(request):
+    return PlainTextResponse("OK")
+
+
+client = TestClient(Starlette(
+    routes=[
+        Route("/internal/cache-stats", endpoint=endpoint),
+        Route("/public", endpoint=endpoint),
+    ],
+    middleware=[
+        Middleware(InternalRoutesMiddleware, paths=["/internal/cache-stats"], token="secret")
+    ]
+))
+
+
+def test_internal_route_requires_token():
+    assert client.get("/internal/cache-stats").status_code == HTTPStatus.NOT_FOUND
+
+    response = client.get("/internal/cache-stats", headers={"x-internal-token": "wrong"})
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+    response = client.get("/internal/cache-stats", headers={"x-internal-token": "secret"})
+    assert response.status_code == HTTPStatus.OK
+
+
+def test_other_routes_are_not_restricted():
+    assert client.get("/public").status_code == HTTPStatus.OK
+
+
+def test_internal_routes_are_not_served_by_default():
+    from app.main import app
+
+    paths = {getattr(route, "path", None) for route in app.routes}
+
+    assert Settings.internal_token is None
+    assert f"/{Settings.cache_stats_path}" not in paths
+    assert f"/{Settings.template_profile_path}" not in paths
@@ -0,0 +1,142 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from asyncio import Queue, run, sleep, wait_for
+from time import time
+
+# 3rd party:
+from orjson import dumps as json_dumps, loads as json_loads
+
+# Internal:
+from app.caching import local_cache
+from app.caching.invalidation import INVALIDATION_CHANNEL, InvalidationBus
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+def message(source: str, sequence: int, keys=(), prefixes=(), sent_at=None) -> bytes:
+    return json_dumps({
+        "source": source,
+        "sequence": sequence,
+        "sent_at": time() if sent_at is None else sent_at,
+        "keys": list(keys),
+        "prefixes": list(prefixes)
+    })
+
+
+class FakeChannel:
+    def __init__(self, messages, ends: bool = True):
+        self.messages = list(messages)
+        self.ends = ends
+
+    async def wait_message(self):
+        if not self.messages and not self.ends:
+            await sleep(3600)
+
+        # Ends the subscription once the messages have been delivered.
+        return bool(self.messages)
+
+    async def get(self):
+        return self.messages.pop(0)
+
+
+class FakeSubscriber:
+    """
+    Delivers each list of messages over a subscription of its own.
+    """
+
+    def __init__(self, *subscriptions):
+        self.subscriptions = list(subscriptions)
+        self.subscribed = Queue()
+
+    async def subscribe(self, channel):
+        assert channel == INVALIDATION_CHANNEL
+        await self.subscribed.put(channel)
+
+        if not self.subscriptions:
+            return [FakeChannel(list(), ends=False)]
+
+        return [FakeChannel(self.subscriptions.pop(0))]
+
+
+def fill_local_cache():
+    local_cache.clear()
+    local_cache.set("FRONTEND::BN::G1::a", "banner")
+    local_cache.set("FRONTEND::BN::G1::b", "banner")
+    local_cache.set("FRONTEND::CL::G1::a", "announcement")
+
+
+def test_publish_applies_locally_and_broadcasts(redis, make_request):
+    fill_local_cache()
+    bus = InvalidationBus(reconnect_interval=0)
+
+    receivers = run(bus.publish(make_request(), keys=["FRONTEND::CL::G1::a"], prefixes=["FRONTEND::BN::"]))
+
+    assert receivers == 1
+    assert len(local_cache) == 0
+
+    (channel, payload), = redis.published
+    published = json_loads(payload)
+
+    assert channel == INVALIDATION_CHANNEL
+    assert (published["source"], published["sequence"]) == (bus.source, 1)
+    assert (published["keys"], published["prefixes"]) == (["FRONTEND::CL::G1::a"], ["FRONTEND::BN::"])
+
+
+def test_invalidations_of_other_workers_are_applied():
+    fill_local_cache()
+    bus = InvalidationBus(reconnect_interval=0)
+
+    bus.receive(message("other", 1, prefixes=["FRONTEND::BN::"], sent_at=time() - 0.25))
+
+    assert "FRONTEND::BN::G1::a" not in local_cache
+    assert "FRONTEND::CL::G1::a" in local_cache
+    assert bus.received == 1
+    assert bus.stats()["max_lag_ms"] >= 250
+
+
+def test_own_invalidations_are_not_applied_again():
+    bus = InvalidationBus(reconnect_interval=0)
+    applied = list()
+    bus.add_handler(lambda keys, prefixes: applied.append(keys))
+
+    bus.receive(message(bus.source, 1, keys=["key"]))
+
+    assert applied == list()
+
+
+def test_dropped_invalidations_are_counted():
+    bus = InvalidationBus(reconnect_interval=0)
+
+    bus.receive(message("other", 1))
+    bus.receive(message("other", 4))
+    bus.receive(message("other", 5))
+
+    assert bus.dropped == 2
+
+
+def test_subscription_delivers_and_resyncs():
+    bus = InvalidationBus(reconnect_interval=0)
+    applied = list()
+    bus.add_handler(lambda keys, prefixes: applied.append((keys, prefixes)))
+
+    subscriber = FakeSubscriber([message("other", 1, keys=["FRONTEND::CL::G1::a"]), b"malformed"])
+
+    async def main():
+        bus.start(subscriber)
+
+        await wait_for(subscriber.subscribed.get(), 1)
+        await wait_for(subscriber.subscribed.get(), 1)
+        await sleep(0)
+
+        await bus.stop()
+
+    run(main())
+
+    # Messages may have been missed while resubscribing, so everything
+    # is invalidated thereafter.
+    assert applied == [(["FRONTEND::CL::G1::a"], list()), (list(), [""])]
+    assert bus.received == 1
+    assert bus.resyncs == 1
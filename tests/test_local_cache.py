@@ -0,0 +1,83 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from datetime import datetime
+from pickle import dumps, loads
+from sys import getsizeof
+
+# 3rd party:
+import pytest
+
+# Internal:
+from app.caching.local import LocalCache, estimate_size
+from app.common.data.table import Table
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+def measure(value, seen=None) -> int:
+    """
+    Memory held by a value, counting each object once.
+    """
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+
+    seen.add(id(value))
+    size = getsizeof(value) if not isinstance(value, Table) else object.__sizeof__(value)
+
+    if isinstance(value, Table):
+        size += measure({name: value[name] for name in value.columns}, seen)
+    elif isinstance(value, dict):
+        size += sum(measure(key, seen) + measure(item, seen) for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(measure(item, seen) for item in value)
+
+    return size
+
+
+# Values as they are decoded from the cache.
+VALUES = {
+    "html": "<p>" + "lorem ipsum " * 1000 + "</p>",
+    "records": loads(dumps([
+        {"areaCode": f"E090000{index:02d}", "date": "2021-04-30", "value": index * 1.5}
+        for index in range(100)
+    ])),
+    "table": loads(dumps(Table({
+        "areaCode": [f"E090000{index:02d}" for index in range(100)],
+        "date": [datetime(2021, 4, index % 30 + 1) for index in range(100)],
+        "value": [index * 1.5 for index in range(100)],
+    }))),
+}
+
+
+@pytest.mark.parametrize("name", list(VALUES))
+def test_estimates_decoded_size(name):
+    value = VALUES[name]
+
+    # Close to the memory that the value holds - unlike the length of its
+    # payload, which is several times smaller - erring above it.
+    assert measure(value) * 0.9 <= estimate_size(value) <= measure(value) * 1.5
+
+
+def test_budget_bounds_decoded_size():
+    value = VALUES["records"]
+    cache = LocalCache(max_bytes=estimate_size(value) * 2, max_ttl=60)
+
+    assert cache.set("first", value)
+    assert cache.set("second", value)
+    assert cache.set("third", value)
+
+    assert "first" not in cache
+    assert cache.size <= cache.max_bytes
+    assert cache.evictions == 1
+
+
+def test_oversized_values_are_not_cached():
+    cache = LocalCache(max_bytes=1024, max_ttl=60)
+
+    assert not cache.set("key", VALUES["html"])
+    assert "key" not in cache
+    assert cache.size == 0
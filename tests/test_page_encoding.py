@@ -0,0 +1,40 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+import gzip
+
+# 3rd party:
+import brotli
+import pytest
+
+# Internal:
+from app.template_processor.template import compress_page, get_content_encoding
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+def test_compressed_encodings_decompress_to_page():
+    body = "<html><body>{}</body></html>".format("<p>Cases</p>" * 1000).encode()
+
+    encodings = compress_page(body, gzip_level=6, brotli_quality=5)
+
+    assert encodings["identity"] == body
+    assert gzip.decompress(encodings["gzip"]) == body
+    assert brotli.decompress(encodings["br"]) == body
+    assert compress_page(body, gzip_level=6, brotli_quality=5) == encodings
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip, deflate, br", "br"),
+    ("gzip", "gzip"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("*", "br"),
+    ("br;q=0, gzip;q=0", "identity"),
+    ("", "identity"),
+])
+def test_content_encoding(make_request, accept_encoding, expected):
+    request = make_request(headers=[("accept-encoding", accept_encoding)])
+
+    assert get_content_encoding(request) == expected
@@ -0,0 +1,87 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from asyncio import run
+
+# 3rd party:
+from orjson import dumps as json_dumps
+
+# Internal:
+from app.caching import FromCacheOrDB, build_sharded_key, split_key
+from app.caching.codec import decode
+from app.postcode.utils import get_outward_code
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+PREFIX = "TEST::area-postcode"
+
+
+def get_lookup(max_shard_size: int = 100):
+    """
+    Postcode lookup sharded by outward code, as ``get_postcode_areas``,
+    and the postcodes that it looked up in the database.
+    """
+    queried = list()
+
+    @FromCacheOrDB(
+        PREFIX,
+        ttl=60,
+        shard=lambda arguments: get_outward_code(arguments["postcode"]),
+        max_shard_size=max_shard_size
+    )
+    async def get_areas(request, postcode):
+        queried.append(postcode)
+        return [{"postcode": postcode}]
+
+    return get_areas, queried
+
+
+def shard_of(postcode: str) -> str:
+    name, _ = split_key(build_sharded_key(PREFIX, 1, get_outward_code(postcode), postcode=postcode))
+    return name
+
+
+def test_entries_are_routed_by_outward_code(redis, make_request):
+    get_areas, queried = get_lookup()
+
+    for postcode in ["NW11AA", "NW11AB", "SW1A1AA"]:
+        assert run(get_areas(make_request(), postcode)) == [{"postcode": postcode}]
+
+    assert shard_of("NW11AA") == shard_of("NW11AB") != shard_of("SW1A1AA")
+    assert len(redis.data[shard_of("NW11AA")]) == 2
+    assert len(redis.data[shard_of("SW1A1AA")]) == 1
+
+    # Shards expire as a whole, once their entries have.
+    assert 0 < run(redis.ttl(shard_of("NW11AA"))) <= get_areas.__self__.hard_ttl
+
+
+def test_shards_are_bounded(redis, make_request):
+    get_areas, queried = get_lookup(max_shard_size=4)
+
+    for postcode in ["NW11AA", "NW11AB", "NW11AD", "NW11AE", "NW11AF"]:
+        run(get_areas(make_request(), postcode))
+
+    # A quarter of the shard is evicted once it is full.
+    assert len(redis.data[shard_of("NW11AA")]) == 3
+
+
+def test_legacy_entries_are_migrated(redis, make_request):
+    get_areas, queried = get_lookup()
+    redis.data[PREFIX] = {
+        "NW11AA": json_dumps([{"postcode": "NW11AA", "area_type": "msoa"}]),
+        "SW1A1AA": json_dumps([{"postcode": "SW1A1AA", "area_type": "msoa"}]),
+    }
+
+    result = run(get_areas(make_request(), "NW11AA"))
+
+    assert result == [{"postcode": "NW11AA", "area_type": "msoa"}]
+    assert queried == list()
+
+    # Moved to its shard, and discarded with the legacy hash thereafter.
+    name, field = split_key(build_sharded_key(PREFIX, 1, "NW1", postcode="NW11AA"))
+    assert decode(redis.data[name][field]) == result
+    assert list(redis.data[PREFIX]) == ["SW1A1AA"]
+    assert run(redis.ttl(PREFIX)) > 0
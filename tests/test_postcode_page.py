@@ -0,0 +1,162 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from asyncio import run
+from datetime import datetime
+
+# 3rd party:
+import pytest
+
+# Internal:
+from app.postcode import views
+from app.common.data.table import Table
+from app.template_processor import render_template, page_context
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+TIMESTAMP = "2021-05-01T15:25:12.1234565Z"
+POSTCODE = "NW11AA"
+
+# Area type: (ID, code, name, priority), from the smallest area to the largest.
+AREAS = {
+    "msoa": (1, "E02000166", "Camden Town East", 1),
+    "ltla": (2, "E09000007", "Camden", 2),
+    "utla": (3, "E09000007", "Camden", 3),
+    "nhsTrust": (4, "RAL", "Royal Free London NHS Foundation Trust", 4),
+    "region": (5, "E12000007", "London", 5),
+    "nhsRegion": (6, "E40000003", "London", 6),
+    "nation": (7, "E92000001", "England", 7),
+}
+
+# Area type that each metric is reported for, by the prefix of the metric.
+METRIC_AREA_TYPES = {
+    "newAdmissions": "nhsTrust",
+    "newVirusTests": "nation",
+    "transmissionRate": "region",
+}
+
+SHARED_CONTEXT = {
+    "despatch": TIMESTAMP,
+    "date": TIMESTAMP.split("T")[0],
+    "base": "http://localhost",
+    "banners": list(),
+    "whatsnew_banners": list(),
+    "og_images": list(),
+}
+
+
+def get_postcode_areas(area_types):
+    async def get_areas(request, postcode, **kwargs):
+        return [
+            dict(id=AREAS[area_type][0], area_type=area_type, postcode="NW1 1AA")
+            for area_type in area_types
+        ]
+
+    return get_areas
+
+
+def get_metric_area_type(metric: str, area_types: list) -> str:
+    """
+    Area type of the data for a metric - that which it is reported for
+    where the postcode has one, or otherwise the smallest non-MSOA area.
+    """
+    for prefix, area_type in METRIC_AREA_TYPES.items():
+        if metric.startswith(prefix) and area_type in area_types:
+            return area_type
+
+    return next(area_type for area_type in area_types if area_type != "msoa")
+
+
+async def get_data(request, area_type, area_id, timestamp):
+    msoa_metric = views.query_data["local_data"]["msoa_metric"]
+    area_types = area_type
+    tables = list()
+
+    for area_type in area_types:
+        _, area_code, area_name, priority = AREAS[area_type]
+        metrics = [
+            metric
+            for metric in views.query_data["local_data"]["metrics"]
+            if get_metric_area_type(metric, area_types) == area_type
+        ]
+
+        if area_type == "msoa":
+            metrics = [f"{msoa_metric}RollingSum", f"{msoa_metric}RollingRate"]
+
+        tables.append(Table.from_records(
+            [
+                (area_code, area_type, area_name, datetime(2021, 4, 30), metric, float(index + 1), priority)
+                for index, metric in enumerate(metrics)
+            ],
+            columns=views.query_data["local_data"]["column_names"],
+            converters=views.column_converters
+        ))
+
+    return tables
+
+
+def render_postcode_page(monkeypatch, make_request, area_types) -> str:
+    monkeypatch.setattr(views, "get_postcode_areas", get_postcode_areas(area_types))
+    monkeypatch.setattr(views, "get_data", get_data)
+
+    async def render():
+        request = make_request("/search", f"postcode={POSTCODE}".encode())
+        page_context.provide(request, **SHARED_CONTEXT)
+
+        context = await views.get_postcode_page_context(request, TIMESTAMP, POSTCODE)
+        response = await render_template(request, "postcode_results.html", context=context)
+
+        return response.body.decode()
+
+    return run(render())
+
+
+@pytest.mark.parametrize("area_type", list(AREAS))
+def test_renders_postcode_page(monkeypatch, make_request, area_type):
+    # The smallest area that a postcode is found in, and those that contain it.
+    area_types = list(AREAS)[list(AREAS).index(area_type):]
+    _, _, area_name, _ = AREAS[area_type]
+
+    html = render_postcode_page(monkeypatch, make_request, area_types)
+
+    assert f"NW1 1AA &ndash; {area_name}" in " ".join(html.split())
+
+
+def test_msoa_page_names_local_authority(monkeypatch, make_request):
+    html = render_postcode_page(monkeypatch, make_request, list(AREAS))
+
+    assert "Camden Town East, Camden." in " ".join(html.split())
+
+
+def test_msoa_page_without_local_authority(monkeypatch, make_request):
+    html = render_postcode_page(monkeypatch, make_request, ["msoa", "nation"])
+
+    assert "Camden Town East." in " ".join(html.split())
+
+
+def test_incomplete_data_is_not_rendered(monkeypatch, make_request):
+    async def get_incomplete_data(request, area_type, area_id, timestamp):
+        tables = await get_data(request, area_type, area_id, timestamp)
+        return [*tables[:-1], None]
+
+    monkeypatch.setattr(views, "get_postcode_areas", get_postcode_areas(list(AREAS)))
+    monkeypatch.setattr(views, "get_data", get_incomplete_data)
+
+    request = make_request("/search", f"postcode={POSTCODE}".encode())
+
+    with pytest.raises(views.IncompleteAreaData):
+        run(views.get_postcode_page_context(request, TIMESTAMP, POSTCODE))
+
+
+def test_parent_area_name_has_lowest_rank():
+    data = Table({
+        "areaType": ["msoa", "utla", "ltla", "nation"],
+        "areaName": ["Camden Town East", "Upper", "Lower", "England"],
+        "rank": [1.0, 2.0, 1.5, 1.0],
+    })
+
+    assert views.get_parent_area_name(data) == "Lower"
+    assert views.get_parent_area_name(data.filter([True, False, False, True])) is None
@@ -0,0 +1,169 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from asyncio import gather, run
+from functools import partial
+from time import time
+
+# 3rd party:
+
+# Internal:
+from app.caching import from_cache_or_func, FromCacheOrDB, cache_stats, local_cache, build_key, split_key
+from app.caching.codec import MAGIC, FORMAT_VERSION, Expiry, encode, decode, read_expiry
+from app.caching.singleflight import _revalidations
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+def with_next_version(payload: bytes) -> bytes:
+    payload = bytearray(payload)
+    payload[len(MAGIC)] = FORMAT_VERSION + 1
+    return bytes(payload)
+
+
+class Computation:
+    def __init__(self, result="value"):
+        self.result = result
+        self.calls = 0
+
+    async def __call__(self, *args, **kwargs):
+        self.calls += 1
+        return self.result
+
+
+def test_undecodable_payload_is_recomputed(redis, make_request):
+    prefix = "TEST::UNDECODABLE::"
+    key = build_key(prefix, 1, area="E92000001")
+    redis.data[key] = with_next_version(encode("old"))
+    compute = Computation("new")
+
+    result = run(from_cache_or_func(make_request(), compute, prefix, 60, area="E92000001"))
+
+    assert result == "new"
+    assert compute.calls == 1
+    assert cache_stats[prefix].undecodable == 1
+    assert cache_stats[prefix].misses == 1
+    # Replaced, and read from the cache thereafter.
+    assert decode(redis.data[key]) == "new"
+
+
+def test_undecodable_hash_field_is_recomputed(redis, make_request):
+    prefix = "TEST::UNDECODABLE-HASH::"
+    compute = Computation([{"postcode": "NW11AA"}])
+
+    @FromCacheOrDB(prefix)
+    async def get_areas(request, postcode):
+        return await compute()
+
+    name, field = split_key(build_key(prefix, 1, postcode="NW11AA"))
+    redis.data[name] = {field: with_next_version(encode([{"postcode": "old"}]))}
+
+    assert run(get_areas(make_request(), "NW11AA")) == [{"postcode": "NW11AA"}]
+    assert compute.calls == 1
+    assert cache_stats[prefix].undecodable == 1
+    assert decode(redis.data[name][field]) == [{"postcode": "NW11AA"}]
+
+
+
+def stale(value) -> bytes:
+    return encode(value, Expiry(soft=time() - 1, hard=time() + 60))
+
+
+async def revalidated():
+    """
+    Waits for the background refreshes scheduled so far.
+    """
+    await gather(*list(_revalidations.values()))
+
+
+def test_concurrent_misses_compute_once(redis, make_request):
+    prefix = "TEST::COALESCE::"
+    compute = Computation("value")
+
+    async def main():
+        request = make_request()
+        return await gather(*(
+            from_cache_or_func(request, compute, prefix, 60, area="E92000001")
+            for _ in range(5)
+        ))
+
+    assert run(main()) == ["value"] * 5
+    assert compute.calls == 1
+    assert decode(redis.data[build_key(prefix, 1, area="E92000001")]) == "value"
+
+
+def test_local_miss_is_served_from_redis(redis, make_request):
+    prefix = "TEST::TIERS::"
+    compute = Computation("value")
+    get = partial(from_cache_or_func, func=compute, prefix=prefix, expire=60, area="E92000001")
+
+    assert run(get(make_request())) == "value"
+    assert run(get(make_request())) == "value"
+    assert cache_stats[prefix].local_hits == 1
+
+    # e.g. another worker.
+    local_cache.clear()
+
+    assert run(get(make_request())) == "value"
+    assert compute.calls == 1
+    assert cache_stats[prefix].redis_hits == 1
+
+
+def test_stale_value_is_served_and_refreshed(redis, make_request):
+    prefix = "TEST::STALE::"
+    key = build_key(prefix, 1, area="E92000001")
+    redis.data[key] = stale("old")
+    compute = Computation("new")
+
+    async def main():
+        result = await from_cache_or_func(make_request(), compute, prefix, 60, area="E92000001")
+        assert compute.calls == 0
+
+        await revalidated()
+        return result
+
+    assert run(main()) == "old"
+    assert compute.calls == 1
+    assert cache_stats[prefix].stale_hits == 1
+
+    # Replaced in Redis, and fresh thereafter.
+    assert decode(redis.data[key]) == "new"
+    assert not read_expiry(redis.data[key]).is_stale
+    assert run(from_cache_or_func(make_request(), compute, prefix, 60, area="E92000001")) == "new"
+    assert compute.calls == 1
+
+
+def test_expired_value_is_recomputed(redis, make_request):
+    prefix = "TEST::EXPIRED::"
+    key = build_key(prefix, 1, area="E92000001")
+    redis.data[key] = encode("old", Expiry(soft=time() - 2, hard=time() - 1))
+    compute = Computation("new")
+
+    result = run(from_cache_or_func(make_request(), compute, prefix, 60, area="E92000001"))
+
+    assert result == "new"
+    assert compute.calls == 1
+    assert cache_stats[prefix].misses == 1
+
+
+def test_stale_hash_field_is_served_and_refreshed(redis, make_request):
+    prefix = "TEST::STALE-HASH::"
+    compute = Computation([{"postcode": "NW11AA", "area_type": "new"}])
+
+    @FromCacheOrDB(prefix, ttl=60)
+    async def get_areas(request, postcode):
+        return await compute()
+
+    name, field = split_key(build_key(prefix, 1, postcode="NW11AA"))
+    redis.data[name] = {field: stale([{"postcode": "NW11AA", "area_type": "old"}])}
+
+    async def main():
+        result = await get_areas(make_request(), "NW11AA")
+        await revalidated()
+        return result
+
+    assert run(main()) == [{"postcode": "NW11AA", "area_type": "old"}]
+    assert compute.calls == 1
+    assert decode(redis.data[name][field]) == [{"postcode": "NW11AA", "area_type": "new"}]
@@ -0,0 +1,199 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from asyncio import run, sleep
+from types import SimpleNamespace
+
+# 3rd party:
+import pytest
+
+# Internal:
+from app.common import utils
+from app.common.release import ReleaseWatcher, release_watcher
+from app.config import Settings
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+RELEASE = "2021-01-01T16:00:00.0000000Z"
+
+NEXT_RELEASE = "2021-01-02T16:00:00.0000000Z"
+
+BLOB = Settings.latest_published_timestamp["container"], Settings.latest_published_timestamp["path"]
+
+
+class FakeDownloader:
+    def __init__(self, timestamp: str, etag: str):
+        self.timestamp = timestamp
+        self.properties = SimpleNamespace(etag=etag)
+
+    async def readall(self) -> bytes:
+        return self.timestamp.encode()
+
+
+class FakeClient:
+    """
+    Stand-in for the storage client of the release blob, which answers
+    conditional downloads.
+    """
+
+    def __init__(self, timestamp: str):
+        self.timestamp = timestamp
+        self.etags = list()
+
+    async def download_if_modified(self, etag):
+        self.etags.append(etag)
+
+        if etag == f'"{self.timestamp}"':
+            return None
+
+        return FakeDownloader(self.timestamp, f'"{self.timestamp}"')
+
+
+def make_watcher(switch_timeout: float = 60) -> ReleaseWatcher:
+    return ReleaseWatcher(enabled=True, poll_interval=1, switch_timeout=switch_timeout)
+
+
+def test_first_release_is_served_straight_away():
+    watcher = make_watcher()
+    handled = list()
+    watcher.add_handler(handled.append, holds_switch=True)
+
+    run(watcher.poll(FakeClient(RELEASE)))
+
+    assert watcher.current == watcher.published == RELEASE
+    assert handled == [RELEASE]
+    assert watcher.releases == 0
+    assert watcher.held_switches == 0
+
+
+def test_unchanged_polls_are_not_modified():
+    watcher = make_watcher()
+    handled = list()
+    watcher.add_handler(handled.append)
+    client = FakeClient(RELEASE)
+
+    async def poll():
+        await watcher.poll(client)
+        await watcher.poll(client)
+
+    run(poll())
+
+    assert client.etags == [None, f'"{RELEASE}"']
+    assert watcher.polls == 2
+    assert watcher.not_modified == 1
+    assert handled == [RELEASE]
+
+
+def test_new_release_is_switched_to_once_handled():
+    watcher = make_watcher()
+    handled = list()
+
+    async def handler(timestamp):
+        # Switched to once the handlers are done.
+        handled.append((timestamp, watcher.current))
+
+    watcher.add_handler(handler)
+    client = FakeClient(RELEASE)
+
+    async def poll():
+        await watcher.poll(client)
+        client.timestamp = NEXT_RELEASE
+        await watcher.poll(client)
+
+    run(poll())
+
+    assert handled == [(RELEASE, RELEASE), (NEXT_RELEASE, RELEASE)]
+    assert watcher.current == NEXT_RELEASE
+    assert watcher.releases == 1
+
+
+def test_failing_handlers_do_not_hold_the_switch():
+    watcher = make_watcher()
+
+    def handler(timestamp):
+        raise RuntimeError("failed")
+
+    watcher.add_handler(handler, holds_switch=True)
+
+    async def release():
+        await watcher.release(RELEASE)
+        await watcher.release(NEXT_RELEASE)
+
+    run(release())
+
+    assert watcher.current == NEXT_RELEASE
+    assert watcher.held_switches == 0
+
+
+@pytest.mark.parametrize("keys, prefixes", [
+    # The cached release timestamp - as invalidated by the cache warmer.
+    (["FRONTEND::TS::G1::abc"], []),
+    ([], ["FRONTEND::TS::"]),
+    # Everything.
+    ([], [""]),
+])
+def test_held_switch_takes_place_on_invalidation(keys, prefixes):
+    watcher = make_watcher()
+    watcher.add_handler(lambda timestamp: None, holds_switch=True)
+
+    async def release():
+        await watcher.release(RELEASE)
+        await watcher.release(NEXT_RELEASE)
+        assert watcher.current == RELEASE
+
+        watcher.on_invalidation(["FRONTEND::BN::G1::abc"], ["FRONTEND::CL::"])
+        assert watcher.current == RELEASE
+
+        watcher.on_invalidation(keys, prefixes)
+
+    run(release())
+
+    assert watcher.current == NEXT_RELEASE
+    assert watcher.held_switches == 1
+    assert watcher.timed_out_switches == 0
+
+
+def test_held_switch_times_out():
+    watcher = make_watcher(switch_timeout=0.01)
+    watcher.add_handler(lambda timestamp: None, holds_switch=True)
+
+    async def release():
+        await watcher.release(RELEASE)
+        await watcher.release(NEXT_RELEASE)
+        assert watcher.current == RELEASE
+
+        await sleep(0.05)
+
+    run(release())
+
+    assert watcher.current == NEXT_RELEASE
+    assert watcher.held_switches == 1
+    assert watcher.timed_out_switches == 1
+
+
+def test_get_answers_the_watched_blob():
+    watcher = make_watcher()
+    assert watcher.get(*BLOB) is None
+
+    run(watcher.release(RELEASE))
+
+    assert watcher.get(*BLOB) == RELEASE
+    assert watcher.get("publicdata", "assets/dispatch/website_timestamp") is None
+
+    # Lookups fall back to the cache while polls are failing.
+    watcher._failing = True
+    assert watcher.get(*BLOB) is None
+
+
+def test_release_timestamp_is_read_from_the_watcher(monkeypatch):
+    async def from_cache_or_func(*args, **kwargs):
+        raise AssertionError("Looked up through the cache.")
+
+    monkeypatch.setattr(utils, "from_cache_or_func", from_cache_or_func)
+    monkeypatch.setattr(release_watcher, "current", RELEASE)
+    monkeypatch.setattr(release_watcher, "_failing", False)
+
+    assert run(utils.get_release_timestamp(None)) == RELEASE
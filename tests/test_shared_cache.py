@@ -0,0 +1,48 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+import os
+
+# 3rd party:
+
+# Internal:
+from app.caching.shared import SharedCache
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+def test_workers_share_payloads(tmp_path):
+    path = str(tmp_path / "cache")
+    first, second = SharedCache(path, 16, 4096), SharedCache(path, 16, 4096)
+
+    assert first.set("key", b"payload", ttl=60)
+    assert second.get("key") == b"payload"
+
+
+def test_new_layout_does_not_resize_mapped_file(tmp_path):
+    path = str(tmp_path / "cache")
+    previous = SharedCache(path, 16, 4096)
+    previous.set("key", b"payload", ttl=60)
+    mapped_size = os.fstat(previous._fd).st_size
+
+    current = SharedCache(path, 8, 1024)
+    assert current.get("key") is None
+    assert current.set("key", b"new payload", ttl=60)
+
+    # The file of the previous layout is replaced, not truncated.
+    assert os.fstat(previous._fd).st_size == mapped_size
+    assert previous.get("key") == b"payload"
+    assert os.stat(path).st_size == os.fstat(current._fd).st_size < mapped_size
+    assert os.listdir(tmp_path) == ["cache"]
+
+
+def test_uninitialised_file_is_replaced(tmp_path):
+    path = tmp_path / "cache"
+    path.write_bytes(b"")
+
+    cache = SharedCache(str(path), 16, 4096)
+
+    assert cache.set("key", b"payload", ttl=60)
+    assert cache.get("key") == b"payload"
@@ -0,0 +1,152 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from asyncio import Event, CancelledError, gather, get_running_loop, run, sleep
+from time import monotonic
+
+# 3rd party:
+import pytest
+
+# Internal:
+from app.caching.singleflight import SingleFlight
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+class Computation:
+    def __init__(self, result="value"):
+        self.result = result
+        self.calls = 0
+        self.cancelled = False
+        self.release = Event()
+
+    async def __call__(self):
+        self.calls += 1
+
+        try:
+            await self.release.wait()
+        except CancelledError:
+            self.cancelled = True
+            raise
+
+        if isinstance(self.result, Exception):
+            raise self.result
+
+        return self.result
+
+
+def test_concurrent_calls_are_coalesced():
+    async def main():
+        flight, compute = SingleFlight(), Computation()
+
+        callers = gather(*(flight.do("key", compute) for _ in range(5)))
+        await sleep(0)
+        compute.release.set()
+
+        assert await callers == ["value"] * 5
+        assert compute.calls == 1
+        assert "key" not in flight
+
+    run(main())
+
+
+def test_exceptions_are_shared():
+    async def main():
+        flight, compute = SingleFlight(), Computation(ValueError("failed"))
+
+        callers = gather(*(flight.do("key", compute) for _ in range(3)), return_exceptions=True)
+        await sleep(0)
+        compute.release.set()
+
+        assert all(isinstance(result, ValueError) for result in await callers)
+        assert compute.calls == 1
+
+    run(main())
+
+
+def test_cancelled_caller_does_not_cancel_others():
+    async def main():
+        flight, compute = SingleFlight(), Computation()
+        loop = get_running_loop()
+
+        first = loop.create_task(flight.do("key", compute))
+        second = loop.create_task(flight.do("key", compute))
+        await sleep(0)
+
+        # The caller that started the computation goes away.
+        first.cancel()
+        await sleep(0)
+        compute.release.set()
+
+        assert await second == "value"
+        assert first.cancelled()
+        assert not compute.cancelled
+
+    run(main())
+
+
+def test_computation_is_cancelled_with_its_last_caller():
+    async def main():
+        flight, compute = SingleFlight(), Computation()
+        loop = get_running_loop()
+
+        callers = [loop.create_task(flight.do("key", compute)) for _ in range(2)]
+        await sleep(0)
+
+        for caller in callers:
+            caller.cancel()
+
+        with pytest.raises(CancelledError):
+            await gather(*callers)
+
+        await sleep(0)
+        assert compute.cancelled
+        assert "key" not in flight
+
+        # A later call starts afresh.
+        later = Computation("later")
+        later.release.set()
+        assert await flight.do("key", later) == "later"
+
+    run(main())
+
+
+def test_waiters_compute_once_lock_is_released_without_value(redis, make_request, monkeypatch):
+    from app.config import Settings
+    from app.caching import Redis
+    from app.caching.singleflight import _compute_with_lock
+
+    monkeypatch.setitem(Settings.single_flight, "wait_timeout", 5)
+
+    async def main():
+        calls = list()
+        release = Event()
+
+        async def compute():
+            # e.g. an unknown postcode - nothing is written to the cache.
+            calls.append(len(calls))
+            if len(calls) == 1:
+                await release.wait()
+
+            return list()
+
+        async def read():
+            return None
+
+        async with Redis(make_request(), "key") as connection:
+            holder = get_running_loop().create_task(_compute_with_lock(connection, "key", compute, read, None))
+            await sleep(0)
+            waiter = get_running_loop().create_task(_compute_with_lock(connection, "key", compute, read, None))
+            await sleep(0.1)
+
+            release.set()
+            start = monotonic()
+
+            assert await gather(holder, waiter) == [list(), list()]
+            assert monotonic() - start < 1
+
+        assert len(calls) == 2
+
+    run(main())
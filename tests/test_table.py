@@ -0,0 +1,113 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from datetime import datetime
+from random import Random
+from subprocess import run
+from math import isnan
+from os import environ
+from os.path import abspath, dirname
+import sys
+
+# 3rd party:
+import pandas as pd
+import pytest
+
+# Internal:
+from app.common.data.table import Table
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+def assert_ranks_equal(actual, expected):
+    assert len(actual) == len(expected)
+
+    for value, expected_value in zip(actual, expected):
+        if isnan(expected_value):
+            assert isnan(value)
+        else:
+            assert value == expected_value
+
+
+def get_data(seed: int, length: int = 200) -> dict:
+    random = Random(seed)
+
+    return {
+        "metric": [random.choice(["cases", "deaths", "tests"]) for _ in range(length)],
+        # Narrow ranges, so that there are many ties.
+        "priority": [random.randint(1, 4) for _ in range(length)],
+        "date": [datetime(2021, 4, random.randint(25, 30)) for _ in range(length)],
+        "value": [random.choice([float("nan"), 1.0, 2.0, 2.0, 3.0]) for _ in range(length)],
+    }
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("column", ["priority", "date", "value"])
+def test_rank_matches_pandas(seed, column):
+    data = get_data(seed)
+    expected = pd.DataFrame(data).groupby("metric")[column].rank(ascending=True).tolist()
+
+    assert_ranks_equal(Table(data).rank(column, by="metric"), expected)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_postcode_rank_matches_pandas(seed):
+    data = get_data(seed)
+    table = Table(data)
+
+    expected = (
+        pd.DataFrame(data)
+        .groupby("metric")[["priority", "date"]]
+        .rank(ascending=True)
+        .mean(axis=1)
+        .tolist()
+    )
+
+    actual = [
+        (priority + date) / 2
+        for priority, date in zip(table.rank("priority", by="metric"), table.rank("date", by="metric"))
+    ]
+
+    assert_ranks_equal(actual, expected)
+
+
+def test_filter_assign_and_argmin():
+    table = Table({"name": ["a", "b", "c"], "value": [3.0, float("nan"), 1.0]})
+
+    assert table.argmin("value") == 2
+    assert table.filter([True, True, False]).argmin("value") == 0
+    assert table.assign(double=lambda t: t.map("value", lambda x: x * 2))["double"][0] == 6.0
+    assert table["name"] == ["a", "b", "c"]
+
+
+def test_concat_skips_empty_tables():
+    table = Table({"name": ["a"], "value": [1]})
+
+    assert Table.concat([table, Table(dict()), table])["name"] == ["a", "a"]
+    assert not len(Table.concat([None]))
+
+
+def test_from_frame():
+    frame = pd.DataFrame({"name": ["a", "b"], "date": pd.to_datetime(["2021-05-01", "2021-05-02"])})
+    table = Table.from_frame(frame)
+
+    assert table["name"] == ["a", "b"]
+    assert table["date"] == [datetime(2021, 5, 1), datetime(2021, 5, 2)]
+    assert type(table["date"][0]) is datetime
+
+
+def test_app_does_not_import_pandas():
+    root_dir = dirname(dirname(abspath(__file__)))
+    code = "import sys, app.main; assert not {'pandas', 'numpy'} & set(sys.modules), 'pandas imported'"
+
+    result = run(
+        [sys.executable, "-c", code],
+        cwd=f"{root_dir}/app",
+        env={**environ, "PYTHONPATH": root_dir},
+        capture_output=True,
+        text=True
+    )
+
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,57 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from asyncio import gather, run
+
+# 3rd party:
+import pytest
+
+# Internal:
+from app.common import utils
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    """
+    Blobs looked up through the cache, as (container, path).
+    """
+    lookups = list()
+
+    async def from_cache_or_func(request, func, prefix, expire, container, path):
+        lookups.append((container, path))
+        return f"{container}/{path}"
+
+    monkeypatch.setattr(utils, "from_cache_or_func", from_cache_or_func)
+    return lookups
+
+
+@pytest.mark.parametrize("getter, blob", [
+    # The despatch time of the website, as shown on pages.
+    (utils.get_website_timestamp, ("publicdata", "assets/dispatch/website_timestamp")),
+    # The latest release of the data, as watched by `release_watcher`.
+    (utils.get_release_timestamp, ("pipeline", "info/latest_published")),
+])
+def test_reads_timestamp_blob(storage, getter, blob):
+    assert run(getter(None)) == str.join("/", blob)
+    assert storage == [blob]
+
+
+def test_lookups_are_memoised_per_request(storage):
+    async def request():
+        with utils.request_memo_scope():
+            return await gather(
+                utils.get_website_timestamp(None),
+                utils.get_website_timestamp(None),
+                utils.get_release_timestamp(None),
+                utils.get_release_timestamp(None),
+            )
+
+    run(request())
+    assert len(storage) == 2
+
+    run(request())
+    assert len(storage) == 4